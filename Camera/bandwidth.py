@@ -0,0 +1,186 @@
+'''
+GigE Vision bandwidth planning for cameras sharing one uplink.
+
+Pure Python (no pypylon), so plans can be computed and checked offline:
+    python3 -m Camera.bandwidth                  # plan for the rigs in config.yaml
+    python3 -m Camera.bandwidth --link 1e8       # same rigs on a 100 MB/s link
+'''
+
+import argparse, math
+from dataclasses import dataclass
+
+from Camera.config_loader import split_pixel_format
+
+# GVSP packet layout: GevSCPSPacketSize counts IP (20) + UDP (8) + GVSP (8) headers,
+# on the wire every packet also carries Ethernet header/FCS (18), preamble (8) and gap (12)
+IP_UDP_GVSP_HEADER = 36
+ETHERNET_OVERHEAD = 38
+# Leader and trailer packets framing every block
+LEADER_TRAILER_BYTES = 2 * (IP_UDP_GVSP_HEADER + 48 + ETHERNET_OVERHEAD)
+
+LINE_RATE = 125_000_000  # bytes/s of a camera's own 1 GbE port
+
+
+@dataclass(frozen=True)
+class StreamDemand:
+    rig: str
+    width: int
+    height: int
+    pixel_format: str
+    fps: float
+    packet_size: int = 1500
+    weight: float = 1.0
+
+
+@dataclass(frozen=True)
+class StreamPlan:
+    rig: str
+    packet_size: int          # GevSCPSPacketSize
+    throughput_limit: int     # DeviceLinkThroughputLimit, bytes/s
+    packet_delay: int         # GevSCPD, timestamp ticks between packets
+    frame_bytes: int          # bytes on the wire per frame
+    demand: float             # bytes/s needed for the configured fps
+    frame_time: float         # seconds to transfer one frame at the assigned limit
+    max_fps: float            # highest fps the assigned limit sustains
+    fits: bool                # the configured fps fits in the assigned limit
+
+    def nodes(self) -> tuple:
+        """Camera node writes that apply the plan (ace 2 GigE)."""
+
+        return (
+            ("GevSCPSPacketSize", self.packet_size),
+            ("GevSCPD", self.packet_delay),
+            ("DeviceLinkThroughputLimitMode", "On"),
+            ("DeviceLinkThroughputLimit", self.throughput_limit),
+        )
+
+
+def bytes_per_pixel(pixel_format: str) -> float:
+    """Transfer size of one pixel, e.g. 1.5 for BayerRG12p, 2 for BayerRG12."""
+
+    if pixel_format.startswith("YCbCr422"):
+        return 2.0
+    family, bits = split_pixel_format(pixel_format)
+    packed = pixel_format.endswith("p") or pixel_format.endswith("packed")
+    if family in ("RGB", "BGR"):
+        return 3 * bits / 8
+    if packed or bits == 8:
+        return bits / 8
+    return 2.0  # 10/12 bit unpacked in 16 bit containers
+
+
+def frame_wire_bytes(width: int, height: int, pixel_format: str, packet_size: int) -> int:
+    """Bytes on the wire for one frame, including packet headers and Ethernet framing."""
+
+    payload = math.ceil(width * height * bytes_per_pixel(pixel_format))
+    per_packet = packet_size - IP_UDP_GVSP_HEADER
+    packets = math.ceil(payload / per_packet)
+    return payload + packets * (IP_UDP_GVSP_HEADER + ETHERNET_OVERHEAD) + LEADER_TRAILER_BYTES
+
+
+def plan_streams(
+    demands: list,
+    link_bandwidth: float = 125_000_000,
+    headroom: float = 0.1,
+    tick_frequency: float = 1e9,
+    line_rate: float = LINE_RATE,
+) -> dict:
+    """
+    Splits a shared link between cameras.
+
+    The usable bandwidth (``link_bandwidth`` minus ``headroom``) is shared max-min fair
+    by weight: a camera that needs less than its share gets what it needs and the rest
+    is split among the others. The limit is also what simultaneous snapshots get, so
+    cameras that trigger together no longer overrun the switch.
+
+    Args:
+        demands (list): StreamDemand per camera.
+        link_bandwidth (float): Bytes/s of the shared uplink.
+        headroom (float): Fraction kept free for resends and control traffic.
+        tick_frequency (float): Camera timestamp ticks per second (GevSCPD unit), 1 GHz on ace 2.
+        line_rate (float): Bytes/s of each camera's own port.
+
+    Returns:
+        dict: rig -> StreamPlan.
+
+    Raises:
+        ValueError: For an empty link or non-positive weights.
+    """
+
+    usable = link_bandwidth * (1 - headroom)
+    if usable <= 0:
+        raise ValueError("No bandwidth left after headroom")
+    if any(d.weight <= 0 for d in demands):
+        raise ValueError("Stream weights must be positive")
+
+    frame_bytes = {d.rig: frame_wire_bytes(d.width, d.height, d.pixel_format, d.packet_size) for d in demands}
+    needed = {d.rig: frame_bytes[d.rig] * d.fps for d in demands}
+
+    # Water filling: satisfy the smallest demands (per weight) first
+    allocation = {}
+    remaining = usable
+    pending = sorted(demands, key=lambda d: needed[d.rig] / d.weight)
+    while pending:
+        total_weight = sum(d.weight for d in pending)
+        d = pending[0]
+        share = remaining * d.weight / total_weight
+        if needed[d.rig] <= share:
+            allocation[d.rig] = needed[d.rig]
+            remaining -= needed[d.rig]
+            pending.pop(0)
+        else:
+            for d in pending:
+                allocation[d.rig] = remaining * d.weight / total_weight
+            break
+
+    # Unused bandwidth is handed out too, so frames transfer as fast as the link allows
+    spare = usable - sum(allocation.values())
+    total_weight = sum(d.weight for d in demands) or 1.0
+
+    plans = {}
+    for d in demands:
+        limit = int(min(allocation[d.rig] + spare * d.weight / total_weight, line_rate))
+        wire_packet = d.packet_size + ETHERNET_OVERHEAD
+        # Gap that stretches back-to-back packets at line rate to the assigned rate
+        delay = max(0.0, wire_packet / limit - wire_packet / line_rate) if limit > 0 else 0.0
+        plans[d.rig] = StreamPlan(
+            rig=d.rig,
+            packet_size=d.packet_size,
+            throughput_limit=limit,
+            packet_delay=int(delay * tick_frequency),
+            frame_bytes=frame_bytes[d.rig],
+            demand=needed[d.rig],
+            frame_time=frame_bytes[d.rig] / limit if limit else math.inf,
+            max_fps=limit / frame_bytes[d.rig] if frame_bytes[d.rig] else math.inf,
+            fits=limit >= needed[d.rig],
+        )
+    return plans
+
+
+def format_plan(plans: dict, link_bandwidth: float) -> str:
+    lines = [f"{'rig':8} {'packet':>6} {'limit MB/s':>10} {'delay':>7} {'frame MB':>8} {'need MB/s':>9} {'frame ms':>8} {'max fps':>7}  fits"]
+    for plan in plans.values():
+        lines.append(
+            f"{plan.rig:8} {plan.packet_size:6} {plan.throughput_limit / 1e6:10.1f} {plan.packet_delay:7} "
+            f"{plan.frame_bytes / 1e6:8.2f} {plan.demand / 1e6:9.1f} {plan.frame_time * 1000:8.1f} {plan.max_fps:7.1f}  "
+            f"{'yes' if plan.fits else 'NO'}"
+        )
+    total = sum(p.demand for p in plans.values())
+    lines.append(f"total demand {total / 1e6:.1f} MB/s of {link_bandwidth / 1e6:.1f} MB/s link")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from Camera.config_compiler import load_config
+
+    parser = argparse.ArgumentParser("GigE bandwidth plan")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--link", type=float, default=None, help="Override link_bandwidth (bytes/s)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    settings = dict(config.stream_settings)
+    if args.link is not None:
+        settings["link_bandwidth"] = args.link
+    plans = plan_streams(list(config.stream_demands.values()), settings["link_bandwidth"], settings["headroom"], settings["tick_frequency"])
+    print(format_plan(plans, settings["link_bandwidth"]))
@@ -1,201 +1,914 @@
 from pypylon import pylon
-import cv2, time, threading, os, logging
-
-from Camera.config_loader import config_loader
-
+import functools, itertools, time, threading, os, logging
+import numpy as np
+
+from Camera.config_loader import build_node_plan
+from Camera.config_compiler import load_config
+from Camera.image_writer import ImageWriter
+from Camera.raw_archive import RawArchive
+from Camera.grab_session import GrabSession
+from Camera.devices import create_device, device_identity, reopen_device, transport_plan, configure_stream_grabber, stream_statistics
+from Camera.node_writer import NodeWriter, StreamActiveError, STREAM_NODES, AUTO_NODES
+from Camera.scheduler import DeadlineScheduler
+from Camera.quality import measure, check
+from Camera.derivatives import DerivativeWriter
+from Camera.hdr import BracketBurst, merge_bracket
+from Camera.stacking import grab_stack
+from Camera.catalog import CaptureCatalog, DEFAULT_PATH as CATALOG_PATH
+from Camera.recovery import RecoverySupervisor
+from metrics import TimedLock, GRAB_SECONDS, MUTEX_WAIT_SECONDS, STORE_SECONDS, WRITE_QUEUE_DEPTH, CAPTURES
+# cv2 and the live view pipeline are imported where they are used; headless capture never needs them
+
+# Seconds a capture waits for a running recovery before giving up on the frame
+RECOVERY_TIMEOUT = 30.0
 
 class CameraControl:
-    def __init__(self, auto_interval=None) -> None:
-        self.camera = pylon.InstantCamera(
-            pylon.TlFactory.GetInstance().CreateFirstDevice()
-        )
+    def __init__(
+        self,
+        auto_interval=None,
+        missed_slots: str = "skip",
+        writer_workers: int = 2,
+        writer_queue_size: int = 8,
+        drop_policy: str = "block",
+        sink: str = "png",
+        rig: str = "NA",
+        grab_mode: str = None,
+        serial=None,
+        ip=None,
+        catalog: str = CATALOG_PATH,
+    ) -> None:
+        if sink not in ("png", "raw"):
+            raise ValueError(f"Invalid sink '{sink}', must be 'png' or 'raw'")
+
+        # Without serial/ip the first enumerated camera is used
+        self.serial = serial
+        self.ip = ip
+
+        self.camera = pylon.InstantCamera(create_device(serial, ip))
+        # Records how long captures, node writes and live view wait for the camera
+        self.camera_mutex = TimedLock(threading.Lock(), MUTEX_WAIT_SECONDS.labels(rig))
+
+        # Reconnects after removal callbacks or failed grabs, on its own thread
+        self.recovery = RecoverySupervisor(self)
+        self.recovery.watch(self.camera)
         self.camera.Open()
-        self.camera_mutex = threading.Lock()
+        # Reconnects go straight to this device instead of enumerating the network
+        self._identity = device_identity(self.camera.GetDeviceInfo())
+
+        # Caches node values so config pushes only write what changed
+        self.node_writer = self._make_node_writer()
+
+        # Metadata recorded alongside raw frames
+        self.rig = rig
+        self.camera_config_name = "DEFAULT"
+        self.light_config_name = "DEFAULT"
 
         self.logger = logging.getLogger(__name__)
+
+        # None keeps the StartGrabbingMax(1) per snapshot behaviour
+        self.grab_mode = grab_mode
+        self.grab_session = None
+        self.live_view = None
+
+        # Node writes that had to stop the stream (ROI, pixel format, packet size)
+        self.stream_stops = 0
+
+        # Transport problems seen by the stream grabber, summed over all captures
+        self.stream_resends = 0
+        self.stream_failed_buffers = 0
+        self._stream_counters = {}
+
         self.update_settings()
 
         for folder in ["./User_images", "./Captured_images"]:
             os.makedirs(folder, exist_ok=True)
 
+        # PNG encoding happens on these workers instead of the grab thread
+        self.image_writer = ImageWriter(
+            workers=writer_workers, queue_size=writer_queue_size, drop_policy=drop_policy
+        )
+
+        # Metric children of this rig, looked up once instead of on every capture
+        self._grab_seconds = GRAB_SECONDS.labels(rig)
+        self._store_seconds = STORE_SECONDS.labels(rig)
+        self._captures = {result: CAPTURES.labels(rig, result) for result in ("ok", "failed", "rejected", "error", "skipped")}
+        WRITE_QUEUE_DEPTH.labels(rig).set_function(self.image_writer.pending)
+
+        # Every stored frame is recorded in the SQLite catalog (None disables it)
+        self.catalog = CaptureCatalog(catalog) if catalog is not None else None
+        self._frame_seq = itertools.count()
+
+        # Preview, thumbnail and pyramid files next to each automatic capture
+        self.derivatives = None
+        derivatives = dict(load_config("config.yaml").derivatives)
+        if derivatives.pop("enabled"):
+            self.derivatives = DerivativeWriter(**derivatives)
+
+        # Frames retried or dropped by the on-capture quality checks
+        self.quality_retries = 0
+        self.quality_rejects = 0
+
+        # Raw sink stores undemosaiced frames in a memory-mapped session archive
+        self.raw_archive = RawArchive("./Raw_archive") if sink == "raw" else None
+
+        self.scheduler = None
         if auto_interval is not None:
-            self.run_in_thread(self.auto_pic_snapper, auto_interval)
+            self.auto_pic_snapper(auto_interval, missed_slots)
 
-    def snap_pic(self, user: bool = False) -> None:
+    def snap_pic(self, user: bool = False, reconnect: bool = True) -> None:
         """
         Captures a single frame from the Basler camera and saves it to disk.
         If called by the user, prompts for saving or viewing the image.
 
         Args:
             user (bool): If True, saves to './User_images'. If False, saves to './Captured_images'.
+            reconnect (bool): Reconnect inline after an error. If False the reconnect is
+                started in the background and this call returns straight away.
 
         Raises:
             TimeoutException: If the camera fails to return a frame within 5000ms.
         """
 
+        if self.recovery.recovering and not (reconnect and self.recovery.wait(RECOVERY_TIMEOUT)):
+            self.logger.warning("Camera is being recovered, capture skipped.")
+            self._captures["skipped"].inc()
+            return
+
         try:
-            with self.camera_mutex:
-                self.camera.StartGrabbingMax(1)
+            if self.live_view is not None and self.live_view.running:
+                # Live view owns the stream, take the newest frame from its ring
+                self._snap_live_view(user)
+                return
+
+            # Camera configs with stack_settings.frames > 1 average a burst instead
+            stack = None if user else self._stack_settings()
+            if stack is not None:
+                self.snap_stack(stack["frames"], stack["sigma_clip"], stack["min_frames"])
+                return
+
+            # Auto captures are checked against the camera config's quality_settings
+            quality = None if user else self._quality_settings()
+            attempts = 1 + (quality["retries"] if quality else 0)
+
+            for attempt in range(1, attempts + 1):
+                grabResult = self._grab(5000)
+
+                if not grabResult.GrabSucceeded():
+                    self.logger.error("Failed to grab image.")
+                    self._captures["failed"].inc()
+                    grabResult.Release()
+                    return
+
+                sidecar = None
+                if quality is not None:
+                    with grabResult.GetArrayZeroCopy() as raw:
+                        sidecar = self._quality_sidecar(raw, quality, attempt)
+                    verdict = self._quality_verdict(sidecar["failures"], attempt, attempts, quality["reject"])
+                    if verdict != "store":
+                        grabResult.Release()
+                        if verdict == "retry":
+                            continue
+                        return
+
+                with self._store_seconds.time():
+                    if not user and self.raw_archive is not None:
+                        # Copy straight from the grab buffer into the mapped chunk
+                        with grabResult.GetArrayZeroCopy() as raw:
+                            self._store_image(raw, grabResult.TimeStamp, user, sidecar)
+                    else:
+                        self._store_image(grabResult.Array, grabResult.TimeStamp, user, sidecar)
+                self._captures["ok"].inc()
 
-                grabResult = self.camera.RetrieveResult(
-                    5000, pylon.TimeoutHandling_ThrowException
-                )
+                grabResult.Release()
+                self._log_stream_statistics()
+                return
 
-            if grabResult.GrabSucceeded():
-                img = grabResult.Array
+        except StreamActiveError as e:
+            # The live view started between the check above and the grab or stack
+            self.logger.warning(f"Capture skipped: {e}")
+            self._captures["skipped"].inc()
+        except Exception as e:
+            self.logger.error(f"Error capturing image: {e}")
+            self._captures["error"].inc()
+            if reconnect:
+                self.try_reconnect(f"capture failed: {e}")
+            else:
+                self.reconnect_in_background(f"capture failed: {e}")
 
-                if user:
-                    while True:
-                        user_input = input(
-                            "Press s to save the image, v to view or q to quit: "
-                        )
+    def _snap_live_view(self, user: bool) -> None:
+        """``snap_pic`` from the live view's ring, with the same quality checks, retries and sidecar."""
 
-                        if user_input == "s":
-                            timestamp = time.strftime("%Y%m%d-%H%M%S")
-                            filename = f"image_{timestamp}.png"
-                            full_path = os.path.join("./User_images", filename)
-                            cv2.imwrite(full_path, img)
-                            self.logger.info(f"User saved image as {full_path}")
+        quality = None if user else self._quality_settings()
+        attempts = 1 + (quality["retries"] if quality else 0)
+        previous = None
 
-                        elif user_input == "v":
-                            cv2.imshow("Captured Image", img)
-                            cv2.waitKey(0)
-                            cv2.destroyAllWindows()
+        for attempt in range(1, attempts + 1):
+            frame = self._next_live_frame(previous)
+            if frame is None:
+                self.logger.error("Failed to grab image.")
+                self._captures["failed"].inc()
+                return
+            raw, timestamp = frame
+
+            sidecar = None
+            if quality is not None:
+                sidecar = self._quality_sidecar(raw, quality, attempt)
+                verdict = self._quality_verdict(sidecar["failures"], attempt, attempts, quality["reject"])
+                if verdict == "retry":
+                    previous = timestamp
+                    continue
+                if verdict == "reject":
+                    return
+
+            with self._store_seconds.time():
+                self._store_image(raw, timestamp, user, sidecar)
+            self._captures["ok"].inc()
+            return
+
+    def _next_live_frame(self, previous, timeout: float = 5.0):
+        """The live view's newest frame, waiting for one newer than the ``previous`` timestamp on a retry."""
+
+        deadline = time.monotonic() + timeout
+        while True:
+            live_view = self.live_view
+            frame = None if live_view is None else live_view.latest_raw(max(deadline - time.monotonic(), 0.0))
+            if frame is None or frame[1] != previous or time.monotonic() >= deadline:
+                return frame
+            time.sleep(0.01)
+
+    def _quality_sidecar(self, raw, quality: dict, attempt: int) -> dict:
+        """Measures a frame against ``quality_settings``; the sidecar lists the failed checks."""
+
+        metrics = measure(raw, self.pixel_format(), quality["target"], quality["stride"])
+        return dict(
+            metrics.to_dict(),
+            failures=check(metrics, quality),
+            attempt=attempt,
+            rig=self.rig,
+            camera_config=self.camera_config_name,
+            light_config=self.light_config_name,
+        )
 
-                        elif user_input == "q":
-                            break
+    def _quality_verdict(self, failures: list, attempt: int, attempts: int, reject: bool, kind: str = "frame") -> str:
+        """
+        Decides on a measured frame, counting and logging retries and rejects.
 
-                        else:
-                            print("Invalid input. Please try again.")
+        Returns:
+            str: "retry", "reject" or "store".
+        """
 
-                else:
-                    timestamp = time.strftime("%Y%m%d-%H%M%S")
-                    filename = f"image_{timestamp}.png"
-                    full_path = os.path.join("./Captured_images", filename)
-                    cv2.imwrite(full_path, img)
-                    self.logger.info(f"Auto saved image as {full_path}")
+        if failures and attempt < attempts:
+            self.quality_retries += 1
+            self.logger.warning(f"{kind.capitalize()} failed quality checks ({'; '.join(failures)}), retrying ({attempt}/{attempts - 1})")
+            return "retry"
+        if failures and reject:
+            self.quality_rejects += 1
+            self._captures["rejected"].inc()
+            self.logger.warning(f"Rejected {kind} after {attempt} attempt(s): {'; '.join(failures)}")
+            return "reject"
+        return "store"
+
+    def snap_bracket(self, exposures: list, gains: list = None, merge: bool = True) -> None:
+        """
+        Captures an exposure bracket in one armed burst and saves every frame, plus the
+        HDR merge of the raw frames as ``image_<frame id>.hdr.tiff`` (float32 radiance).
 
-            else:
-                self.logger.error("Failed to grab image.")
+        Args:
+            exposures (list): Exposure times in mikrosekunder.
+            gains (list): Gain per frame in dB, default the current gain.
+            merge (bool): Also write the HDR frame.
+        """
 
-            grabResult.Release()
+        if self.recovery.recovering:
+            self.logger.warning("Camera is being recovered, bracket skipped.")
+            return
 
+        try:
+            bracket = BracketBurst(self).capture(exposures, gains)
+        except StreamActiveError as e:
+            # Not a device fault, the camera is fine
+            self.logger.error(f"Bracket skipped: {e}")
+            return
         except Exception as e:
-            self.logger.error(f"Error capturing image: {e}")
-            self.try_reconnect()
-
-    def stream(self) -> None:
+            self.logger.error(f"Error capturing bracket: {e}")
+            self.reconnect_in_background(f"bracket failed: {e}")
+            return
+
+        for i, frame in enumerate(bracket.frames):
+            sidecar = {
+                "bracket_index": i,
+                "bracket_size": len(bracket.frames),
+                "exposure": bracket.exposures[i],
+                "gain": bracket.gains[i],
+            }
+            self._store_image(frame, bracket.timestamps[i], user=False, sidecar=sidecar)
+
+        if merge:
+            started = time.perf_counter()
+            hdr = merge_bracket(bracket.frames, bracket.exposures, bracket.gains, bracket.bits)
+            merge_ms = (time.perf_counter() - started) * 1000
+
+            captured_at, monotonic = time.time(), time.monotonic()
+            frame_id = self._frame_id(captured_at)
+            path = os.path.join("./Captured_images", f"image_{frame_id}.hdr.tiff")
+            sidecar = {
+                "exposures": bracket.exposures,
+                "gains": bracket.gains,
+                "bracket_ms": bracket.elapsed_ms,
+                "merge_ms": merge_ms,
+                "unit": "DN per mikrosekund at 0 dB",
+            }
+            entry = self._catalog_entry(frame_id, captured_at, monotonic, bracket.timestamps[0], hdr, sidecar, "hdr", path)
+            on_written = None if entry is None else functools.partial(self.catalog.record, **entry)
+            if self.image_writer.submit(path, hdr, sidecar=sidecar, on_written=on_written):
+                self.logger.info(f"HDR frame queued as {path} (bracket {bracket.elapsed_ms:.1f} ms, merge {merge_ms:.1f} ms)")
+
+    def snap_stack(self, frames: int, sigma_clip: float = 0.0, min_frames: int = 3) -> None:
         """
-        Starts a live video stream from the Basler camera using OpenCV.
+        Grabs ``frames`` frames in one free-running stream and saves their running mean
+        through the usual save path, plus the per-pixel variance as ``<image>.variance.tiff``.
+
+        Frames are folded into the accumulator as they arrive (Camera/stacking.py), so
+        memory does not depend on ``frames``. A stack that fails the camera config's
+        quality checks is grabbed again up to ``retries`` times, and with ``reject`` not saved.
+
+        Args:
+            frames (int): Frames to average.
+            sigma_clip (float): Per-pixel rejection of values this many standard
+                deviations off the running mean, e.g. insects; 0 disables it.
+            min_frames (int): Frames always accepted before clipping starts.
 
         Raises:
-            TimeoutException: If the camera fails to return a frame within 5000ms.
+            StreamActiveError: If the live view owns the stream.
+            Exception: Grab errors, for the caller's reconnect handling.
         """
 
-        try:
+        # Auto captures are checked against the camera config's quality_settings, like snap_pic
+        quality = self._quality_settings()
+        attempts = 1 + (quality["retries"] if quality else 0)
+
+        for attempt in range(1, attempts + 1):
             with self.camera_mutex:
-                self.camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+                if self.live_view is not None and self.live_view.running:
+                    raise StreamActiveError("Live view is running, stop it before stacking")
+                self._disarm_session()
+                try:
+                    stacker, dtype, hw_timestamp, timings = grab_stack(self.camera, frames, sigma_clip, min_frames)
+                finally:
+                    self._arm_session()
+
+            stacked, variance = stacker.result(dtype)
+            sidecar = dict(stacker.stats(), **{k: round(v, 2) for k, v in timings.items()})
+            if quality is not None:
+                metrics = measure(stacked, self.pixel_format(), quality["target"], quality["stride"])
+                failures = check(metrics, quality)
+                sidecar.update(metrics.to_dict(), failures=failures, attempt=attempt)
+
+                verdict = self._quality_verdict(failures, attempt, attempts, quality["reject"], kind="stack")
+                if verdict == "retry":
+                    continue
+                if verdict == "reject":
+                    return
+            sidecar.update(rig=self.rig, camera_config=self.camera_config_name, light_config=self.light_config_name)
+
+            self.logger.info(
+                f"Stacked {stacker.frames} frames in {timings['stack_ms']:.0f} ms ({timings['fps']:.1f} fps, "
+                f"{timings['add_ms']:.1f} ms per frame, {sidecar['rejected_fraction'] * 100:.2f} % clipped)"
+            )
+            with self._store_seconds.time():
+                base = self._store_image(stacked, hw_timestamp, False, sidecar)
+                if base is not None:
+                    self.image_writer.submit(base + ".variance.tiff", variance)
+
+            if base is None:
+                # The image writer queue was full
+                self._captures["failed"].inc()
+            else:
+                self._captures["ok"].inc()
+            return
+
+    def _store_image(self, img, hw_timestamp: int, user: bool, sidecar: dict = None):
+        """
+        Prompts the user for the image, or hands it to the raw archive / image writer.
+
+        Returns:
+            str: Path of the stored frame without extension, None for user images and dropped frames.
+        """
 
-                # Converter til OpenCV format (fra Basler format til BGR/RGB)
-                converter = pylon.ImageFormatConverter()
-                converter.OutputPixelFormat = pylon.PixelType_BGR8packed
-                converter.OutputBitAlignment = pylon.OutputBitAlignment_MsbAligned
+        captured_at, monotonic = time.time(), time.monotonic()
+        frame_id = self._frame_id(captured_at)
 
-                print("Live view kører... Tryk på 'q' for at afslutte.")
-                self.logger.info("Live view started.")
+        if user:
+            import cv2
+
+            while True:
+                user_input = input(
+                    "Press s to save the image, v to view or q to quit: "
+                )
+
+                if user_input == "s":
+                    filename = f"image_{frame_id}.png"
+                    full_path = os.path.join("./User_images", filename)
+                    cv2.imwrite(full_path, img)
+                    self.logger.info(f"User saved image as {full_path}")
+                    self._catalog_frame(frame_id, captured_at, monotonic, hw_timestamp, img, sidecar, "user", full_path)
 
-                prev_time = time.time()
+                elif user_input == "v":
+                    cv2.imshow("Captured Image", img)
+                    cv2.waitKey(0)
+                    cv2.destroyAllWindows()
 
-                while self.camera.IsGrabbing():
-                    grabResult = self.camera.RetrieveResult(
-                        5000, pylon.TimeoutHandling_ThrowException
+                elif user_input == "q":
+                    break
+
+                else:
+                    print("Invalid input. Please try again.")
+
+        elif self.raw_archive is not None:
+            index = self.raw_archive.append(
+                img,
+                rig=self.rig,
+                camera_config=self.camera_config_name,
+                light_config=self.light_config_name,
+                hw_timestamp=hw_timestamp,
+                timestamp=captured_at,
+                sidecar=sidecar,
+            )
+            self.logger.info(f"Auto archived raw frame {index} in {self.raw_archive.session_dir}")
+            self._catalog_frame(
+                frame_id, captured_at, monotonic, hw_timestamp, img, sidecar, "raw", self.raw_archive.session_dir, index
+            )
+            base = os.path.join(self.raw_archive.session_dir, f"frame_{index:06d}")
+            if self.derivatives is not None:
+                # img is a view of the grab buffer, the workers need their own copy
+                self.derivatives.submit(base, np.array(img), self.pixel_format())
+            return base
+
+        else:
+            filename = f"image_{frame_id}.png"
+            full_path = os.path.join("./Captured_images", filename)
+            base = os.path.splitext(full_path)[0]
+            # Taken now, the camera may be reconfigured before the write completes
+            entry = self._catalog_entry(frame_id, captured_at, monotonic, hw_timestamp, img, sidecar, "png", full_path)
+            pixel_format = self.pixel_format()
+
+            def written():
+                # Only frames that reached the disk are cataloged, drop_oldest can still evict this one
+                if entry is not None:
+                    self.catalog.record(**entry)
+                if self.derivatives is not None:
+                    self.derivatives.submit(base, img, pixel_format)
+
+            if not self.image_writer.submit(full_path, img, sidecar=sidecar, on_written=written):
+                return None
+            self.logger.info(f"Auto queued image as {full_path}")
+            return base
+
+    def _frame_id(self, captured_at: float) -> str:
+        # Milliseconds, rig, pid and a per-process counter keep names unique within the same
+        # second, also when the daemon and a oneshot capture.py or main.py share a rig
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(captured_at))
+        return f"{stamp}-{int(captured_at * 1000) % 1000:03d}_{self.rig}_{os.getpid()}-{next(self._frame_seq):04d}"
+
+    def _catalog_frame(self, frame_id, captured_at, monotonic, hw_timestamp, img, sidecar, sink, path, index=None) -> None:
+        entry = self._catalog_entry(frame_id, captured_at, monotonic, hw_timestamp, img, sidecar, sink, path, index)
+        if entry is not None:
+            self.catalog.record(**entry)
+
+    def _catalog_entry(self, frame_id, captured_at, monotonic, hw_timestamp, img, sidecar, sink, path, index=None):
+        """Catalog fields of a frame as captured, or None without a catalog."""
+
+        if self.catalog is None:
+            return None
+
+        nodes = self.node_values()
+        sidecar = sidecar or {}
+        return dict(
+            frame_id=frame_id,
+            captured_at=captured_at,
+            monotonic=monotonic,
+            hw_timestamp=hw_timestamp,
+            rig=self.rig,
+            camera_config=self.camera_config_name,
+            light_config=self.light_config_name,
+            exposure=sidecar.get("exposure", nodes.get("ExposureTime")),  # bracket frames carry their own
+            gain=sidecar.get("gain", nodes.get("Gain")),
+            pixel_format=nodes.get("PixelFormat"),
+            width=img.shape[1],
+            height=img.shape[0],
+            nodes=nodes,
+            brightness=sidecar.get("brightness"),
+            clipped=sidecar.get("clipped_high"),
+            sharpness=sidecar.get("sharpness"),
+            quality_failures=sidecar.get("failures"),
+            sink=sink,
+            path=path,
+            archive_index=index,
+        )
+
+    def node_values(self) -> dict:
+        """
+        Node values in effect on the camera.
+
+        Written nodes come from the node writer's cache; values under a running auto
+        function drift, so those are read back from the camera.
+        """
+
+        nodes = self.node_writer.snapshot()
+        for auto, target in AUTO_NODES.items():
+            if nodes.get(auto, "Off") != "Off":
+                try:
+                    nodes[target] = getattr(self.camera, target).Value
+                except Exception:
+                    pass
+        return nodes
+
+    def stream(self, preview_scale: float = 1.0) -> None:
+        """
+        Starts a live video stream from the Basler camera using OpenCV.
+
+        Grabbing and demosaicing run in a LiveViewPipeline, so a slow display only
+        drops preview frames and snapshots can still be taken meanwhile.
+
+        Args:
+            preview_scale (float): Scale of the displayed frames, e.g. 0.5 for half size.
+
+        Raises:
+            TimeoutException: If the camera fails to return a frame within 5000ms.
+        """
+
+        import cv2
+        from Camera.live_view import LiveViewPipeline, RateMeter
+
+        try:
+            # Join a pipeline that is already running (e.g. for the preview server)
+            owns_pipeline = self.live_view is None or not self.live_view.running
+            if owns_pipeline:
+                # Publishes itself as self.live_view under camera_mutex
+                pipeline = LiveViewPipeline(self, preview_scale=preview_scale)
+                pipeline.start()
+            else:
+                pipeline = self.live_view
+
+            print("Live view kører... Tryk på 'q' for at afslutte.")
+            self.logger.info("Live view started.")
+
+            display_fps = RateMeter()
+            display = None
+            seq = 0
+
+            try:
+                while pipeline.running:
+                    item = pipeline.checkout_preview(seq, timeout=1.0)
+                    if item is None:
+                        continue
+
+                    slot, seq, preview = item
+                    try:
+                        # Own copy so the overlay never touches the shared preview
+                        if display is None or display.shape != preview.shape:
+                            display = np.empty_like(preview)
+                        np.copyto(display, preview)
+                    finally:
+                        pipeline.checkin_preview(slot)
+
+                    display_fps.tick()
+
+                    # Overlay sensor and display FPS separately
+                    cv2.putText(
+                        display,
+                        f"Sensor FPS: {pipeline.sensor_fps.rate:.1f}  Display FPS: {display_fps.rate:.1f}",
+                        (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        1,
+                        (0, 255, 0),
+                        2,
                     )
 
-                    if grabResult.GrabSucceeded():
-                        # Konverter billedet til et format OpenCV kan forstå (numpy array)
-                        image = converter.Convert(grabResult)
-                        frame = image.GetArray()
-
-                        # Calculate FPS
-                        current_time = time.time()
-                        fps_actual = 1 / (current_time - prev_time)
-                        prev_time = current_time
-
-                        # Overlay FPS text on the image
-                        cv2.putText(
-                            frame,
-                            f"FPS: {fps_actual:.1f}",
-                            (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1,
-                            (0, 255, 0),
-                            2,
-                        )
-
-                        # Vis billedet i et vindue
-                        cv2.imshow("Basler ace 2 Live View", frame)
-
-                        # Stop hvis brugeren trykker på 'q'
-                        if cv2.waitKey(1) & 0xFF == ord("q"):
-                            self.logger.info("Live view stopped by user.")
-                            break
-                    else:
-                        self.logger.error("Failed to grab image (stream).")
+                    # Vis billedet i et vindue
+                    cv2.imshow("Basler ace 2 Live View", display)
 
-                    grabResult.Release()
+                    # Stop hvis brugeren trykker på 'q'
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        self.logger.info("Live view stopped by user.")
+                        break
 
+            finally:
                 # Ryd op
-                self.camera.StopGrabbing()
+                if owns_pipeline:
+                    pipeline.stop()
 
             cv2.destroyAllWindows()
-        
+            self.logger.info(
+                f"Live view ended (sensor {pipeline.sensor_fps.rate:.1f} FPS, "
+                f"display {display_fps.rate:.1f} FPS, {pipeline.dropped} frames dropped)."
+            )
+
+            if pipeline.error is not None:
+                raise pipeline.error
+
         except Exception as e:
             self.logger.error(f"Error during live stream: {e}")
-            self.try_reconnect()
+            self.try_reconnect(f"live view failed: {e}")
 
-    def auto_pic_snapper(self, interval: int) -> None:
+    def auto_pic_snapper(self, interval: float, missed_slots: str = "skip", align: bool = True) -> DeadlineScheduler:
         """
-        Automatically takes pictures at specified intervals.
+        Takes pictures on a fixed grid of deadlines, independent of how long each capture takes.
 
         Args:
-            interval (int): Time in seconds between each picture.
-
-        Raises:
-            TimeoutException: If the camera fails to return a frame within 5000ms.
+            interval (float): Time in seconds between each picture.
+            missed_slots (str): "skip" slots that come up while a capture is still running,
+                or "catch_up" by capturing once per missed slot afterwards.
+            align (bool): Start on a wall-clock multiple of ``interval`` so several rigs
+                capture at the same instant.
+
+        Returns:
+            DeadlineScheduler: The running scheduler, more jobs can be added to it.
         """
 
-        self.logger.info(f"Auto picture snapper started with interval {interval} seconds.")
-        
-        while True:
-            self.snap_pic(user=False)
-            time.sleep(interval)
+        if self.scheduler is None:
+            self.scheduler = DeadlineScheduler(workers=1)  # one camera, captures never overlap
+            self.scheduler.start()
+
+        self.scheduler.add_job(
+            "auto_pic_snapper", interval, lambda: self.snap_pic(user=False, reconnect=False),
+            policy=missed_slots, align=align,
+        )
+        self.logger.info(f"Auto picture snapper started with interval {interval} seconds ({missed_slots} missed slots).")
+        return self.scheduler
+
+    def reconnect_in_background(self, reason: str = "reconnect requested") -> None:
+        """Hands the reconnect to the recovery supervisor without waiting for it."""
+        self.recovery.request(reason)
 
     def update_settings(self) -> None:
         """Loads camera settings from config file."""
 
         try:
-            config_loader(self.camera)
-            self.logger.info("Camera settings updated.")
-        
+            # The mutex keeps captures off the session while it is down and rewritten
+            with self.camera_mutex:
+                # ROI and pixel format can only be written while the stream is stopped
+                self._disarm_session()
+                try:
+                    config = load_config("config.yaml")
+                    written = self.node_writer.apply(build_node_plan("config.yaml") + self._transport_plan(config))
+                    if self.camera.IsGrabbing():
+                        # Live view owns the stream, its buffers stay as they are
+                        self.logger.warning("Camera is grabbing, stream grabber settings left unchanged.")
+                    else:
+                        self._configure_stream_grabber(config)
+                finally:
+                    self._arm_session()
+            self.logger.info(
+                f"Camera settings updated ({written} nodes written, "
+                f"{self.node_writer.round_trips_saved} round-trips saved so far)."
+            )
+
+        except StreamActiveError as e:
+            # A usage conflict (e.g. ROI change during live view), the camera is fine
+            self.logger.error(f"Settings not updated: {e}")
+
         except Exception as e:
-            self.try_reconnect()
+            self.logger.error(f"Error updating settings: {e}")
+            self.try_reconnect(f"settings update failed: {e}")
     
 
-    def try_reconnect(self):
-        """Attempts to re-open the camera if lost."""
+    def write_nodes(self, writes: list, force: bool = False) -> int:
+        """
+        Writes (node name, value) pairs to the camera, pausing the grab session if needed.
+        Nodes whose cached value already matches are skipped (see NodeWriter).
+
+        Args:
+            writes (list): Node writes, e.g. a full ``build_node_plan``.
+            force (bool): Also write nodes whose cached value already matches.
+
+        Returns:
+            int: Number of nodes actually written.
+        """
+
+        with self.camera_mutex:
+            # Only stop the stream if a stream node actually differs from the camera's value
+            needs_stop = any(node in STREAM_NODES for node, _ in self.node_writer.pending(writes, force))
+            if needs_stop:
+                self.stream_stops += 1
+                self._disarm_session()
+
+            try:
+                written = self.node_writer.apply(writes, force=force)
+                if written and not needs_stop and self.grab_session is not None:
+                    self.grab_session.settings_changed()
+                return written
+            finally:
+                if needs_stop:
+                    self._arm_session()
+
+    def stream_statistics(self) -> dict:
+        """
+        Reads the stream grabber counters (see ``Camera.devices.STREAM_STATISTICS``).
+
+        Returns:
+            dict: Counter name -> value since the stream was started; counters the
+            transport layer does not provide are left out.
+        """
+
+        return stream_statistics(self.camera)
+
+    def _log_stream_statistics(self) -> dict:
+        """Logs what the stream grabber counters did during the last capture and returns the deltas."""
+
+        # pylon restarts the counters with every StartGrabbing, so without a persistent
+        # grab session they already cover just this capture
+        counters = self.stream_statistics()
+        baseline = self._stream_counters if self.grab_session is not None else {}
+        delta = {name: value - baseline.get(name, 0) for name, value in counters.items()}
+        self._stream_counters = counters
+
+        resends = delta.get("resend_requests", 0)
+        failed = delta.get("failed_buffers", 0)
+        self.stream_resends += resends
+        self.stream_failed_buffers += failed
+        if resends or failed:
+            self.logger.warning(
+                f"Stream: {resends} resend requests, {delta.get('resent_packets', 0)} packets resent, "
+                f"{failed} failed buffers, {delta.get('buffer_underruns', 0)} buffer underruns"
+            )
+        else:
+            self.logger.debug(f"Stream statistics: {delta}")
+        return delta
+
+    def _transport_plan(self, config) -> list:
+        """Packet size, packet delay and throughput limit for this rig, GigE cameras only."""
+
+        return transport_plan(self.camera, config, self.rig)
+
+    def _configure_stream_grabber(self, config) -> None:
+        """Buffer count and resend handling; must be set while the camera is not grabbing."""
+
+        configure_stream_grabber(self.camera, config)
+
+    def grab_frame(self, timeout_ms: int = 5000):
+        """
+        Grabs a single frame without saving it.
+
+        Returns:
+            np.ndarray: The raw frame, or None if the grab failed.
+        """
+
+        if self.live_view is None or not self.live_view.running:
+            try:
+                grabResult = self._grab(timeout_ms)
+            except StreamActiveError:
+                pass  # the live view started meanwhile
+            else:
+                try:
+                    return grabResult.Array if grabResult.GrabSucceeded() else None
+                finally:
+                    grabResult.Release()
+
+        live_view = self.live_view
+        frame = None if live_view is None else live_view.latest_raw(timeout_ms / 1000)
+        return None if frame is None else frame[0]
+
+    def _grab(self, timeout_ms: int):
+        """
+        One grab result from the armed session or a single-frame stream; the caller releases it.
+
+        Raises:
+            StreamActiveError: If the live view owns the stream.
+        """
+
+        with self.camera_mutex, self._grab_seconds.time():
+            # Checked under the mutex, the live view starts and stops its stream under it too
+            if self.live_view is not None and self.live_view.running:
+                raise StreamActiveError("Live view is running, take the frame from its ring")
+            if self.grab_session is not None:
+                return self.grab_session.snap(timeout_ms)
+            self.camera.StartGrabbingMax(1)
+            return self.camera.RetrieveResult(timeout_ms, pylon.TimeoutHandling_ThrowException)
+
+    def try_reconnect(self, reason: str = "reconnect requested", timeout: float = None) -> bool:
+        """
+        Has the recovery supervisor re-open the camera and waits for it.
+
+        Args:
+            reason (str): Logged with the recovery time.
+            timeout (float): Longest wait in seconds, default ``RECOVERY_TIMEOUT``.
+
+        Returns:
+            bool: True if the camera is back, False if it is still being recovered.
+        """
+
+        self.recovery.request(reason)
+        if self.recovery.wait(RECOVERY_TIMEOUT if timeout is None else timeout):
+            return True
+        self.logger.error("Camera not recovered yet, still retrying in the background.")
+        return False
+
+    def _reopen(self) -> None:
+        """
+        Replaces a lost camera; called by the recovery supervisor only.
+
+        The device is created from the cached identity and the node values of the
+        node writer's snapshot are written back, so only what the new camera does not
+        already hold is written. Without a snapshot the config is applied in full.
+        """
+
+        snapshot = self._restorable(self.node_writer.snapshot())
+        with self.camera_mutex:
+            try:
+                self.camera.DestroyDevice()  # frees the dead handle, the callbacks stay registered
+            except Exception:
+                pass
+
+            camera = pylon.InstantCamera(reopen_device(self._identity))
+            self.recovery.watch(camera)
+            camera.Open()
+            self.camera = camera
+            self.node_writer = self._make_node_writer()
+
+            config = load_config("config.yaml")
+            plan = list(snapshot.items()) or build_node_plan("config.yaml") + self._transport_plan(config)
+            written = self.node_writer.apply(plan)
+            self._configure_stream_grabber(config)
+            self._arm_session()
+        self.logger.info(f"Camera re-opened, {written} nodes restored.")
+
+    @staticmethod
+    def _restorable(snapshot: dict) -> dict:
+        # Values an active auto function was driving are stale, leave them to the auto function
+        return {
+            node: value
+            for node, value in snapshot.items()
+            if value is not None and not any(target == node and snapshot.get(auto) != "Off" for auto, target in AUTO_NODES.items())
+        }
+
+
+    def _quality_settings(self):
+        """quality_settings of the camera config in use, or None if checks are disabled."""
 
         try:
-            self.camera = pylon.InstantCamera(
-            pylon.TlFactory.GetInstance().CreateFirstDevice()
-        )
-            self.camera.Close()
-            self.camera.Open()
-            self.update_settings()
-            self.logger.info("Camera reconnected successfully.")
+            quality = load_config("config.yaml").quality(self.camera_config_name)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No quality checks for [{self.camera_config_name}]: {e}")
+            return None
+        return quality if quality["enabled"] else None
 
-        except Exception as e:
-            self.logger.error(f"Reconnection failed: {e}")
+    def _stack_settings(self):
+        """stack_settings of the camera config in use, or None for single-frame captures."""
 
+        try:
+            stack = load_config("config.yaml").stacking(self.camera_config_name)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No frame stacking for [{self.camera_config_name}]: {e}")
+            return None
+        return stack if stack["frames"] > 1 else None
+
+    def pixel_format(self) -> str:
+        # Cached by the node writer once a plan has been applied, so usually no round-trip
+        return self.node_writer.snapshot().get("PixelFormat") or self.camera.PixelFormat.Value
+
+    def _make_node_writer(self) -> NodeWriter:
+        # pylon's emulated camera lacks the ace 2 auto function nodes
+        emulated = self.camera.GetDeviceInfo().GetDeviceClass() == "BaslerCamEmu"
+        return NodeWriter(self.camera, skip_missing=emulated)
+
+    def _arm_session(self) -> None:
+        """Arms a persistent grab session if a grab mode was requested."""
+
+        if self.grab_mode is None:
+            return
+        if self.grab_session is None or self.grab_session.camera is not self.camera:
+            buffers = load_config("config.yaml").stream_settings["max_num_buffer"]
+            self.grab_session = GrabSession(self.camera, mode=self.grab_mode, buffers=buffers)
+        if not self.grab_session.armed:
+            self._stream_counters = {}  # pylon restarts them with the grab
+        self.grab_session.arm()
+
+    def _disarm_session(self) -> None:
+        if (
+            self.grab_session is not None
+            and self.grab_session.camera is self.camera
+            and self.camera.IsOpen()
+        ):
+            self.grab_session.disarm()
+
+    def close(self) -> None:
+        """Flushes pending image writes and closes the camera."""
+
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self.recovery.stop()
+        self._disarm_session()
+        self.image_writer.close()
+        WRITE_QUEUE_DEPTH.remove(self.rig)
+        if self.derivatives is not None:
+            self.derivatives.close()
+        if self.catalog is not None:
+            self.catalog.close()
+        if self.raw_archive is not None:
+            self.raw_archive.close()
+        if self.camera.IsOpen():
+            self.camera.Close()
 
     @staticmethod
     def run_in_thread(func, *args) -> threading.Thread:
@@ -227,5 +940,4 @@ if __name__ == "__main__":
 
     finally:
         print("Lukker kameraet")
-        if hasattr(camera_control, "camera") and camera_control.camera.IsOpen():
-            camera_control.camera.Close()
+        camera_control.close()
@@ -0,0 +1,206 @@
+'''
+SQLite catalog of every captured frame.
+
+The capture path only puts a record on a queue; a writer thread inserts the queued
+records in one transaction per batch. The database runs in WAL mode, so the daemon,
+oneshot captures and queries can use it at the same time.
+Query it with ``python3 catalog.py`` (see --help).
+'''
+
+import json, queue, socket, sqlite3, threading, time, logging
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    id              INTEGER PRIMARY KEY,
+    frame_id        TEXT UNIQUE NOT NULL,
+    captured_at     REAL NOT NULL,      -- host wall clock (time.time())
+    monotonic       REAL,               -- host time.monotonic(), for ordering within a run
+    hw_timestamp    INTEGER,            -- camera tick counter from the grab result
+    host            TEXT,
+    rig             TEXT,
+    camera_config   TEXT,
+    light_config    TEXT,
+    exposure        REAL,               -- ExposureTime, mikrosekunder
+    gain            REAL,               -- Gain, dB
+    pixel_format    TEXT,
+    width           INTEGER,
+    height          INTEGER,
+    nodes           TEXT,               -- JSON of all node values in effect
+    brightness      REAL,
+    clipped         REAL,
+    sharpness       REAL,
+    quality_failures TEXT,              -- JSON list, empty if the frame passed
+    sink            TEXT,               -- png, raw, user or hdr
+    path            TEXT,               -- image file, or raw archive session directory
+    archive_index   INTEGER             -- frame index within the raw archive session
+);
+CREATE INDEX IF NOT EXISTS frames_time ON frames (captured_at);
+CREATE INDEX IF NOT EXISTS frames_rig_config ON frames (rig, camera_config, light_config, captured_at);
+CREATE INDEX IF NOT EXISTS frames_config ON frames (camera_config, light_config, captured_at);
+"""
+
+COLUMNS = (
+    "frame_id", "captured_at", "monotonic", "hw_timestamp", "host", "rig", "camera_config", "light_config",
+    "exposure", "gain", "pixel_format", "width", "height", "nodes", "brightness", "clipped", "sharpness",
+    "quality_failures", "sink", "path", "archive_index",
+)
+
+DEFAULT_PATH = "./capture_catalog.sqlite"
+
+
+def connect(path: str = DEFAULT_PATH) -> sqlite3.Connection:
+    """Opens (and if needed creates) the catalog database."""
+
+    connection = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")  # WAL keeps the database consistent, a crash may lose the last batch
+    connection.executescript(SCHEMA)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+class CaptureCatalog:
+    """
+    Batched writer for the frame catalog.
+
+    Args:
+        path (str): SQLite database file.
+        batch_size (int): Records per transaction.
+        flush_interval (float): Longest time a record waits before its batch is committed.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, batch_size: int = 64, flush_interval: float = 1.0) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+        self.host = socket.gethostname()
+
+        self._connection = connect(path)
+        self._queue = queue.Queue()
+        self._closed = False
+        self.recorded = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._writer, name="CatalogWriter", daemon=True)
+        self._thread.start()
+
+    def record(self, **fields) -> None:
+        """
+        Queues one frame record. Keys are ``COLUMNS``; ``nodes`` and ``quality_failures``
+        may be given as dict/list and are stored as JSON.
+
+        Raises:
+            ValueError: For keys that are not catalog columns.
+        """
+
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalog fields: {', '.join(sorted(unknown))}")
+        for field in ("nodes", "quality_failures"):
+            if field in fields and not isinstance(fields[field], (str, type(None))):
+                fields[field] = json.dumps(fields[field])
+        fields.setdefault("host", self.host)
+        self._queue.put(tuple(fields.get(column) for column in COLUMNS))
+
+    def flush(self) -> None:
+        """Blocks until every queued record is committed."""
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._connection.close()
+        self.logger.info(f"Catalog {self.path} closed ({self.recorded} frames in {self.batches} transactions).")
+
+    def _writer(self) -> None:
+        # Plain INSERT: a reused frame_id is an error to report, never a row to overwrite
+        insert = f"INSERT INTO frames ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if not batch:
+                continue
+            try:
+                try:
+                    with self._connection:  # one transaction per batch
+                        self._connection.executemany(insert, batch)
+                    self.recorded += len(batch)
+                except sqlite3.IntegrityError:
+                    # The batch was rolled back; keep every record but the duplicates
+                    for record in batch:
+                        try:
+                            with self._connection:
+                                self._connection.execute(insert, record)
+                            self.recorded += 1
+                        except sqlite3.IntegrityError as e:
+                            self.logger.error(f"Catalog record for frame {record[0]} not written: {e}")
+                self.batches += 1
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to write {len(batch)} catalog records: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+def query(
+    connection: sqlite3.Connection,
+    rig: str = None,
+    camera_config: str = None,
+    light_config: str = None,
+    since: float = None,
+    until: float = None,
+    failed: bool = None,
+    limit: int = None,
+) -> list:
+    """
+    Selects frames by rig, config names, wall-clock range and quality outcome.
+
+    Args:
+        since/until (float): ``time.time()`` bounds, inclusive/exclusive.
+        failed (bool): Only frames that failed (True) or passed (False) the quality checks.
+
+    Returns:
+        list: sqlite3.Row objects, oldest first.
+    """
+
+    clauses, values = [], []
+    for column, value in (("rig", rig), ("camera_config", camera_config), ("light_config", light_config)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            values.append(value)
+    if since is not None:
+        clauses.append("captured_at >= ?")
+        values.append(since)
+    if until is not None:
+        clauses.append("captured_at < ?")
+        values.append(until)
+    if failed is not None:
+        clauses.append("quality_failures IS NOT NULL AND quality_failures " + ("!= '[]'" if failed else "= '[]'"))
+
+    sql = "SELECT * FROM frames"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY captured_at"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return connection.execute(sql, values).fetchall()
+
@@ -0,0 +1,467 @@
+import os, hashlib, threading, logging
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import yaml
+
+from Camera.config_loader import build_node_plan
+from Camera.bandwidth import StreamDemand, plan_streams
+
+# Sensor and parameter limits of the Basler ace 2 used on the rigs
+SENSOR_WIDTH = 3548
+SENSOR_HEIGHT = 3552
+GAIN_RANGE = (0.0, 24.0)
+EXPOSURE_RANGE = (1.0, 10_000_000.0)  # mikrosekunder
+STROBE_SOURCES = ("ExposureActive", "FrameTriggerWait", "Timer1Active", "UserOutput1")
+
+# derivatives keys and their values when left out of config.yaml
+DERIVATIVE_DEFAULTS = {
+    "enabled": False,
+    "workers": 2,
+    "queue_size": 8,
+    "preview_size": 1280,
+    "thumbnail_size": 256,
+    "pyramid": True,
+    "tile_size": 256,
+    "jpeg_quality": 85,
+}
+
+# quality_settings keys and their values when left out of config.yaml
+QUALITY_DEFAULTS = {
+    "enabled": False,
+    "stride": 4,
+    "max_brightness_error": 1.0,
+    "max_clipped": 1.0,
+    "min_sharpness": 0.0,
+    "retries": 0,
+    "reject": False,
+}
+
+# stack_settings keys and their values when left out of config.yaml
+STACK_DEFAULTS = {
+    "frames": 1,          # 1 captures a single frame as usual
+    "sigma_clip": 4.0,    # 0 disables clipping
+    "min_frames": 3,
+}
+
+# stream_settings keys and their values when left out of config.yaml
+STREAM_DEFAULTS = {
+    "enabled": True,
+    "link_bandwidth": 125_000_000,  # bytes/s, 1 GbE uplink of the PoE switch
+    "headroom": 0.1,
+    "packet_size": 1500,
+    "fps": 1.0,  # frames/s per rig unless setups.<rig>.camera.stream.fps is set; rigs take single snapshots
+    "tick_frequency": 1_000_000_000,  # GevSCPD unit, 1 GHz timestamp clock on ace 2
+    "max_num_buffer": 10,
+    "enable_resend": True,
+}
+# setups.<rig>.camera.stream keys
+RIG_STREAM_KEYS = ("weight", "packet_size", "fps")
+PACKET_SIZE_RANGE = (576, 9000)
+
+_cache = {}
+_cache_lock = threading.Lock()
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CompiledConfig:
+    """
+    Parsed, inherited and validated config.yaml.
+
+    Camera configs are stored as tuples of (node name, value) writes ready for the
+    camera; everything else is exposed as read-only mappings.
+    """
+
+    path: str
+    digest: str
+    camera_plans: MappingProxyType   # config name (incl. "DEFAULT") -> tuple of node writes
+    camera_configs: MappingProxyType  # config name (incl. "DEFAULT") -> merged settings
+    quality_checks: MappingProxyType  # config name (incl. "DEFAULT") -> quality settings incl. target
+    stack_settings: MappingProxyType  # config name (incl. "DEFAULT") -> frame stacking settings
+    light_configs: MappingProxyType   # config name (incl. "DEFAULT") -> {channel: level}
+    rig_plans: MappingProxyType       # rig name -> tuple of node writes
+    strobe_plans: MappingProxyType    # rig name -> tuple of line output node writes
+    strobe_lights: frozenset          # light configs that are only lit during exposure
+    derivatives: MappingProxyType     # preview/thumbnail/pyramid settings (Camera/derivatives.py)
+    stream_settings: MappingProxyType  # shared GigE link settings (Camera/bandwidth.py)
+    stream_demands: MappingProxyType  # rig name -> StreamDemand
+    stream_plans: MappingProxyType    # rig name -> StreamPlan
+    schedule: tuple                   # capture_daemon.py jobs: {every, offset, missed, tune, rigs, captures}
+    setups: MappingProxyType
+    raw: MappingProxyType
+
+    def camera_plan(self, name: str) -> tuple:
+        if name not in self.camera_plans:
+            raise ValueError(f"Unknown camera config '{name}'")
+        return self.camera_plans[name]
+
+    def quality(self, name: str):
+        if name not in self.quality_checks:
+            raise ValueError(f"Unknown camera config '{name}'")
+        return self.quality_checks[name]
+
+    def stacking(self, name: str):
+        if name not in self.stack_settings:
+            raise ValueError(f"Unknown camera config '{name}'")
+        return self.stack_settings[name]
+
+    def light_config(self, name: str):
+        if name not in self.light_configs:
+            raise ValueError(f"Unknown light config '{name}'")
+        return self.light_configs[name]
+
+    def is_strobe(self, name: str) -> bool:
+        return name in self.strobe_lights
+
+    def strobe_plan(self, rig: str) -> tuple:
+        if rig not in self.strobe_plans:
+            raise ValueError(f"No strobe output configured for rig '{rig}'")
+        return self.strobe_plans[rig]
+
+    def stream_plan(self, rig: str):
+        """StreamPlan of ``rig``, or None if stream settings are disabled or the rig is unknown."""
+        if not self.stream_settings["enabled"]:
+            return None
+        return self.stream_plans.get(rig)
+
+
+def load_config(path: str = "config.yaml") -> CompiledConfig:
+    """
+    Returns the compiled config for ``path``, recompiling only if the file changed.
+
+    The file is stat'ed on every call; it is re-read only when its mtime or size
+    changed, and recompiled only when its content hash differs.
+
+    Raises:
+        ValueError: Listing every invalid field if the config does not validate.
+    """
+
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with open(key, "rb") as file:
+            data = file.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        if cached is not None and cached[1].digest == digest:
+            compiled = cached[1]  # touched but unchanged
+        else:
+            compiled = compile_config(data, key, digest)
+            _logger.info(f"Compiled {path} ({digest[:12]})")
+
+        _cache[key] = (stamp, compiled)
+        return compiled
+
+
+def compile_config(data, path: str = "<memory>", digest: str = None) -> CompiledConfig:
+    """
+    Parses and validates a config.yaml document.
+
+    Args:
+        data: YAML text/bytes or an already parsed dict.
+
+    Raises:
+        ValueError: Listing every invalid field.
+    """
+
+    raw = yaml.safe_load(data) if isinstance(data, (str, bytes)) else data
+    if digest is None:
+        digest = hashlib.sha256(repr(raw).encode()).hexdigest()
+
+    errors = []
+    default_camera = raw["DEFAULT"]["camera_config"]
+    default_light = raw["DEFAULT"]["light_config"]
+
+    camera_configs = {"DEFAULT": default_camera}
+    for name, settings in (raw.get("camera_configs") or {}).items():
+        camera_configs[name] = _merge(default_camera, settings)
+
+    light_configs = {"DEFAULT": default_light}
+    strobe_lights = set()
+    for name, settings in (raw.get("light_configs") or {}).items():
+        settings = _merge(default_light, settings)
+        # "strobe" is a mode flag, not a channel
+        if settings.pop("strobe", False):
+            strobe_lights.add(name)
+        light_configs[name] = settings
+
+    camera_plans = {}
+    quality_checks = {}
+    stack_settings = {}
+    for name, settings in camera_configs.items():
+        camera_plans[name] = _compile_camera(f"camera_configs.{name}", settings, errors)
+        quality_checks[name] = _compile_quality(f"camera_configs.{name}", settings, errors)
+        stack_settings[name] = _compile_stack(f"camera_configs.{name}", settings, errors)
+
+    for name, settings in light_configs.items():
+        _validate_light(f"light_configs.{name}", settings, errors)
+
+    stream_settings = _compile_stream_settings(raw.get("stream_settings") or {}, errors)
+
+    rig_plans = {}
+    strobe_plans = {}
+    stream_demands = {}
+    default_strobe = raw["DEFAULT"].get("strobe_config")
+    for rig, setup in (raw.get("setups") or {}).items():
+        settings = _merge(default_camera, setup["camera"].get("settings") or {})
+        rig_plans[rig] = _compile_camera(f"setups.{rig}.camera.settings", settings, errors)
+        if rig_plans[rig]:
+            stream_demands[rig] = _compile_stream_demand(rig, rig_plans[rig], setup["camera"].get("stream") or {}, stream_settings, errors)
+        if default_strobe is not None or "strobe" in setup:
+            strobe = _merge(default_strobe or {}, (setup.get("strobe") or {}).get("settings") or {})
+            strobe_plans[rig] = _compile_strobe(f"setups.{rig}.strobe", strobe, errors)
+
+    derivatives = _compile_derivatives(raw.get("derivatives") or {}, errors)
+    schedule = _compile_schedule(raw.get("schedule") or [], camera_configs, light_configs, raw.get("setups") or {}, errors)
+
+    if errors:
+        raise ValueError(f"Invalid config {path}:\n  " + "\n  ".join(errors))
+
+    # Plans that do not fit are reported where they are applied (Camera/devices.py)
+    stream_plans = plan_streams(
+        list(stream_demands.values()),
+        stream_settings["link_bandwidth"],
+        stream_settings["headroom"],
+        stream_settings["tick_frequency"],
+    )
+
+    return CompiledConfig(
+        path=path,
+        digest=digest,
+        camera_plans=_freeze(camera_plans),
+        camera_configs=_freeze(camera_configs),
+        quality_checks=_freeze(quality_checks),
+        stack_settings=_freeze(stack_settings),
+        light_configs=_freeze(light_configs),
+        rig_plans=_freeze(rig_plans),
+        strobe_plans=_freeze(strobe_plans),
+        strobe_lights=frozenset(strobe_lights),
+        derivatives=_freeze(derivatives),
+        stream_settings=_freeze(stream_settings),
+        stream_demands=_freeze(stream_demands),
+        stream_plans=_freeze(stream_plans),
+        schedule=_freeze(schedule),
+        setups=_freeze(raw.get("setups") or {}),
+        raw=_freeze(raw),
+    )
+
+
+def _compile_camera(where: str, settings: dict, errors: list) -> tuple:
+    try:
+        plan = build_node_plan(settings)
+    except (KeyError, ValueError, AttributeError) as e:
+        errors.append(f"{where}: {e}")
+        return ()
+
+    values = dict(plan)
+    if values["OffsetX"] < 0 or values["OffsetX"] + values["Width"] > SENSOR_WIDTH:
+        errors.append(f"{where}: offset_x + width must be within 0..{SENSOR_WIDTH}")
+    if values["OffsetY"] < 0 or values["OffsetY"] + values["Height"] > SENSOR_HEIGHT:
+        errors.append(f"{where}: offset_y + height must be within 0..{SENSOR_HEIGHT}")
+    if values["Width"] <= 0 or values["Height"] <= 0:
+        errors.append(f"{where}: width and height must be positive")
+
+    _check_range(errors, where, "exposure_time", values["ExposureTime"], *EXPOSURE_RANGE)
+    _check_range(errors, where, "gain", values["Gain"], *GAIN_RANGE)
+    _check_range(errors, where, "auto_brightness_target", values["AutoTargetBrightness"], 0.0, 1.0)
+    _check_range(errors, where, "auto_gain_lower_limit", values["AutoGainLowerLimit"], *GAIN_RANGE)
+    _check_range(errors, where, "auto_gain_upper_limit", values["AutoGainUpperLimit"], *GAIN_RANGE)
+    _check_range(errors, where, "auto_exposure_lower_limit", values["AutoExposureTimeLowerLimit"], *EXPOSURE_RANGE)
+    _check_range(errors, where, "auto_exposure_upper_limit", values["AutoExposureTimeUpperLimit"], *EXPOSURE_RANGE)
+    if values["AutoGainLowerLimit"] > values["AutoGainUpperLimit"]:
+        errors.append(f"{where}: auto_gain_lower_limit is above auto_gain_upper_limit")
+    if values["AutoExposureTimeLowerLimit"] > values["AutoExposureTimeUpperLimit"]:
+        errors.append(f"{where}: auto_exposure_lower_limit is above auto_exposure_upper_limit")
+    if "AcquisitionFrameRate" in values and values["AcquisitionFrameRate"] <= 0:
+        errors.append(f"{where}: acquisition_fps must be positive")
+
+    return tuple(plan)
+
+
+def _compile_quality(where: str, settings: dict, errors: list) -> dict:
+    quality = dict(QUALITY_DEFAULTS, **(settings.get("quality_settings") or {}))
+    where = f"{where}.quality_settings"
+
+    unknown = set(quality) - set(QUALITY_DEFAULTS)
+    if unknown:
+        errors.append(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+    if not isinstance(quality["stride"], int) or quality["stride"] < 1:
+        errors.append(f"{where}: stride must be a positive integer, got {quality['stride']!r}")
+    if not isinstance(quality["retries"], int) or quality["retries"] < 0:
+        errors.append(f"{where}: retries must be a non-negative integer, got {quality['retries']!r}")
+    _check_range(errors, where, "max_brightness_error", quality["max_brightness_error"], 0.0, 1.0)
+    _check_range(errors, where, "max_clipped", quality["max_clipped"], 0.0, 1.0)
+    _check_range(errors, where, "min_sharpness", quality["min_sharpness"], 0.0, float("inf"))
+
+    quality["target"] = (settings.get("auto_settings") or {}).get("auto_brightness_target", 0.5)
+    return quality
+
+
+def _compile_stack(where: str, settings: dict, errors: list) -> dict:
+    stack = dict(STACK_DEFAULTS, **(settings.get("stack_settings") or {}))
+    where = f"{where}.stack_settings"
+
+    unknown = set(stack) - set(STACK_DEFAULTS)
+    if unknown:
+        errors.append(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+    for field in ("frames", "min_frames"):
+        if not isinstance(stack[field], int) or stack[field] < 1:
+            errors.append(f"{where}: {field} must be a positive integer, got {stack[field]!r}")
+    _check_range(errors, where, "sigma_clip", stack["sigma_clip"], 0.0, float("inf"))
+    return stack
+
+
+def _compile_derivatives(settings: dict, errors: list) -> dict:
+    derivatives = dict(DERIVATIVE_DEFAULTS, **settings)
+
+    unknown = set(derivatives) - set(DERIVATIVE_DEFAULTS)
+    if unknown:
+        errors.append(f"derivatives: unknown keys {', '.join(sorted(unknown))}")
+    for field in ("workers", "queue_size", "preview_size", "thumbnail_size", "tile_size"):
+        if not isinstance(derivatives[field], int) or derivatives[field] < 1:
+            errors.append(f"derivatives: {field} must be a positive integer, got {derivatives[field]!r}")
+    _check_range(errors, "derivatives", "jpeg_quality", derivatives["jpeg_quality"], 1, 100)
+    return derivatives
+
+
+def _compile_stream_settings(settings: dict, errors: list) -> dict:
+    stream = dict(STREAM_DEFAULTS, **settings)
+
+    unknown = set(stream) - set(STREAM_DEFAULTS)
+    if unknown:
+        errors.append(f"stream_settings: unknown keys {', '.join(sorted(unknown))}")
+    _check_range(errors, "stream_settings", "link_bandwidth", stream["link_bandwidth"], 1, float("inf"))
+    _check_range(errors, "stream_settings", "headroom", stream["headroom"], 0.0, 0.9)
+    _check_range(errors, "stream_settings", "fps", stream["fps"], 1e-6, float("inf"))
+    _check_range(errors, "stream_settings", "tick_frequency", stream["tick_frequency"], 1, float("inf"))
+    _check_packet_size(errors, "stream_settings", stream["packet_size"])
+    if not isinstance(stream["max_num_buffer"], int) or stream["max_num_buffer"] < 1:
+        errors.append(f"stream_settings: max_num_buffer must be a positive integer, got {stream['max_num_buffer']!r}")
+    return stream
+
+
+def _compile_stream_demand(rig: str, plan: tuple, settings: dict, stream_settings: dict, errors: list):
+    """Link demand of one rig from its ROI, pixel format and frame rate."""
+
+    where = f"setups.{rig}.camera.stream"
+    unknown = set(settings) - set(RIG_STREAM_KEYS)
+    if unknown:
+        errors.append(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+
+    values = dict(plan)
+    packet_size = settings.get("packet_size", stream_settings["packet_size"])
+    weight = settings.get("weight", 1.0)
+    fps = settings.get("fps", stream_settings["fps"])
+    _check_packet_size(errors, where, packet_size)
+    if not isinstance(weight, (int, float)) or weight <= 0:
+        errors.append(f"{where}: weight must be a positive number, got {weight!r}")
+    if not isinstance(fps, (int, float)) or fps <= 0:
+        errors.append(f"{where}: fps must be a positive number, got {fps!r}")
+
+    return StreamDemand(
+        rig=rig,
+        width=values["Width"],
+        height=values["Height"],
+        pixel_format=values["PixelFormat"],
+        fps=fps,
+        packet_size=packet_size,
+        weight=weight,
+    )
+
+
+def _check_packet_size(errors: list, where: str, value) -> None:
+    if not isinstance(value, int) or not PACKET_SIZE_RANGE[0] <= value <= PACKET_SIZE_RANGE[1] or value % 4:
+        errors.append(f"{where}: packet_size must be a multiple of 4 in {PACKET_SIZE_RANGE[0]}..{PACKET_SIZE_RANGE[1]}, got {value!r}")
+
+
+def _compile_strobe(where: str, settings: dict, errors: list) -> tuple:
+    """Line output driving the SBC's strobe input, e.g. Line2 high while the sensor is exposing."""
+
+    try:
+        line, source = settings["line"], settings["source"]
+    except KeyError as e:
+        errors.append(f"{where}: missing {e}")
+        return ()
+    if source not in STROBE_SOURCES:
+        errors.append(f"{where}: source={source!r} not one of {', '.join(STROBE_SOURCES)}")
+
+    # LineSelector first, the other nodes act on the selected line
+    return (
+        ("LineSelector", line),
+        ("LineMode", "Output"),
+        ("LineSource", source),
+        ("LineInverter", bool(settings.get("inverter", False))),
+    )
+
+
+def _compile_schedule(entries: list, camera_configs: dict, light_configs: dict, setups: dict, errors: list) -> list:
+    schedule = []
+    for i, entry in enumerate(entries):
+        where = f"schedule[{i}]"
+        every = entry.get("every")
+        if not isinstance(every, (int, float)) or every <= 0:
+            errors.append(f"{where}: every must be a positive number of seconds, got {every!r}")
+            continue
+
+        rigs = list(entry.get("rigs") or setups.keys())
+        for rig in rigs:
+            if rig not in setups:
+                errors.append(f"{where}: unknown rig '{rig}'")
+
+        missed = entry.get("missed", "skip")
+        if missed not in ("skip", "catch_up"):
+            errors.append(f"{where}: missed must be 'skip' or 'catch_up', got {missed!r}")
+        offset = entry.get("offset", 0)
+        if not isinstance(offset, (int, float)) or not 0 <= offset < every:
+            errors.append(f"{where}: offset must be a number of seconds in [0, every), got {offset!r}")
+
+        captures = []
+        for cam, light in entry.get("captures") or [["DEFAULT", "DEFAULT"]]:
+            if cam not in camera_configs:
+                errors.append(f"{where}: unknown camera config '{cam}'")
+            if light not in light_configs:
+                errors.append(f"{where}: unknown light config '{light}'")
+            captures.append((cam, light))
+
+        schedule.append({"every": every, "offset": offset, "missed": missed, "tune": bool(entry.get("tune", False)), "rigs": rigs, "captures": captures})
+    return schedule
+
+
+def _validate_light(where: str, settings: dict, errors: list) -> None:
+    for channel, level in settings.items():
+        if not isinstance(level, (int, float)):
+            errors.append(f"{where}.{channel}: expected a number, got {level!r}")
+        else:
+            _check_range(errors, where, channel, level, 0.0, 1.0)
+
+
+def _check_range(errors: list, where: str, field: str, value, low, high) -> None:
+    if not low <= value <= high:
+        errors.append(f"{where}: {field}={value} outside {low}..{high}")
+
+
+def _merge(base: dict, override: dict) -> dict:
+    """Recursively merges ``override`` onto ``base`` so nested sections inherit field by field."""
+
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+
+from Camera.config_loader import split_pixel_format
+
+# GenICam Bayer pattern -> OpenCV conversion code. OpenCV names the pattern by the
+# second row, so Basler's BayerRG (RGGB) is OpenCV's BayerBG.
+BAYER_CODES = {
+    "BayerRG": cv2.COLOR_BayerBG2BGR,
+    "BayerBG": cv2.COLOR_BayerRG2BGR,
+    "BayerGR": cv2.COLOR_BayerGB2BGR,
+    "BayerGB": cv2.COLOR_BayerGR2BGR,
+}
+
+
+class Demosaicer:
+    """
+    Converts raw frames to BGR8 while reusing its intermediate and output arrays.
+
+    Args:
+        pixel_format (str): GenICam pixel format of the raw frames (camera.PixelFormat.Value).
+        scale (float): Output scale, e.g. 0.25 for a quarter-size preview.
+    """
+
+    def __init__(self, pixel_format: str, scale: float = 1.0) -> None:
+        self.family, self.bits = split_pixel_format(pixel_format)
+        if self.family not in BAYER_CODES and self.family not in ("Mono", "RGB", "BGR"):
+            raise ValueError(f"Unsupported pixel format '{pixel_format}'")
+
+        self.pixel_format = pixel_format
+        self.scale = scale
+        self._src8 = None
+        self._bgr = None
+        self._small = None
+
+    def output_shape(self, raw_shape: tuple) -> tuple:
+        """Shape of the BGR output for raw frames of ``raw_shape``."""
+
+        height, width = raw_shape[:2]
+        if self.scale != 1.0:
+            width, height = max(1, int(width * self.scale)), max(1, int(height * self.scale))
+        return (height, width, 3)
+
+    def convert(self, raw: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Demosaics (and optionally downscales) ``raw`` into BGR8.
+
+        Args:
+            raw (np.ndarray): Raw frame, may be a zero-copy view of a grab buffer.
+            out (np.ndarray): Optional destination of ``output_shape(raw.shape)``.
+
+        Returns:
+            np.ndarray: ``out``, or an internal buffer that is reused by the next call.
+        """
+
+        src = raw
+        if raw.dtype != np.uint8:
+            # 10/12 bit data is reduced to 8 bit for display
+            if self._src8 is None or self._src8.shape != raw.shape:
+                self._src8 = np.empty(raw.shape, dtype=np.uint8)
+            cv2.convertScaleAbs(raw, dst=self._src8, alpha=1.0 / (1 << (self.bits - 8)))
+            src = self._src8
+
+        full_shape = (raw.shape[0], raw.shape[1], 3)
+        if self.scale == 1.0 and out is not None:
+            dst = out
+        else:
+            if self._bgr is None or self._bgr.shape != full_shape:
+                self._bgr = np.empty(full_shape, dtype=np.uint8)
+            dst = self._bgr
+
+        if self.family in BAYER_CODES:
+            cv2.cvtColor(src, BAYER_CODES[self.family], dst=dst)
+        elif self.family == "Mono":
+            cv2.cvtColor(src, cv2.COLOR_GRAY2BGR, dst=dst)
+        elif self.family == "RGB":
+            cv2.cvtColor(src, cv2.COLOR_RGB2BGR, dst=dst)
+        else:
+            np.copyto(dst, src)
+
+        if self.scale == 1.0:
+            return dst
+
+        if out is None:
+            shape = self.output_shape(raw.shape)
+            if self._small is None or self._small.shape != shape:
+                self._small = np.empty(shape, dtype=np.uint8)
+            out = self._small
+        cv2.resize(dst, (out.shape[1], out.shape[0]), dst=out, interpolation=cv2.INTER_AREA)
+        return out
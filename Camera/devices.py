@@ -0,0 +1,134 @@
+import logging
+
+from pypylon import pylon
+
+# Stream grabber counters reported after every capture -> pylon GigE stream grabber nodes
+STREAM_STATISTICS = {
+    "total_buffers": "Statistic_Total_Buffer_Count",
+    "failed_buffers": "Statistic_Failed_Buffer_Count",
+    "buffer_underruns": "Statistic_Buffer_Underrun_Count",
+    "total_packets": "Statistic_Total_Packet_Count",
+    "failed_packets": "Statistic_Failed_Packet_Count",
+    "resend_requests": "Statistic_Resend_Request_Count",
+    "resent_packets": "Statistic_Resend_Packet_Count",
+}
+
+_logger = logging.getLogger(__name__)
+
+
+def find_device(serial=None, ip=None, devices=None):
+    """
+    Looks up a camera among the enumerated devices by serial number and/or IP.
+
+    Args:
+        serial: Serial number of the camera (as given in config.yaml).
+        ip: IP address of a GigE camera.
+        devices: Optional result of a previous ``EnumerateDevices()`` call.
+
+    Returns:
+        pylon.DeviceInfo: The first matching device, or the first device at all
+        if neither serial nor ip is given.
+
+    Raises:
+        RuntimeError: If no matching camera is present.
+    """
+
+    if devices is None:
+        devices = pylon.TlFactory.GetInstance().EnumerateDevices()
+
+    for device in devices:
+        if serial is not None and device.GetSerialNumber() != str(serial):
+            continue
+        if ip is not None and _device_ip(device) != str(ip):
+            continue
+        return device
+
+    raise RuntimeError(f"No camera found with serial={serial} ip={ip}")
+
+
+def create_device(serial=None, ip=None):
+    """Creates the pylon device for a camera found with ``find_device``."""
+
+    return pylon.TlFactory.GetInstance().CreateDevice(find_device(serial, ip))
+
+
+def device_identity(device):
+    """
+    Copies an opened camera's DeviceInfo. Its full name addresses the device directly
+    (for GigE it holds the IP and MAC address), so ``reopen_device`` can reach the same
+    camera again without enumerating.
+    """
+
+    return pylon.DeviceInfo(device)
+
+
+def reopen_device(identity):
+    """
+    Creates the pylon device straight from a ``device_identity``, which skips the
+    network-wide enumeration (milliseconds instead of a discovery round). Falls back
+    to enumerating by serial number if the camera can no longer be reached that way,
+    e.g. after it was given a new IP address.
+
+    Raises:
+        RuntimeError: If the camera is not present at all.
+    """
+
+    try:
+        return pylon.TlFactory.GetInstance().CreateDevice(identity)
+    except Exception:
+        return create_device(identity.GetSerialNumber())
+
+
+def transport_plan(camera, config, rig: str) -> list:
+    """Packet size, packet delay and throughput limit of ``rig`` from the compiled config, GigE cameras only."""
+
+    plan = config.stream_plan(rig)
+    if plan is None or camera.GetDeviceInfo().GetDeviceClass() != "BaslerGigE":
+        return []
+    if not plan.fits:
+        _logger.warning(
+            f"{rig} needs {plan.demand / 1e6:.1f} MB/s but gets {plan.throughput_limit / 1e6:.1f} MB/s "
+            f"of the shared link, at most {plan.max_fps:.1f} fps"
+        )
+    return list(plan.nodes())
+
+
+def configure_stream_grabber(camera, config) -> None:
+    """Buffer count and resend handling from ``stream_settings``; must be set while the camera is not grabbing."""
+
+    settings = config.stream_settings
+    if not settings["enabled"]:
+        return
+    camera.MaxNumBuffer.Value = settings["max_num_buffer"]
+    if camera.GetDeviceInfo().GetDeviceClass() == "BaslerGigE":
+        camera.GetStreamGrabberNodeMap().GetNode("EnableResend").SetValue(settings["enable_resend"])
+
+
+def stream_statistics(camera) -> dict:
+    """
+    Reads the stream grabber counters (see ``STREAM_STATISTICS``).
+
+    Returns:
+        dict: Counter name -> value since the stream was started; counters the
+        transport layer does not provide are left out.
+    """
+
+    try:
+        node_map = camera.GetStreamGrabberNodeMap()
+    except Exception:
+        return {}
+
+    statistics = {}
+    for name, node in STREAM_STATISTICS.items():
+        try:
+            statistics[name] = node_map.GetNode(node).GetValue()
+        except Exception:
+            pass
+    return statistics
+
+
+def _device_ip(device) -> str:
+    try:
+        return device.GetIpAddress()
+    except Exception:
+        return ""  # Not a GigE device
@@ -0,0 +1,384 @@
+'''
+Host-side closed-loop exposure, gain and light tuning.
+
+Instead of letting ExposureAuto/GainAuto converge over a stream of full frames, the
+tuner grabs small centred ROI probe frames and solves for exposure time, gain and
+a common scale of the SBC light levels in a few steps. Converged values are cached
+per rig, camera config, light config and time of day, so the next run starts from them.
+
+Control law against a simulated scene (no camera needed):
+    python3 -m Camera.exposure_tuner --simulate
+Tuner versus the camera's auto mode on a connected camera:
+    python3 -m Camera.exposure_tuner --compare_auto
+'''
+
+import argparse, json, math, os, threading, time, logging
+from dataclasses import dataclass, asdict
+
+from Camera.quality import measure
+
+
+@dataclass(frozen=True)
+class ExposureState:
+    exposure: float             # ExposureTime, mikrosekunder
+    gain: float                 # Gain, dB
+    light_scale: float = 1.0    # Common factor on the light config's channel levels
+
+    def value(self) -> float:
+        """Total exposure, proportional to the expected brightness of a static scene."""
+        return self.light_scale * self.exposure * 10 ** (self.gain / 20)
+
+
+@dataclass(frozen=True)
+class ExposureLimits:
+    exposure: tuple             # (min, max) mikrosekunder
+    gain: tuple                 # (min, max) dB
+    light_scale: tuple = (1.0, 1.0)
+
+    def allocate(self, value: float) -> ExposureState:
+        """
+        Splits a total exposure into lights, exposure time and gain.
+
+        Light is raised first (no noise, no motion blur), then exposure time, and gain
+        only once both are at their maximum. Values outside the reachable range clamp.
+        """
+
+        light_lo, light_hi = self.light_scale
+        exp_lo, exp_hi = self.exposure
+        gain_lo, gain_hi = self.gain
+        base = 10 ** (gain_lo / 20)
+
+        light = min(max(value / (exp_lo * base), light_lo), light_hi)
+        exposure = min(max(value / (light * base), exp_lo), exp_hi)
+        gain_linear = value / (light * exposure)
+        gain = min(max(20 * math.log10(max(gain_linear, 1e-12)), gain_lo), gain_hi)
+        return ExposureState(exposure, gain, light)
+
+
+@dataclass
+class TuneResult:
+    state: ExposureState
+    lights: dict                # channel -> level actually sent to the SBC
+    brightness: float
+    target: float
+    frames: int
+    elapsed_ms: float
+    converged: bool
+    warm_start: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def next_state(state: ExposureState, brightness: float, clipped: float, target: float, limits: ExposureLimits) -> ExposureState:
+    """
+    One step of the controller: scales the total exposure by target / measured brightness.
+
+    Brightness is roughly linear in total exposure until pixels clip, so a single step
+    lands close to the target. A clipped frame under-reports its brightness, so the
+    step is shortened further by the clipped fraction.
+    """
+
+    factor = target / max(brightness, 1 / 255)
+    if clipped > 0.1:
+        factor *= max(1 - clipped, 1 / 16)
+    factor = min(max(factor, 1 / 16), 16)
+    return limits.allocate(state.value() * factor)
+
+
+class ExposureCache:
+    """
+    Converged exposure states in a JSON file, keyed by rig, configs and time-of-day bucket.
+
+    Args:
+        path (str): Cache file, rewritten atomically on every update.
+        bucket_hours (int): Width of the time-of-day buckets.
+    """
+
+    def __init__(self, path: str = "./exposure_cache.json", bucket_hours: int = 1) -> None:
+        self.path = path
+        self.bucket_hours = bucket_hours
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable exposure cache {path}: {e}")
+
+    def get(self, rig: str, camera_config: str, light_config: str, when: float = None):
+        """Returns the cached state of the nearest time-of-day bucket, or None."""
+
+        prefix = f"{rig}|{camera_config}|{light_config}|"
+        bucket = self._bucket(when)
+        buckets = 24 // self.bucket_hours
+        with self._lock:
+            candidates = [(int(key[len(prefix):]), entry) for key, entry in self._entries.items() if key.startswith(prefix)]
+        if not candidates:
+            return None
+        # Circular distance, so 23:00 is next to 00:00
+        _, entry = min(candidates, key=lambda c: min(abs(c[0] - bucket), buckets - abs(c[0] - bucket)))
+        return ExposureState(entry["exposure"], entry["gain"], entry["light_scale"])
+
+    def put(self, rig: str, camera_config: str, light_config: str, state: ExposureState, when: float = None) -> None:
+        key = f"{rig}|{camera_config}|{light_config}|{self._bucket(when)}"
+        with self._lock:
+            self._entries[key] = dict(asdict(state), updated=time.time())
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f, indent=1)
+            os.replace(tmp, self.path)
+
+    def _bucket(self, when: float = None) -> int:
+        return time.localtime(when).tm_hour // self.bucket_hours
+
+
+class ExposureTuner:
+    """
+    Tunes exposure time, gain and (optionally) the light levels for one capture.
+
+    The camera's auto functions are switched off and the camera config's
+    ``auto_brightness_target`` and auto limits are used as the target and bounds.
+
+    Args:
+        camera_control: An opened CameraControl.
+        config (CompiledConfig): Compiled config.yaml from ``load_config``.
+        sbc: Optional SBC whose light levels are scaled as part of the solution.
+            If its ``update_settings`` returns a future, it is awaited.
+        cache (ExposureCache): Warm-start cache, None disables caching.
+        tolerance (float): Allowed |brightness - target| for convergence.
+        max_frames (int): Probe frames before giving up.
+        probe_scale (int): The probe ROI is 1/probe_scale of the width and height.
+        min_light_scale (float): Lowest factor the light levels may be scaled by.
+        light_settle (float): Seconds to wait after a light change before probing.
+    """
+
+    def __init__(
+        self,
+        camera_control,
+        config,
+        sbc=None,
+        cache=None,
+        tolerance: float = 0.03,
+        max_frames: int = 8,
+        probe_scale: int = 4,
+        min_light_scale: float = 0.1,
+        light_settle: float = 0.05,
+    ) -> None:
+        self.camera_control = camera_control
+        self.config = config
+        self.sbc = sbc
+        self.cache = cache
+        self.tolerance = tolerance
+        self.max_frames = max_frames
+        self.probe_scale = probe_scale
+        self.min_light_scale = min_light_scale
+        self.light_settle = light_settle
+        self.logger = logging.getLogger(__name__)
+
+    def limits(self, camera_config: str, light_config: str, tune_lights: bool = True) -> ExposureLimits:
+        auto = self.config.camera_configs[camera_config]["auto_settings"]
+        levels = [level for level in self.config.light_config(light_config).values() if level > 0]
+        if tune_lights and self.sbc is not None and levels:
+            light_scale = (min(self.min_light_scale, 1.0), 1.0 / max(levels))
+        else:
+            light_scale = (1.0, 1.0)
+        return ExposureLimits(
+            exposure=(auto["auto_exposure_lower_limit"], auto["auto_exposure_upper_limit"]),
+            gain=(auto["auto_gain_lower_limit"], auto["auto_gain_upper_limit"]),
+            light_scale=light_scale,
+        )
+
+    def tune(self, camera_config: str = "DEFAULT", light_config: str = "DEFAULT", tune_lights: bool = True) -> TuneResult:
+        """
+        Runs the probe loop and leaves the camera and lights at the converged values.
+
+        Args:
+            tune_lights (bool): Scale the light levels too. Off for strobe configs, where
+                a steady light write would disarm the strobe.
+
+        Returns:
+            TuneResult: Final state, probe frames used and time taken.
+        """
+
+        started = time.perf_counter()
+        rig = self.camera_control.rig
+        settings = self.config.camera_configs[camera_config]
+        target = settings["auto_settings"]["auto_brightness_target"]
+        limits = self.limits(camera_config, light_config, tune_lights)
+        levels = dict(self.config.light_config(light_config)) if tune_lights else {}
+
+        state = self.cache.get(rig, camera_config, light_config) if self.cache is not None else None
+        warm_start = state is not None
+        if state is None:
+            lighting = settings["lighting_settings"]
+            state = ExposureState(lighting["exposure_time"], lighting["gain"], 1.0)
+        state = limits.allocate(state.value())  # the limits may have changed since it was cached
+
+        pixel_format = self.camera_control.pixel_format()
+        restore = self._enter_probe()
+        frames = 0
+        brightness = 0.0
+        converged = False
+        sent_lights = None
+        try:
+            self.camera_control.write_nodes([("ExposureAuto", "Off"), ("GainAuto", "Off")])
+            while frames < self.max_frames:
+                sent_lights = self._apply(state, levels, sent_lights)
+                frame = self.camera_control.grab_frame()
+                frames += 1
+                if frame is None:
+                    continue
+
+                metrics = measure(frame, pixel_format, target, stride=1)
+                brightness = metrics.brightness
+                if abs(brightness - target) <= self.tolerance and metrics.clipped_high <= 0.1:
+                    converged = True
+                    break
+
+                proposed = next_state(state, brightness, metrics.clipped_high, target, limits)
+                if proposed == state:
+                    break  # pinned at a limit, more frames will not help
+                state = proposed
+        finally:
+            self.camera_control.write_nodes(restore)
+
+        if converged and self.cache is not None:
+            self.cache.put(rig, camera_config, light_config, state)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.logger.info(
+            f"Tuned [{camera_config}] [{light_config}] in {frames} probe frames, {elapsed_ms:.0f} ms "
+            f"({'converged' if converged else 'not converged'}, {'warm' if warm_start else 'cold'} start): "
+            f"exposure {state.exposure:.0f} us, gain {state.gain:.1f} dB, lights x{state.light_scale:.2f}"
+        )
+        return TuneResult(state, sent_lights or {}, brightness, target, frames, elapsed_ms, converged, warm_start)
+
+    def _apply(self, state: ExposureState, levels: dict, sent_lights):
+        self.camera_control.write_nodes([("ExposureTime", state.exposure), ("Gain", state.gain)])
+        if self.sbc is None or not levels:
+            return None
+
+        lights = {channel: round(min(level * state.light_scale, 1.0), 4) for channel, level in levels.items()}
+        if lights != sent_lights:
+            ack = self.sbc.update_settings(lights)
+            if hasattr(ack, "result"):
+                ack.result()
+            time.sleep(self.light_settle)
+        return lights
+
+    def _enter_probe(self) -> list:
+        """Switches to a centred ROI of 1/probe_scale per axis and returns the writes that undo it."""
+
+        camera = self.camera_control.camera
+        writes, restore = [], []
+        for size, offset in (("Width", "OffsetX"), ("Height", "OffsetY")):
+            full, origin = getattr(camera, size).Value, getattr(camera, offset).Value
+            size_inc = max(getattr(camera, size).Inc, 2)
+            offset_inc = max(getattr(camera, offset).Inc, 2)  # even offsets keep the Bayer phase
+            probe = max(full // self.probe_scale // size_inc * size_inc, size_inc)
+            shift = (full - probe) // 2 // offset_inc * offset_inc
+            writes += [(size, probe), (offset, origin + shift)]
+            restore += [(size, full), (offset, origin)]
+        self.camera_control.write_nodes(writes)
+        return restore
+
+
+def measure_auto_convergence(camera_control, target: float, tolerance: float = 0.03, max_frames: int = 200) -> dict:
+    """
+    Streams frames with ExposureAuto/GainAuto "Continuous" until the brightness holds the target.
+
+    Returns:
+        dict: frames and elapsed_ms until two consecutive frames were within
+        ``tolerance``, or None if the camera has no auto functions.
+    """
+
+    camera = camera_control.camera
+    try:
+        camera.AutoTargetBrightness.Value = target
+        camera.ExposureAuto.Value = "Continuous"
+        camera.GainAuto.Value = "Continuous"
+    except Exception:
+        return None
+
+    pixel_format = camera_control.pixel_format()
+    started = time.perf_counter()
+    within = 0
+    for frame_count in range(1, max_frames + 1):
+        frame = camera_control.grab_frame()
+        if frame is None:
+            continue
+        within = within + 1 if abs(measure(frame, pixel_format, target).brightness - target) <= tolerance else 0
+        if within == 2:
+            return {"frames": frame_count, "elapsed_ms": (time.perf_counter() - started) * 1000}
+    return {"frames": max_frames, "elapsed_ms": (time.perf_counter() - started) * 1000, "converged": False}
+
+
+def simulate(scene: float, start: ExposureState, limits: ExposureLimits, target: float = 0.5, tolerance: float = 0.03, max_frames: int = 8) -> tuple:
+    """
+    Runs the controller on a synthetic scene where brightness = min(scene * total
+    exposure, 1), with a slightly non-linear response near clipping.
+
+    Returns:
+        tuple: (probe frames used, whether the target was reached). A scene the limits
+        cannot reach stops early with False, like ``ExposureTuner.tune``.
+    """
+
+    state = limits.allocate(start.value())
+    for frames in range(1, max_frames + 1):
+        linear = scene * state.value()
+        brightness = min(linear / (1 + 0.3 * linear), 1.0) if linear < 3 else 1.0
+        clipped = 1.0 if linear >= 3 else max(0.0, brightness - 0.9)
+        if abs(brightness - target) <= tolerance and clipped <= 0.1:
+            return frames, True
+        proposed = next_state(state, brightness, clipped, target, limits)
+        if proposed == state:
+            return frames, False  # pinned at a limit
+        state = proposed
+    return max_frames, False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("Exposure tuner benchmark")
+    parser.add_argument("--simulate", action="store_true", help="Run the control law against synthetic scenes")
+    parser.add_argument("--compare_auto", action="store_true", help="Tune the connected camera, then measure its auto mode")
+    parser.add_argument("--camera_config", default="DEFAULT")
+    parser.add_argument("--light_config", default="DEFAULT")
+    args = parser.parse_args()
+
+    if args.simulate or not args.compare_auto:
+        limits = ExposureLimits(exposure=(20.0, 100000.0), gain=(0.0, 24.0), light_scale=(0.1, 2.0))
+        start = ExposureState(15000.0, 1.0, 1.0)
+        for scene in (1e-7, 1e-6, 1e-5, 1e-4, 1e-3):
+            cold, reached = simulate(scene, start, limits)
+            converged = limits.allocate(0.5 / scene)
+            warm, _ = simulate(scene * 1.2, converged, limits)  # 20 % brighter than when it was cached
+            print(
+                f"scene {scene:7.0e}: cold start {cold} frames, warm start {warm} frames"
+                f"{'' if reached else ' (out of range, stopped at a limit)'}"
+            )
+
+    if args.compare_auto:
+        from Camera.camera_control import CameraControl
+        from Camera.config_compiler import load_config
+
+        camera_control = CameraControl()
+        try:
+            tuner = ExposureTuner(camera_control, load_config("config.yaml"))
+            result = tuner.tune(args.camera_config, args.light_config)
+            print(f"tuner: {result.frames} frames, {result.elapsed_ms:.0f} ms, brightness {result.brightness:.3f}")
+
+            # Restart the auto mode from the config's manual values, like a fresh capture would
+            lighting = tuner.config.camera_configs[args.camera_config]["lighting_settings"]
+            camera_control.write_nodes([("ExposureTime", lighting["exposure_time"]), ("Gain", lighting["gain"])])
+            auto = measure_auto_convergence(camera_control, result.target)
+            if auto is None:
+                print("auto:  camera has no auto functions (e.g. pylon emulator)")
+            else:
+                print(f"auto:  {auto['frames']} frames, {auto['elapsed_ms']:.0f} ms")
+        finally:
+            camera_control.close()
@@ -0,0 +1,179 @@
+'''
+Long-lived grab session that keeps the stream armed between snapshots.
+
+Compare per-shot latency of the StartGrabbingMax(1) path against the armed session:
+    python3 -m Camera.grab_session --shots 50
+    PYLON_CAMEMU=1 python3 -m Camera.grab_session --emulated
+'''
+
+import argparse, time, logging
+
+import numpy as np
+from pypylon import pylon
+
+
+class GrabSession:
+    """
+    Keeps a camera grabbing with a pre-allocated buffer pool so snapshots skip stream setup.
+
+    Modes:
+        trigger: The camera waits for a software trigger, every ``snap`` exposes a fresh frame.
+        latest:  The camera free-runs at its configured frame rate, ``snap`` returns the newest buffered frame.
+                 After a node write that keeps the stream running (exposure, gain, ...) call
+                 ``settings_changed``, so the next ``snap`` skips frames exposed with the old values.
+
+    Args:
+        camera: An opened pylon.InstantCamera.
+        mode (str): "trigger" or "latest".
+        buffers (int): Number of stream buffers to allocate (MaxNumBuffer).
+    """
+
+    MODES = ("trigger", "latest")
+
+    def __init__(self, camera, mode: str = "trigger", buffers: int = 8) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid grab mode '{mode}', must be one of {self.MODES}")
+
+        self.camera = camera
+        self.mode = mode
+        self.buffers = buffers
+        self.logger = logging.getLogger(__name__)
+        self._stale = False
+
+    @property
+    def armed(self) -> bool:
+        return self.camera.IsGrabbing()
+
+    def arm(self) -> None:
+        """Configures triggering, allocates the buffer pool and starts the stream."""
+
+        if self.armed:
+            return
+
+        self._stale = False  # a new stream only holds frames taken with the current values
+        self.camera.MaxNumBuffer.Value = self.buffers
+        self.camera.TriggerSelector.Value = "FrameStart"
+
+        if self.mode == "trigger":
+            self.camera.TriggerMode.Value = "On"
+            self.camera.TriggerSource.Value = "Software"
+            self.camera.StartGrabbing(pylon.GrabStrategy_OneByOne)
+        else:
+            self.camera.TriggerMode.Value = "Off"
+            self.camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+
+        self.logger.info(f"Grab session armed ({self.mode}, {self.buffers} buffers).")
+
+    def disarm(self) -> None:
+        """Stops the stream and returns the camera to free-running acquisition."""
+
+        if self.armed:
+            self.camera.StopGrabbing()
+        self.camera.TriggerMode.Value = "Off"
+        self.logger.info("Grab session disarmed.")
+
+    def settings_changed(self) -> None:
+        """Marks the frames already buffered or being exposed as stale (latest mode only)."""
+        if self.mode == "latest":
+            self._stale = True
+
+    def snap(self, timeout_ms: int = 5000):
+        """
+        Returns a grab result from the armed stream. The caller must Release() it.
+
+        Raises:
+            TimeoutException: If no frame arrives within ``timeout_ms``.
+        """
+
+        if not self.armed:
+            self.arm()
+
+        if self.mode == "trigger":
+            self._drain()
+            self.camera.WaitForFrameTriggerReady(timeout_ms, pylon.TimeoutHandling_ThrowException)
+            self.camera.ExecuteSoftwareTrigger()
+        elif self._stale:
+            # Buffered frames predate the write and the next one may have been exposing
+            # during it, so the first frame that is certainly new is the one after that
+            self._drain()
+            self.camera.RetrieveResult(timeout_ms, pylon.TimeoutHandling_ThrowException).Release()
+            self._stale = False
+
+        return self.camera.RetrieveResult(timeout_ms, pylon.TimeoutHandling_ThrowException)
+
+    def _drain(self) -> None:
+        # Drop frames left over from an earlier trigger that nobody retrieved
+        while self.camera.NumReadyBuffers.Value > 0:
+            grabResult = self.camera.RetrieveResult(0, pylon.TimeoutHandling_Return)
+            if grabResult.IsValid():
+                grabResult.Release()
+
+
+def measure_latency(camera, shots: int = 50, mode: str = "trigger") -> dict:
+    """
+    Times ``shots`` snapshots through the old StartGrabbingMax(1) path and an armed GrabSession.
+
+    Returns:
+        dict: "oneshot" and "session" arrays of per-shot latency in milliseconds.
+    """
+
+    oneshot = []
+    for _ in range(shots):
+        start = time.perf_counter()
+        camera.StartGrabbingMax(1)
+        grabResult = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
+        grabResult.Release()
+        oneshot.append((time.perf_counter() - start) * 1000)
+        camera.StopGrabbing()
+
+    session = GrabSession(camera, mode=mode)
+    session.arm()
+    persistent = []
+    try:
+        for _ in range(shots):
+            start = time.perf_counter()
+            grabResult = session.snap()
+            grabResult.Release()
+            persistent.append((time.perf_counter() - start) * 1000)
+    finally:
+        session.disarm()
+
+    return {"oneshot": np.array(oneshot), "session": np.array(persistent)}
+
+
+def format_histogram(samples: dict, bins: int = 12, width: int = 40) -> str:
+    """Renders latency samples of several paths as text histograms on shared bins."""
+
+    every = np.concatenate(list(samples.values()))
+    edges = np.linspace(every.min(), every.max(), bins + 1)
+    lines = []
+
+    for name, values in samples.items():
+        counts, _ = np.histogram(values, bins=edges)
+        lines.append(
+            f"{name}: median {np.median(values):.2f} ms, p95 {np.percentile(values, 95):.2f} ms, max {values.max():.2f} ms"
+        )
+        for count, low, high in zip(counts, edges[:-1], edges[1:]):
+            bar = "#" * int(round(width * count / max(counts.max(), 1)))
+            lines.append(f"  {low:8.2f}-{high:8.2f} ms | {bar} {count}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from Camera.config_loader import config_loader
+
+    parser = argparse.ArgumentParser("Snapshot latency: StartGrabbingMax(1) vs armed grab session")
+    parser.add_argument("--shots", type=int, default=50)
+    parser.add_argument("--mode", choices=GrabSession.MODES, default="trigger")
+    parser.add_argument("--emulated", action="store_true", help="Skip the config push (PYLON_CAMEMU cameras)")
+    args = parser.parse_args()
+
+    camera = pylon.InstantCamera(pylon.TlFactory.GetInstance().CreateFirstDevice())
+    camera.Open()
+    try:
+        if not args.emulated:
+            config_loader(camera)
+        print(format_histogram(measure_latency(camera, args.shots, args.mode)))
+    finally:
+        camera.Close()
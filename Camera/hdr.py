@@ -0,0 +1,339 @@
+'''
+Exposure-bracketed bursts and their HDR merge on the raw Bayer data.
+
+A bracket is taken inside one armed software-trigger session: the exposure (and gain)
+of the next frame is written while the previous one is still being read out, so the
+whole bracket takes about the sum of the exposure times instead of one reconfiguration
+and stream restart per exposure.
+
+The merge works on the raw mosaic, every photosite is merged on its own, so the
+result can be demosaiced like any other frame. Rows are processed in chunks and the
+frames are streamed into two accumulators, which bounds the float temporaries to four
+buffers of ``chunk_rows`` rows whatever the frame size or bracket length.
+
+    python3 -m Camera.hdr --configs high_light DEFAULT low_light      # bracket from camera configs
+    python3 -m Camera.hdr --exposures 1000 8000 64000 --gain 0 --save # explicit exposure times (µs), keep the result
+    python3 -m Camera.hdr --benchmark                                 # merge throughput, no camera
+'''
+
+import argparse, time, logging
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from Camera.config_loader import split_pixel_format
+
+
+@dataclass
+class Bracket:
+    frames: list                      # raw frames, shortest exposure first
+    exposures: list                   # ExposureTime per frame, mikrosekunder
+    gains: list                       # Gain per frame, dB
+    pixel_format: str
+    timestamps: list = field(default_factory=list)  # camera ticks per frame
+    elapsed_ms: float = 0.0           # first trigger to last frame retrieved
+
+    @property
+    def bits(self) -> int:
+        return split_pixel_format(self.pixel_format)[1]
+
+
+def merge_bracket(
+    frames: list,
+    exposures: list,
+    gains: list = None,
+    bits: int = 8,
+    black_level: float = 0.0,
+    low: float = 0.02,
+    high: float = 0.95,
+    chunk_rows: int = 32,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Weighted radiance merge of raw frames taken at different exposures.
+
+    Each frame's value is divided by its exposure (exposure time times linear gain)
+    and averaged with a hat weight that is zero below ``low`` and above ``high`` of
+    full scale, so dark noise and clipped pixels do not contribute. A photosite that
+    is out of range in every frame takes the shortest exposure if it is bright and the
+    longest if it is dark.
+
+    Args:
+        frames (list): Raw frames of equal shape and dtype.
+        exposures (list): Exposure time per frame (any unit, the result is in DN per unit).
+        gains (list): Gain per frame in dB, default 0.
+        bits (int): Bit depth of the frames.
+        black_level (float): Offset subtracted before scaling, in DN.
+        low/high (float): Usable range as fraction of full scale.
+        chunk_rows (int): Rows merged at a time.
+        out (np.ndarray): Optional float32 output of the frames' shape.
+
+    Returns:
+        np.ndarray: float32 radiance, DN per exposure unit at 0 dB.
+
+    Raises:
+        ValueError: For mismatched frame shapes or parameter counts.
+    """
+
+    count = len(frames)
+    if count == 0 or len(exposures) != count or (gains is not None and len(gains) != count):
+        raise ValueError("frames, exposures and gains must have the same non-zero length")
+    shape = frames[0].shape
+    if any(frame.shape != shape for frame in frames):
+        raise ValueError("All frames of a bracket must have the same shape")
+
+    gains = [0.0] * count if gains is None else gains
+    scale = np.array([e * 10 ** (g / 20) for e, g in zip(exposures, gains)], dtype=np.float32)
+    order = np.argsort(scale)
+    shortest, longest = order[0], order[-1]
+
+    full_scale = float((1 << bits) - 1)
+    lo, hi = low * full_scale, high * full_scale
+    mid, half = (lo + hi) / 2, (hi - lo) / 2
+
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+
+    # Scratch buffers sized for one chunk and reused; frames are streamed into the two
+    # accumulators one at a time, so nothing scales with the bracket length either
+    rows = min(chunk_rows, shape[0])
+    numerator = np.empty((rows,) + shape[1:], dtype=np.float32)
+    denominator = np.empty_like(numerator)
+    value = np.empty_like(numerator)
+    weight = np.empty_like(numerator)
+
+    for start in range(0, shape[0], rows):
+        stop = min(start + rows, shape[0])
+        n = stop - start
+        num, den, z, w = numerator[:n], denominator[:n], value[:n], weight[:n]
+        num.fill(0.0)
+        den.fill(0.0)
+
+        for frame, s in zip(frames, scale):
+            np.copyto(z, frame[start:stop], casting="unsafe")
+            # Hat weight: largest at mid range, 0 at and outside lo/hi
+            np.subtract(z, mid, out=w)
+            np.abs(w, out=w)
+            np.subtract(half, w, out=w)
+            np.maximum(w, np.float32(0.0), out=w)
+            den += w
+
+            if black_level:
+                z -= black_level
+            z *= w
+            z *= 1.0 / s
+            num += z
+
+        # Selections are done arithmetically (x += mask * (y - x)): masked writes with
+        # where= or boolean indexing are several times slower than a full pass
+        empty = den <= 0
+        chunk = out[start:stop]
+        np.maximum(den, np.float32(1e-30), out=den)
+        np.divide(num, den, out=chunk)
+
+        # Out of range in every frame: the shortest exposure if bright, the longest if dark
+        if empty.any():
+            short, long = frames[shortest][start:stop], frames[longest][start:stop]
+            np.copyto(z, long, casting="unsafe")
+            z -= black_level
+            z *= 1.0 / scale[longest]
+            np.copyto(w, short, casting="unsafe")
+            w -= black_level
+            w *= 1.0 / scale[shortest]
+            w -= z
+            w *= short >= mid
+            z += w
+            z -= chunk
+            z *= empty
+            chunk += z
+
+    return out
+
+
+class BracketBurst:
+    """
+    Takes exposure brackets through a CameraControl's camera.
+
+    The auto functions are switched off for the burst and the camera's previous node
+    values are written back afterwards. A grab session the CameraControl had armed is
+    paused and re-armed.
+
+    Args:
+        camera_control: An opened CameraControl.
+        timeout_ms (int): Per-frame grab timeout on top of the exposure time.
+    """
+
+    def __init__(self, camera_control, timeout_ms: int = 5000) -> None:
+        self.camera_control = camera_control
+        self.timeout_ms = timeout_ms
+        self.logger = logging.getLogger(__name__)
+
+    def capture(self, exposures: list, gains: list = None) -> Bracket:
+        """
+        Takes one frame per exposure.
+
+        Args:
+            exposures (list): Exposure times in mikrosekunder.
+            gains (list): Gain per frame in dB, default the current gain for all.
+
+        Returns:
+            Bracket: Frames sorted by exposure, shortest first.
+
+        Raises:
+            StreamActiveError: If the live view owns the stream.
+        """
+
+        from pypylon import pylon
+        from Camera.grab_session import GrabSession
+        from Camera.node_writer import StreamActiveError
+
+        cc = self.camera_control
+        if gains is None:
+            gains = [cc.node_values().get("Gain", 0.0)] * len(exposures)
+        steps = sorted(zip(exposures, gains))
+
+        with cc.camera_mutex:
+            # The live view starts and stops its stream under the mutex, so this cannot race it
+            if cc.live_view is not None and cc.live_view.running:
+                raise StreamActiveError("Live view is running, stop it before taking a bracket")
+            camera = cc.camera
+            previous = {n: v for n, v in cc.node_writer.snapshot().items() if n in ("ExposureAuto", "GainAuto", "ExposureTime", "Gain")}
+            cc._disarm_session()
+            session = GrabSession(camera, mode="trigger", buffers=max(len(steps), 2))
+            results = []
+            bracket = None
+            try:
+                cc.node_writer.apply([("ExposureAuto", "Off"), ("GainAuto", "Off"), ("ExposureTime", steps[0][0]), ("Gain", steps[0][1])])
+                session.arm()
+
+                started = time.perf_counter()
+                for i, (exposure, gain) in enumerate(steps):
+                    # The camera is trigger-ready once the previous frame's exposure is over, only
+                    # then may the values change; its readout overlaps the write
+                    exposing = steps[i - 1][0] if i else 0
+                    camera.WaitForFrameTriggerReady(self.timeout_ms + int(exposing / 1000), pylon.TimeoutHandling_ThrowException)
+                    if i:
+                        cc.node_writer.apply([("ExposureTime", exposure), ("Gain", gain)])
+                    camera.ExecuteSoftwareTrigger()
+
+                for exposure, _ in steps:
+                    grabResult = camera.RetrieveResult(self.timeout_ms + int(exposure / 1000), pylon.TimeoutHandling_ThrowException)
+                    results.append(grabResult)
+                elapsed = (time.perf_counter() - started) * 1000
+
+                if not all(r.GrabSucceeded() for r in results):
+                    raise RuntimeError("Bracket frame failed to grab")
+                bracket = Bracket(
+                    frames=[r.Array for r in results],
+                    exposures=[e for e, _ in steps],
+                    gains=[g for _, g in steps],
+                    pixel_format=cc.pixel_format(),
+                    timestamps=[r.TimeStamp for r in results],
+                    elapsed_ms=elapsed,
+                )
+            finally:
+                for grabResult in results:
+                    grabResult.Release()
+                try:
+                    session.disarm()
+                    cc.node_writer.apply(list(previous.items()))
+                except Exception as e:
+                    # Raised only if the burst itself succeeded, so it cannot mask the error that ended it
+                    self.logger.error(f"Restoring the camera after the bracket failed: {e}")
+                    if bracket is not None:
+                        raise
+                finally:
+                    cc._arm_session()
+
+        self.logger.info(
+            f"Bracket of {len(steps)} exposures ({', '.join(f'{e:.0f}' for e, _ in steps)} µs) in {bracket.elapsed_ms:.1f} ms"
+        )
+        return bracket
+
+
+def synthetic_bracket(shape: tuple, exposures: list, bits: int = 12, seed: int = 0) -> tuple:
+    """A scene spanning ~4 decades of radiance and its clipped, noisy exposures, for benchmarks."""
+
+    rng = np.random.default_rng(seed)
+    full_scale = (1 << bits) - 1
+    radiance = np.exp(rng.uniform(np.log(1e-3), np.log(10.0), size=shape)).astype(np.float32)
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    frames = []
+    for exposure in exposures:
+        signal = radiance * exposure
+        noisy = signal + rng.normal(0, 1.0, size=shape) * np.sqrt(signal + 1)
+        frames.append(np.clip(np.rint(noisy), 0, full_scale).astype(dtype))
+    return radiance, frames
+
+
+def benchmark_merge(shape=(3552, 3548), exposures=(30, 300, 3000), bits: int = 12, chunk_sizes=(32, 128, 512, None)) -> None:
+    radiance, frames = synthetic_bracket(shape, list(exposures), bits)
+    megapixels = shape[0] * shape[1] / 1e6
+    out = np.empty(shape, dtype=np.float32)
+    for chunk_rows in chunk_sizes:
+        rows = shape[0] if chunk_rows is None else chunk_rows
+        merge_bracket(frames, exposures, bits=bits, chunk_rows=rows, out=out)  # warm-up
+        started = time.perf_counter()
+        merge_bracket(frames, exposures, bits=bits, chunk_rows=rows, out=out)
+        elapsed = time.perf_counter() - started
+        scratch = 4 * rows * shape[1] * 4 / 1e6
+        label = "whole frame" if chunk_rows is None else f"{rows} rows"
+        print(
+            f"{label:12} {elapsed * 1000:7.1f} ms for {megapixels:.1f} MP x {len(frames)} frames, "
+            f"{elapsed * 1000 / megapixels:5.2f} ms/MP, {scratch:7.1f} MB scratch"
+        )
+
+    valid = (radiance * exposures[0] > 1) & (radiance * exposures[-1] < 0.95 * ((1 << bits) - 1))
+    error = np.abs(out[valid] - radiance[valid]) / radiance[valid]
+    print(f"median relative radiance error {np.median(error) * 100:.2f} % over {valid.mean() * 100:.0f} % of the pixels")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Exposure bracket burst and HDR merge")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--configs", nargs="+", metavar="CAMERA_CONFIG", help="Take exposure and gain from these camera configs")
+    source.add_argument("--exposures", nargs="+", type=float, metavar="US", help="Exposure times in mikrosekunder")
+    source.add_argument("--benchmark", action="store_true", help="Merge throughput on synthetic full-sensor frames, no camera")
+    parser.add_argument("--gain", type=float, default=None, help="Gain in dB for --exposures")
+    parser.add_argument("--rig", default="NA")
+    parser.add_argument("--chunk_rows", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=5, help="Brackets to time")
+    parser.add_argument("--save", action="store_true", help="Also store one bracket and its HDR frame in ./Captured_images")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.benchmark:
+        benchmark_merge()
+    else:
+        from Camera.camera_control import CameraControl
+        from Camera.config_compiler import load_config
+
+        if args.configs:
+            config = load_config("config.yaml")
+            plans = [dict(config.camera_plan(name)) for name in args.configs]
+            exposures = [plan["ExposureTime"] for plan in plans]
+            gains = [plan["Gain"] for plan in plans]
+        else:
+            exposures = args.exposures or [3000.0, 15000.0, 30000.0]
+            gains = None if args.gain is None else [args.gain] * len(exposures)
+
+        camera_control = CameraControl(rig=args.rig, catalog=None)
+        try:
+            burst = BracketBurst(camera_control)
+            times = []
+            for _ in range(args.repeat):
+                bracket = burst.capture(exposures, gains)
+                times.append(bracket.elapsed_ms)
+            started = time.perf_counter()
+            merge_bracket(bracket.frames, bracket.exposures, bracket.gains, bracket.bits, chunk_rows=args.chunk_rows)
+            merge_ms = (time.perf_counter() - started) * 1000
+            megapixels = bracket.frames[0].size / 1e6
+            print(
+                f"bracket of {len(exposures)}: median {np.median(times):.1f} ms (sum of exposures {sum(exposures) / 1000:.1f} ms); "
+                f"merge {merge_ms:.1f} ms, {merge_ms / megapixels:.2f} ms/MP"
+            )
+            if args.save:
+                camera_control.snap_bracket(exposures, gains)
+        finally:
+            camera_control.close()
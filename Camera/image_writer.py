@@ -0,0 +1,159 @@
+import json, os, queue, threading, time, logging
+
+from metrics import WRITE_SECONDS
+
+
+class ImageWriter:
+    """
+    Bounded pool of worker threads that encode and write images off the grab path.
+
+    Frames handed to ``submit`` become owned by the writer: the caller must not
+    modify the array afterwards. ``cv2.imwrite`` releases the GIL while encoding,
+    so a small thread pool is enough to keep PNG compression off the capture thread.
+    A frame may carry a sidecar dict that is written next to it as ``<name>.json``.
+    """
+
+    DROP_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+    def __init__(self, workers: int = 2, queue_size: int = 8, drop_policy: str = "block") -> None:
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"Invalid drop_policy '{drop_policy}', must be one of {self.DROP_POLICIES}")
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers and queue_size must be at least 1")
+
+        self.logger = logging.getLogger(__name__)
+        self.drop_policy = drop_policy
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._workers = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"ImageWriter-{i}", daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def submit(self, path: str, img, params=None, sidecar: dict = None, on_written=None) -> bool:
+        """
+        Queues an image for writing.
+
+        Args:
+            path (str): Destination file, the extension selects the encoder.
+            img: Image array. Ownership passes to the writer.
+            params: Optional encoder parameters passed on to ``cv2.imwrite``.
+            sidecar (dict): Optional metadata, written as JSON once the image is written.
+            on_written: Optional callable run on the worker once the image (and sidecar) is
+                on disk. A frame evicted by ``drop_oldest`` or failing to write never calls it.
+
+        Returns:
+            bool: False if the frame was dropped because the queue was full.
+
+        Raises:
+            RuntimeError: If the writer has been closed.
+        """
+
+        if self._closed:
+            raise RuntimeError("ImageWriter is closed")
+
+        job = (path, img, params, sidecar, on_written)
+
+        if self.drop_policy == "block":
+            self._queue.put(job)
+            return True
+
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            pass
+
+        if self.drop_policy == "drop_newest":
+            self._count_drop(path)
+            return False
+
+        # drop_oldest: evict the oldest pending frame to make room for this one
+        try:
+            old_path = self._queue.get_nowait()[0]
+            self._queue.task_done()
+            self._count_drop(old_path)
+        except queue.Empty:
+            pass
+
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self._count_drop(path)
+            return False
+
+    def pending(self) -> int:
+        """Number of frames waiting to be written."""
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """Blocks until every queued frame has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flushes pending frames and stops the worker threads."""
+
+        if self._closed:
+            return
+
+        self.flush()
+        self._closed = True
+        for _ in self._workers:
+            self._queue.put(None)
+        for thread in self._workers:
+            thread.join()
+
+        self.logger.info(
+            f"Image writer closed ({self.written} written, {self.dropped} dropped, {self.failed} failed)."
+        )
+
+    def _count_drop(self, path: str) -> None:
+        with self._stats_lock:
+            self.dropped += 1
+        self.logger.warning(f"Write queue full, dropped {path}")
+
+    def _worker(self) -> None:
+        import cv2  # imported by the worker, so creating a writer stays cheap
+
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+
+                path, img, params, sidecar, on_written = job
+                started = time.perf_counter()
+                ok = cv2.imwrite(path, img, params) if params else cv2.imwrite(path, img)
+                if ok and sidecar is not None:
+                    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+                        json.dump(sidecar, f)
+                WRITE_SECONDS.labels(os.path.splitext(path)[1].lstrip(".")).observe(time.perf_counter() - started)
+
+                with self._stats_lock:
+                    if ok:
+                        self.written += 1
+                    else:
+                        self.failed += 1
+                if not ok:
+                    self.logger.error(f"Failed to write image {path}")
+                elif on_written is not None:
+                    try:
+                        on_written()
+                    except Exception as e:
+                        self.logger.error(f"Completion of {path} failed: {e}")
+
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += 1
+                self.logger.error(f"Error writing image: {e}")
+
+            finally:
+                self._queue.task_done()
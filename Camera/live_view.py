@@ -0,0 +1,280 @@
+import time, threading, logging
+
+import numpy as np
+from pypylon import pylon
+
+from Camera.demosaic import Demosaicer
+from Camera.node_writer import StreamActiveError
+
+
+class FrameRing:
+    """
+    Fixed set of slots shared between one producer and any number of readers.
+
+    The producer acquires a slot that is neither the newest one nor checked out by a
+    reader, fills it, and publishes it. Readers only ever check out the newest slot,
+    so slow readers skip stale frames instead of queueing them.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.seq = 0
+        self._latest = None
+        self._seqs = [0] * size
+        self._busy = [0] * size
+        self._next = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Returns a free slot index for the producer, or None if every slot is in use."""
+
+        with self._cond:
+            for i in range(self.size):
+                slot = (self._next + i) % self.size
+                if slot != self._latest and self._busy[slot] == 0:
+                    self._next = (slot + 1) % self.size
+                    return slot
+        return None
+
+    def publish(self, slot: int) -> None:
+        with self._cond:
+            self.seq += 1
+            self._seqs[slot] = self.seq
+            self._latest = slot
+            self._cond.notify_all()
+
+    def checkout(self, after_seq: int = 0, timeout: float = None):
+        """
+        Waits for a frame newer than ``after_seq`` and checks out the newest slot.
+
+        Returns:
+            tuple: (slot, seq), or None on timeout. Pass the slot to ``checkin`` when done.
+        """
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq, timeout):
+                return None
+            slot = self._latest
+            self._busy[slot] += 1
+            return slot, self._seqs[slot]
+
+    def checkin(self, slot: int) -> None:
+        with self._cond:
+            self._busy[slot] -= 1
+
+    def wake(self) -> None:
+        """Wakes waiting readers, e.g. on shutdown."""
+        with self._cond:
+            self._cond.notify_all()
+
+
+class RateMeter:
+    """Exponentially smoothed event rate."""
+
+    def __init__(self, smoothing: float = 0.1) -> None:
+        self.smoothing = smoothing
+        self.rate = 0.0
+        self._last = None
+
+    def tick(self) -> None:
+        now = time.perf_counter()
+        if self._last is not None and now > self._last:
+            instant = 1.0 / (now - self._last)
+            self.rate = instant if self.rate == 0.0 else self.rate + self.smoothing * (instant - self.rate)
+        self._last = now
+
+
+class LiveViewPipeline:
+    """
+    Staged live view: grab -> convert -> consumers.
+
+    The grab thread keeps pylon's grab results (the pre-allocated stream buffers) in a
+    ring without copying them. The convert thread demosaics the newest one straight
+    from the grab buffer into reused preview arrays, optionally downscaled. Consumers
+    (the OpenCV window, the preview server) check out the newest preview and never
+    block the grab. ``camera_mutex`` is only held while starting and stopping the stream,
+    and snapshots can be served from the ring while live view runs.
+
+    Args:
+        camera_control: The owning CameraControl.
+        ring_size (int): Number of grab buffers held by the pipeline.
+        preview_scale (float): Scale of the converted preview frames.
+    """
+
+    def __init__(self, camera_control, ring_size: int = 4, preview_scale: float = 1.0) -> None:
+        self.camera_control = camera_control
+        self.preview_scale = preview_scale
+        self.logger = logging.getLogger(__name__)
+
+        self.raw_ring = FrameRing(ring_size)
+        self._raw_slots = [None] * ring_size
+
+        # Triple buffering: one being written, one published, one held by a reader
+        self.preview_ring = FrameRing(3)
+        self._previews = [None] * 3
+
+        self.sensor_fps = RateMeter()
+        self.convert_fps = RateMeter()
+        self.dropped = 0
+        self.error = None
+
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    def start(self) -> None:
+        """
+        Starts the stream and the pipeline threads and publishes the pipeline as
+        ``camera_control.live_view``, all under ``camera_mutex``, so a capture sees either
+        no live view and an idle stream or a running live view.
+
+        Raises:
+            StreamActiveError: If another live view pipeline is already running.
+        """
+
+        cc = self.camera_control
+        camera = cc.camera
+
+        with cc.camera_mutex:
+            if cc.live_view is not None and cc.live_view.running:
+                raise StreamActiveError("Another live view pipeline is already running")
+            cc._disarm_session()
+            # Keep spare buffers for the grab engine beyond the ones we hold
+            camera.MaxNumBuffer.Value = self.raw_ring.size + 3
+            camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+
+            self._demosaicer = Demosaicer(camera.PixelFormat.Value, self.preview_scale)
+            self._stop_event.clear()
+            self._threads = [
+                threading.Thread(target=self._grab_loop, name="LiveView-grab", daemon=True),
+                threading.Thread(target=self._convert_loop, name="LiveView-convert", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+            cc.live_view = self
+
+        self.logger.info("Live view pipeline started.")
+
+    def stop(self) -> None:
+        cc = self.camera_control
+
+        # Held throughout, a capture must not find the stream grabbing without a running live view
+        with cc.camera_mutex:
+            if cc.live_view is self:
+                cc.live_view = None
+
+            self._stop_event.set()
+            self.raw_ring.wake()
+            self.preview_ring.wake()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+            for i, grabResult in enumerate(self._raw_slots):
+                if grabResult is not None:
+                    grabResult.Release()
+                    self._raw_slots[i] = None
+
+            if cc.camera.IsGrabbing():
+                cc.camera.StopGrabbing()
+            cc._arm_session()
+
+        self.logger.info("Live view pipeline stopped.")
+
+    def checkout_preview(self, after_seq: int = 0, timeout: float = 1.0):
+        """
+        Returns (slot, seq, frame) for the newest BGR preview, or None on timeout.
+        The frame must not be modified; hand the slot back with ``checkin_preview``.
+        """
+
+        item = self.preview_ring.checkout(after_seq, timeout)
+        if item is None:
+            return None
+        slot, seq = item
+        return slot, seq, self._previews[slot]
+
+    def checkin_preview(self, slot: int) -> None:
+        self.preview_ring.checkin(slot)
+
+    def latest_raw(self, timeout: float = 5.0):
+        """
+        Copies the newest raw frame out of the ring.
+
+        Returns:
+            tuple: (frame, hardware timestamp), or None if no frame arrived in time.
+        """
+
+        item = self.raw_ring.checkout(0, timeout)
+        if item is None:
+            return None
+        slot, _ = item
+        try:
+            grabResult = self._raw_slots[slot]
+            return grabResult.Array, grabResult.TimeStamp
+        finally:
+            self.raw_ring.checkin(slot)
+
+    def _grab_loop(self) -> None:
+        camera = self.camera_control.camera
+        try:
+            while not self._stop_event.is_set() and camera.IsGrabbing():
+                grabResult = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
+                if not grabResult.GrabSucceeded():
+                    self.logger.error("Failed to grab image (stream).")
+                    grabResult.Release()
+                    continue
+
+                self.sensor_fps.tick()
+                slot = self.raw_ring.acquire()
+                if slot is None:
+                    # Every buffer is being read, drop this frame
+                    self.dropped += 1
+                    grabResult.Release()
+                    continue
+
+                previous = self._raw_slots[slot]
+                self._raw_slots[slot] = grabResult
+                if previous is not None:
+                    previous.Release()  # hands the buffer back to the grab engine
+                self.raw_ring.publish(slot)
+
+        except Exception as e:
+            self.error = e
+            self.logger.error(f"Error during live stream: {e}")
+            self._stop_event.set()
+            self.preview_ring.wake()
+
+    def _convert_loop(self) -> None:
+        seq = 0
+        try:
+            while not self._stop_event.is_set():
+                item = self.raw_ring.checkout(seq, timeout=0.5)
+                if item is None:
+                    continue
+                slot, seq = item
+
+                try:
+                    with self._raw_slots[slot].GetArrayZeroCopy() as raw:
+                        out = self.preview_ring.acquire()
+                        if out is None:
+                            del raw
+                            continue
+                        shape = self._demosaicer.output_shape(raw.shape)
+                        if self._previews[out] is None or self._previews[out].shape != shape:
+                            self._previews[out] = np.empty(shape, dtype=np.uint8)
+                        self._demosaicer.convert(raw, out=self._previews[out])
+                        del raw
+                finally:
+                    self.raw_ring.checkin(slot)
+
+                self.convert_fps.tick()
+                self.preview_ring.publish(out)
+
+        except Exception as e:
+            self.error = e
+            self.logger.error(f"Error converting live view frame: {e}")
+            self._stop_event.set()
+            self.preview_ring.wake()
@@ -0,0 +1,214 @@
+'''
+Concurrent capture from every rig camera listed in config.yaml through a single InstantCameraArray.
+
+Run against pylon's camera emulator (no hardware needed):
+    PYLON_CAMEMU=3 python3 -m Camera.multi_camera --emulated --seconds 5
+'''
+
+import argparse, time, threading, logging
+from dataclasses import dataclass
+
+import numpy as np
+from pypylon import pylon
+
+from Camera.config_compiler import load_config
+from Camera.devices import find_device, transport_plan, configure_stream_grabber, stream_statistics
+from Camera.node_writer import NodeWriter
+
+
+@dataclass
+class TaggedFrame:
+    rig: str
+    array: np.ndarray
+    hw_timestamp: int      # camera tick counter (GevTimestamp / chunk timestamp)
+    host_timestamp: float  # time.time() when the frame was retrieved
+    frame_number: int
+
+
+class MultiCameraEngine:
+    """
+    Opens the cameras of several rigs by serial/IP and grabs from them concurrently.
+
+    Args:
+        rigs (list): Names from the ``setups`` section, defaults to all of them.
+        config (str): Path to config.yaml.
+        emulated (bool): Map rigs onto pylon emulator devices in order and skip the
+            ace 2 specific config push.
+    """
+
+    def __init__(self, rigs=None, config="config.yaml", emulated=False) -> None:
+        self.logger = logging.getLogger(__name__)
+
+        compiled = load_config(config)
+        setups = compiled.setups
+
+        self.rigs = list(setups.keys()) if rigs is None else list(rigs)
+        for rig in self.rigs:
+            if rig not in setups:
+                raise ValueError(f"Unknown rig '{rig}' in config.yaml")
+
+        tl_factory = pylon.TlFactory.GetInstance()
+        devices = tl_factory.EnumerateDevices()
+
+        if emulated:
+            emulators = [d for d in devices if d.GetDeviceClass() == "BaslerCamEmu"]
+            if len(emulators) < len(self.rigs):
+                raise RuntimeError(
+                    f"{len(self.rigs)} rigs need PYLON_CAMEMU>={len(self.rigs)}, found {len(emulators)} emulated cameras"
+                )
+            device_infos = emulators[: len(self.rigs)]
+        else:
+            device_infos = [
+                find_device(setups[rig]["camera"].get("serial"), setups[rig]["camera"].get("ip"), devices)
+                for rig in self.rigs
+            ]
+
+        self.cameras = pylon.InstantCameraArray(len(self.rigs))
+        for i, cam in enumerate(self.cameras):
+            cam.Attach(tl_factory.CreateDevice(device_infos[i]))
+            cam.SetCameraContext(i)  # maps grab results back to self.rigs[i]
+
+        self.cameras.Open()
+
+        for i, cam in enumerate(self.cameras):
+            rig = self.rigs[i]
+            # The rigs share one uplink when grabbing together, so each gets its planned share
+            plan = transport_plan(cam, compiled, rig)
+            if not emulated:
+                plan = list(compiled.rig_plans[rig]) + plan
+            NodeWriter(cam).apply(plan)
+            configure_stream_grabber(cam, compiled)
+
+            # Unlike single snapshots, the engine streams at the configured frame rate
+            stream_plan = compiled.stream_plan(rig)
+            fps = dict(compiled.rig_plans[rig]).get("AcquisitionFrameRate")
+            if stream_plan is not None and fps is not None and fps > stream_plan.max_fps:
+                self.logger.warning(
+                    f"{rig} streams at {fps:.1f} fps but its share of the link carries at most {stream_plan.max_fps:.1f} fps"
+                )
+
+        self._stats_lock = threading.Lock()
+        self._stats = {rig: {"frames": 0, "bytes": 0, "first": None, "last": None} for rig in self.rigs}
+        self._stream_counters = {rig: {} for rig in self.rigs}  # as of the last stop
+
+        for i, cam in enumerate(self.cameras):
+            self.logger.info(
+                f"{self.rigs[i]} bound to {cam.GetDeviceInfo().GetModelName()} ({cam.GetDeviceInfo().GetSerialNumber()})"
+            )
+
+    def start(self) -> None:
+        """Starts grabbing on all cameras, keeping only the newest frame of each."""
+
+        if not self.cameras.IsGrabbing():
+            self.cameras.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+
+    def stop(self) -> None:
+        if self.cameras.IsGrabbing():
+            # pylon restarts the counters with the next StartGrabbing, keep them for throughput()
+            self._stream_counters = {self.rigs[i]: stream_statistics(cam) for i, cam in enumerate(self.cameras)}
+            self.cameras.StopGrabbing()
+
+    def grab_set(self, timeout_ms: int = 5000) -> dict:
+        """
+        Retrieves one frame from every camera.
+
+        Returns:
+            dict: rig name -> TaggedFrame.
+
+        Raises:
+            TimeoutException: If a camera fails to deliver within ``timeout_ms``.
+        """
+
+        self.start()
+        frames = {}
+        while len(frames) < len(self.rigs):
+            frame = self._retrieve(timeout_ms)
+            if frame is not None:
+                frames[frame.rig] = frame
+        return frames
+
+    def run(self, seconds: float, callback=None, timeout_ms: int = 5000) -> None:
+        """Grabs continuously from all cameras for ``seconds``, handing every frame to ``callback``."""
+
+        self.start()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = self._retrieve(timeout_ms)
+            if frame is not None and callback is not None:
+                callback(frame)
+
+    def throughput(self) -> dict:
+        """
+        Returns frames/s and MB/s per rig since the first retrieved frame, plus the stream
+        grabber's resend requests and failed buffers of the current (or last) grab.
+        """
+
+        report = {}
+        with self._stats_lock:
+            for rig, stats in self._stats.items():
+                elapsed = (stats["last"] - stats["first"]) if stats["first"] is not None else 0.0
+                report[rig] = {
+                    "frames": stats["frames"],
+                    "fps": (stats["frames"] - 1) / elapsed if elapsed > 0 else 0.0,
+                    "mb_per_s": stats["bytes"] / elapsed / 1e6 if elapsed > 0 else 0.0,
+                }
+        grabbing = self.cameras.IsGrabbing()
+        for i, cam in enumerate(self.cameras):
+            counters = stream_statistics(cam) if grabbing else self._stream_counters[self.rigs[i]]
+            report[self.rigs[i]]["resend_requests"] = counters.get("resend_requests", 0)
+            report[self.rigs[i]]["failed_buffers"] = counters.get("failed_buffers", 0)
+        return report
+
+    def close(self) -> None:
+        self.stop()
+        self.cameras.Close()
+
+    def _retrieve(self, timeout_ms: int):
+        grabResult = self.cameras.RetrieveResult(timeout_ms, pylon.TimeoutHandling_ThrowException)
+        try:
+            rig = self.rigs[grabResult.GetCameraContext()]
+            if not grabResult.GrabSucceeded():
+                self.logger.error(f"Failed to grab image from {rig}: {grabResult.GetErrorDescription()}")
+                return None
+
+            frame = TaggedFrame(
+                rig=rig,
+                array=grabResult.Array,
+                hw_timestamp=grabResult.TimeStamp,
+                host_timestamp=time.time(),
+                frame_number=grabResult.ImageNumber,
+            )
+        finally:
+            grabResult.Release()
+
+        now = time.monotonic()
+        with self._stats_lock:
+            stats = self._stats[rig]
+            stats["frames"] += 1
+            stats["bytes"] += frame.array.nbytes
+            if stats["first"] is None:
+                stats["first"] = now
+            stats["last"] = now
+        return frame
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("Multi camera throughput check")
+    parser.add_argument("--rigs", nargs="*", default=None, help="Rigs from config.yaml (default: all)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of the run")
+    parser.add_argument("--emulated", action="store_true", help="Use pylon emulated cameras (set PYLON_CAMEMU)")
+    args = parser.parse_args()
+
+    engine = MultiCameraEngine(rigs=args.rigs, emulated=args.emulated)
+    try:
+        engine.run(args.seconds)
+    finally:
+        engine.close()
+
+    for rig, stats in engine.throughput().items():
+        print(
+            f"{rig}: {stats['frames']} frames, {stats['fps']:.1f} fps, {stats['mb_per_s']:.1f} MB/s, "
+            f"{stats['resend_requests']} resend requests, {stats['failed_buffers']} failed buffers"
+        )
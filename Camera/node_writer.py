@@ -0,0 +1,193 @@
+import logging
+
+# Nodes that can only be written while the camera is not grabbing
+STREAM_NODES = ("Width", "Height", "OffsetX", "OffsetY", "PixelFormat", "GevSCPSPacketSize")
+
+# Auto functions and the manual node they take control of while not "Off"
+AUTO_NODES = {"ExposureAuto": "ExposureTime", "GainAuto": "Gain"}
+
+# (lower, upper) limit pairs that must not cross while being rewritten
+LIMIT_PAIRS = [
+    ("AutoExposureTimeLowerLimit", "AutoExposureTimeUpperLimit"),
+    ("AutoGainLowerLimit", "AutoGainUpperLimit"),
+]
+
+# (size node, offset node) per axis
+ROI_AXES = [("Width", "OffsetX"), ("Height", "OffsetY")]
+
+
+class StreamActiveError(RuntimeError):
+    """A node write or burst that needs the stream was refused because someone else is grabbing."""
+
+
+class NodeWriter:
+    """
+    Applies GenICam node plans with as few round-trips as possible.
+
+    Node values are read back from the camera once and cached, so later plans only
+    write the nodes whose value differs. Writes are ordered so every intermediate
+    state is valid (auto functions off before manual values, shrink ROI before moving
+    the offset, lower/upper limits never crossing) and a failed write rolls back the
+    nodes already written in the batch.
+
+    Args:
+        camera: An opened pylon.InstantCamera.
+        skip_missing (bool): Leave out nodes the device does not implement instead of
+            failing, e.g. ace 2 auto function nodes on pylon's emulated camera.
+    """
+
+    def __init__(self, camera, skip_missing: bool = False) -> None:
+        self.camera = camera
+        self.skip_missing = skip_missing
+        self.logger = logging.getLogger(__name__)
+
+        self._state = {}
+        self._missing = set()
+        self.writes = 0
+        self.reads = 0
+        self.round_trips_saved = 0
+        self.rollbacks = 0
+
+    def invalidate(self) -> None:
+        """Forgets the cached node values, e.g. after the camera was reconnected."""
+        self._state.clear()
+
+    def snapshot(self) -> dict:
+        """Returns a copy of the cached node values."""
+        return dict(self._state)
+
+    def apply(self, plan, force: bool = False) -> int:
+        """
+        Writes the nodes of ``plan`` that differ from the camera's current values.
+
+        Args:
+            plan: Sequence of (node name, value) pairs.
+            force (bool): Write every node regardless of the cached values.
+
+        Returns:
+            int: Number of nodes written.
+
+        Raises:
+            StreamActiveError: If ROI or pixel format would change while the camera is grabbing.
+            Exception: The failing write's exception, after rolling back the batch.
+        """
+
+        plan = list(plan)
+        writes = self.pending(plan, force)
+        if self.skip_missing:
+            plan = [(n, v) for n, v in plan if n not in self._missing]
+        self.round_trips_saved += len(plan) - len(writes)
+        if not writes:
+            return 0
+
+        if self.camera.IsGrabbing() and any(node in STREAM_NODES for node, _ in writes):
+            raise StreamActiveError("ROI, pixel format and packet size can only be written while the camera is not grabbing")
+
+        applied = []
+        try:
+            for node, value in self._order(writes):
+                previous = self._state.get(node)
+                getattr(self.camera, node).Value = value
+                self.writes += 1
+                applied.append((node, previous))
+                self._state[node] = value
+        except Exception as e:
+            self.logger.error(f"Node write failed ({e}), rolling back {len(applied)} writes")
+            self._rollback(applied)
+            raise
+
+        return len(writes)
+
+    def pending(self, plan, force: bool = False) -> list:
+        """The (node name, value) pairs of ``plan`` that ``apply`` would write right now."""
+
+        plan = list(plan)
+        self._read_missing(node for node, _ in plan)
+        if self.skip_missing:
+            plan = [(n, v) for n, v in plan if n not in self._missing]
+        return plan if force else [(n, v) for n, v in plan if self._needs_write(n, v)]
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "reads": self.reads,
+            "round_trips_saved": self.round_trips_saved,
+            "rollbacks": self.rollbacks,
+        }
+
+    def _read_missing(self, nodes) -> None:
+        for node in nodes:
+            if node in self._state or node in self._missing:
+                continue
+            try:
+                feature = getattr(self.camera, node)
+            except Exception:
+                self._missing.add(node)
+                if self.skip_missing:
+                    self.logger.warning(f"Camera has no {node} node, skipping it")
+                continue
+            try:
+                self._state[node] = feature.Value
+            except Exception:
+                self._state[node] = None  # unreadable, always written
+            self.reads += 1
+
+    def _needs_write(self, node: str, value) -> bool:
+        # A manual value under an active auto function drifts, so the cache can't be trusted
+        for auto, target in AUTO_NODES.items():
+            if node == target and self._state.get(auto) != "Off":
+                return True
+        return not _equal(self._state.get(node), value)
+
+    def _order(self, writes) -> list:
+        values = dict(writes)
+        first, stream, middle, last = [], [], [], []
+
+        for node, value in writes:
+            if node in AUTO_NODES:
+                (first if value == "Off" else last).append((node, value))
+            elif node == "PixelFormat":
+                stream.insert(0, (node, value))
+            elif any(node in axis for axis in ROI_AXES):
+                continue  # ROI is ordered per axis below
+            else:
+                middle.append((node, value))
+
+        for size, offset in ROI_AXES:
+            axis = [(n, values[n]) for n in (size, offset) if n in values]
+            current = self._state.get(size)
+            shrinking = size in values and current is not None and values[size] < current
+            # Shrink before moving the offset, move the offset before growing
+            axis.sort(key=lambda item: (item[0] == offset) == shrinking)
+            stream.extend(axis)
+
+        for lower, upper in LIMIT_PAIRS:
+            if lower in values and upper in values:
+                current_upper = self._state.get(upper)
+                if current_upper is not None and values[lower] > current_upper:
+                    i, j = middle.index((lower, values[lower])), middle.index((upper, values[upper]))
+                    if i < j:
+                        middle[i], middle[j] = middle[j], middle[i]
+
+        return first + stream + middle + last
+
+    def _rollback(self, applied) -> None:
+        self.rollbacks += 1
+        for node, previous in reversed(applied):
+            if previous is None:
+                self._state.pop(node, None)
+                continue
+            try:
+                getattr(self.camera, node).Value = previous
+                self._state[node] = previous
+            except Exception as e:
+                self._state.pop(node, None)
+                self.logger.error(f"Rollback of {node} failed: {e}")
+
+
+def _equal(current, value) -> bool:
+    if current is None:
+        return False
+    if isinstance(value, float) or isinstance(current, float):
+        return abs(current - value) <= 1e-6 * max(abs(value), 1.0)
+    return current == value
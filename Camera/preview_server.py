@@ -0,0 +1,275 @@
+'''
+Headless live view over HTTP.
+
+    /           small HTML page showing the stream
+    /stream     MJPEG (multipart/x-mixed-replace) live stream
+    /snapshot   full resolution JPEG of the newest frame
+
+Try it against pylon's emulated camera:
+    PYLON_CAMEMU=1 python3 -m Camera.preview_server --port 8080
+    curl -o snap.jpg http://127.0.0.1:8080/snapshot
+'''
+
+import argparse, time, threading, logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from Camera.demosaic import Demosaicer
+from Camera.live_view import LiveViewPipeline
+
+BOUNDARY = "lotusframe"
+
+
+class PreviewServer:
+    """
+    Serves the live view as MJPEG to any number of local HTTP clients.
+
+    Each preview frame is JPEG-encoded once by a single encoder thread and the same
+    bytes are sent to every client; clients that fall behind skip to the newest frame.
+    JPEG quality and resolution adapt to the number of clients and to the slowest
+    client's measured throughput.
+
+    Args:
+        camera_control: The CameraControl whose grab path is reused.
+        host (str): Interface to bind, localhost by default.
+        port (int): TCP port.
+        preview_scale (float): Scale of the preview frames produced by the live view pipeline.
+        max_fps (float): Upper bound for the encoded frame rate.
+    """
+
+    MIN_QUALITY, MAX_QUALITY = 40, 85
+    MIN_SCALE = 0.25
+
+    def __init__(self, camera_control, host: str = "127.0.0.1", port: int = 8080, preview_scale: float = 0.5, max_fps: float = 15.0) -> None:
+        self.camera_control = camera_control
+        self.preview_scale = preview_scale
+        self.max_fps = max_fps
+        self.logger = logging.getLogger(__name__)
+
+        self.quality = self.MAX_QUALITY
+        self.scale = 1.0  # applied on top of preview_scale
+
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._cond = threading.Condition()
+        self._clients = {}  # client id -> measured bytes/s
+        self._client_ids = 0
+        self._stop_event = threading.Event()
+        self._pipeline = None
+        self._owns_pipeline = False
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    server._send_index(self)
+                elif self.path.startswith("/stream"):
+                    server._send_stream(self)
+                elif self.path.startswith("/snapshot"):
+                    server._send_snapshot(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                server.logger.debug(format % args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def address(self) -> tuple:
+        return self.httpd.server_address
+
+    def start(self) -> None:
+        """Starts (or joins) the live view pipeline, the encoder and the HTTP server in background threads."""
+
+        if self.camera_control.live_view is not None and self.camera_control.live_view.running:
+            self._pipeline = self.camera_control.live_view
+        else:
+            self._pipeline = LiveViewPipeline(self.camera_control, preview_scale=self.preview_scale)
+            self._pipeline.start()  # publishes itself as camera_control.live_view under camera_mutex
+            self._owns_pipeline = True
+
+        self._stop_event.clear()
+        threading.Thread(target=self._encode_loop, name="Preview-encoder", daemon=True).start()
+        threading.Thread(target=self.httpd.serve_forever, name="Preview-http", daemon=True).start()
+        self.logger.info(f"Preview server listening on http://{self.address[0]}:{self.address[1]}/")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+        if self._owns_pipeline:
+            self._pipeline.stop()
+        self.logger.info("Preview server stopped.")
+
+    def client_count(self) -> int:
+        with self._cond:
+            return len(self._clients)
+
+    # Encoder
+    def _encode_loop(self) -> None:
+        seq = 0
+        scaled = None
+
+        while not self._stop_event.is_set():
+            if self.client_count() == 0:
+                time.sleep(0.1)  # no viewers, nothing to encode
+                continue
+
+            started = time.perf_counter()
+            item = self._pipeline.checkout_preview(seq, timeout=1.0)
+            if item is None:
+                continue
+
+            slot, seq, frame = item
+            try:
+                if self.scale < 1.0:
+                    size = (max(1, int(frame.shape[1] * self.scale)), max(1, int(frame.shape[0] * self.scale)))
+                    if scaled is None or (scaled.shape[1], scaled.shape[0]) != size:
+                        scaled = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    else:
+                        cv2.resize(frame, size, dst=scaled, interpolation=cv2.INTER_AREA)
+                    source = scaled
+                else:
+                    source = frame
+                ok, jpeg = cv2.imencode(".jpg", source, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            finally:
+                self._pipeline.checkin_preview(slot)
+
+            if ok:
+                with self._cond:
+                    self._jpeg = jpeg.tobytes()
+                    self._jpeg_seq += 1
+                    self._cond.notify_all()
+                self._adapt(len(self._jpeg))
+
+            # Cap the encode rate, the sensor may run much faster than anyone needs to watch
+            remaining = 1.0 / self.max_fps - (time.perf_counter() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _adapt(self, jpeg_size: int) -> None:
+        """Steers quality first, then resolution, toward what the slowest client can take."""
+
+        with self._cond:
+            clients = len(self._clients)
+            rates = [rate for rate in self._clients.values() if rate > 0]
+
+        # More viewers -> lower ceiling, so one busy box doesn't saturate the uplink
+        ceiling = self.MAX_QUALITY - 5 * max(0, clients - 1)
+        budget = min(rates) / self.max_fps if rates else None
+
+        if budget is not None and jpeg_size > budget:
+            if self.quality > self.MIN_QUALITY:
+                self.quality = max(self.MIN_QUALITY, self.quality - 5)
+            elif self.scale > self.MIN_SCALE:
+                self.scale = max(self.MIN_SCALE, self.scale * 0.75)
+        elif budget is None or jpeg_size < 0.5 * budget:
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale / 0.75)
+            elif self.quality < ceiling:
+                self.quality = min(ceiling, self.quality + 5)
+
+        self.quality = min(self.quality, max(self.MIN_QUALITY, ceiling))
+
+    # HTTP endpoints
+    def _send_index(self, handler) -> None:
+        body = b"<html><body style='margin:0;background:#000'><img src='/stream' style='max-width:100%'></body></html>"
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_stream(self, handler) -> None:
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+
+        with self._cond:
+            self._client_ids += 1
+            client = self._client_ids
+            self._clients[client] = 0.0
+        self.logger.info(f"Preview client connected ({self.client_count()} watching).")
+
+        seq = 0
+        try:
+            while not self._stop_event.is_set():
+                with self._cond:
+                    self._cond.wait_for(lambda: self._jpeg_seq > seq or self._stop_event.is_set(), timeout=5.0)
+                    if self._jpeg_seq == seq:
+                        continue
+                    jpeg, seq = self._jpeg, self._jpeg_seq
+
+                started = time.perf_counter()
+                handler.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                )
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+                handler.wfile.flush()
+                elapsed = time.perf_counter() - started
+
+                # Only a write that actually blocked says something about the link
+                if elapsed > 0.005:
+                    with self._cond:
+                        previous = self._clients[client]
+                        rate = len(jpeg) / elapsed
+                        self._clients[client] = rate if previous == 0 else 0.8 * previous + 0.2 * rate
+
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                del self._clients[client]
+            self.logger.info(f"Preview client disconnected ({self.client_count()} watching).")
+
+    def _send_snapshot(self, handler) -> None:
+        frame = self._pipeline.latest_raw()
+        if frame is None:
+            handler.send_error(503, "No frame available")
+            return
+
+        bgr = Demosaicer(self.camera_control.camera.PixelFormat.Value).convert(frame[0])
+        ok, jpeg = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            handler.send_error(500, "Encoding failed")
+            return
+
+        body = jpeg.tobytes()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+if __name__ == "__main__":
+    from Camera.camera_control import CameraControl
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("LOTUS-PTO headless preview server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--scale", type=float, default=0.5, help="Preview scale (default: 0.5)")
+    args = parser.parse_args()
+
+    camera_control = CameraControl()
+    server = PreviewServer(camera_control, host=args.host, port=args.port, preview_scale=args.scale)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        camera_control.close()
@@ -0,0 +1,250 @@
+import json, os, time, threading, logging
+
+import numpy as np
+
+# One fixed-size record per frame, appended to index.bin
+INDEX_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),      # host wall clock (time.time())
+        ("hw_timestamp", "<u8"),   # camera tick counter from the grab result
+        ("chunk", "<u4"),
+        ("offset", "<u8"),         # byte offset within the chunk file
+        ("height", "<u4"),
+        ("width", "<u4"),
+        ("dtype", "S8"),
+        # Positions in the session's names.json, so names of any length fit a fixed record
+        ("rig", "<u2"),
+        ("camera_config", "<u2"),
+        ("light_config", "<u2"),
+    ]
+)
+
+
+def _load_names(session_dir: str) -> list:
+    path = os.path.join(session_dir, "names.json")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _chunk_path(session_dir: str, chunk: int) -> str:
+    return os.path.join(session_dir, f"chunk_{chunk:05d}.raw")
+
+
+class RawArchive:
+    """
+    Append-only archive of undemosaiced frames stored in memory-mapped chunk files.
+
+    A session is a directory holding ``chunk_NNNNN.raw`` files of ``chunk_bytes``
+    each plus ``index.bin``, an array of ``INDEX_DTYPE`` records. Appending a frame
+    is a single copy into the mapped chunk followed by a small index write. Rig and
+    config names are stored once in ``names.json`` and referenced by position. Free-form
+    per-frame metadata (e.g. quality metrics) goes to ``sidecar.jsonl``.
+
+    Args:
+        root (str): Directory under which sessions are created.
+        session (str): Session name, defaults to ``session_<timestamp>``. An existing
+            session is reopened and appended to.
+        chunk_bytes (int): Size of each chunk file.
+    """
+
+    def __init__(self, root: str = "./Raw_archive", session: str = None, chunk_bytes: int = 1 << 30) -> None:
+        if session is None:
+            session = time.strftime("session_%Y%m%d-%H%M%S")
+
+        self.logger = logging.getLogger(__name__)
+        self.session_dir = os.path.join(root, session)
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(self.session_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.session_dir, "index.bin")
+        self._chunk = 0
+        self._offset = 0
+        self._count = 0
+        self._mm = None
+        self._names = _load_names(self.session_dir)
+        self._name_ids = {name: i for i, name in enumerate(self._names)}
+
+        # Resume after the last frame of an existing session
+        if os.path.exists(self._index_path):
+            index = np.fromfile(self._index_path, dtype=INDEX_DTYPE)
+            self._count = len(index)
+            if self._count:
+                last = index[-1]
+                nbytes = int(last["height"]) * int(last["width"]) * np.dtype(last["dtype"].decode()).itemsize
+                self._chunk = int(last["chunk"])
+                self._offset = int(last["offset"]) + nbytes
+
+        self._index_file = open(self._index_path, "ab")
+        self._sidecar_file = open(os.path.join(self.session_dir, "sidecar.jsonl"), "a")
+        self._open_chunk(self._chunk)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(
+        self,
+        frame: np.ndarray,
+        rig: str = "NA",
+        camera_config: str = "DEFAULT",
+        light_config: str = "DEFAULT",
+        hw_timestamp: int = 0,
+        timestamp: float = None,
+        sidecar: dict = None,
+    ) -> int:
+        """
+        Copies a 2D frame into the archive.
+
+        Args:
+            frame (np.ndarray): Raw Bayer (or mono) frame, may be a zero-copy view of the grab buffer.
+            rig (str): Name of the setup the frame was captured from.
+            camera_config (str): Name of the camera config in use.
+            light_config (str): Name of the light config in use.
+            hw_timestamp (int): Camera timestamp of the frame.
+            timestamp (float): Host timestamp, defaults to now.
+            sidecar (dict): Optional JSON-serialisable metadata stored with the frame.
+
+        Returns:
+            int: Index of the stored frame.
+
+        Raises:
+            ValueError: If the frame is not 2D or does not fit in a single chunk.
+        """
+
+        if frame.ndim != 2:
+            raise ValueError(f"Raw archive stores 2D frames, got shape {frame.shape}")
+        if frame.nbytes > self.chunk_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit in a {self.chunk_bytes} byte chunk")
+
+        with self._lock:
+            if self._offset + frame.nbytes > self.chunk_bytes:
+                self._finish_chunk()
+                self._chunk += 1
+                self._offset = 0
+                self._open_chunk(self._chunk)
+
+            dst = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._mm, offset=self._offset)
+            np.copyto(dst, frame)
+
+            record = np.zeros(1, dtype=INDEX_DTYPE)
+            record["timestamp"] = time.time() if timestamp is None else timestamp
+            record["hw_timestamp"] = hw_timestamp
+            record["chunk"] = self._chunk
+            record["offset"] = self._offset
+            record["height"], record["width"] = frame.shape
+            record["dtype"] = frame.dtype.str
+            record["rig"] = self._name_id(rig)
+            record["camera_config"] = self._name_id(camera_config)
+            record["light_config"] = self._name_id(light_config)
+            self._index_file.write(record.tobytes())
+            self._index_file.flush()
+            if sidecar is not None:
+                self._sidecar_file.write(json.dumps(dict(sidecar, index=self._count)) + "\n")
+                self._sidecar_file.flush()
+
+            self._offset += frame.nbytes
+            self._count += 1
+            return self._count - 1
+
+    def close(self) -> None:
+        """Flushes the current chunk and trims it to the bytes actually used."""
+
+        with self._lock:
+            if self._mm is None:
+                return
+            self._finish_chunk()
+            self._index_file.close()
+            self._sidecar_file.close()
+            self.logger.info(f"Raw archive {self.session_dir} closed with {self._count} frames.")
+
+    def _name_id(self, name: str) -> int:
+        """Position of ``name`` in names.json, adding it first if it is new."""
+
+        name_id = self._name_ids.get(name)
+        if name_id is not None:
+            return name_id
+        if len(self._names) > np.iinfo(INDEX_DTYPE["rig"]).max:
+            raise ValueError(f"Raw archive session {self.session_dir} has too many distinct names")
+
+        # Written before the index record that refers to it, so readers never see an unknown id
+        path = os.path.join(self.session_dir, "names.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self._names + [name], f)
+        os.replace(f"{path}.tmp", path)
+        self._names.append(name)
+        self._name_ids[name] = len(self._names) - 1
+        return self._name_ids[name]
+
+    def _open_chunk(self, chunk: int) -> None:
+        path = _chunk_path(self.session_dir, chunk)
+        # Chunks are trimmed on close, so grow the file back to full size before mapping
+        with open(path, "ab") as f:
+            f.truncate(self.chunk_bytes)
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r+", shape=(self.chunk_bytes,))
+
+    def _finish_chunk(self) -> None:
+        self._mm.flush()
+        path = self._mm.filename
+        self._mm = None  # drops the mapping before the file is trimmed
+        os.truncate(path, self._offset)
+
+
+class RawArchiveReader:
+    """
+    Random access reader for a ``RawArchive`` session.
+
+    Frames are returned as read-only memory-mapped views, so only the pages that
+    are touched get read from disk.
+    """
+
+    def __init__(self, session_dir: str) -> None:
+        self.session_dir = session_dir
+        self.index = np.memmap(os.path.join(session_dir, "index.bin"), dtype=INDEX_DTYPE, mode="r")
+        self.names = _load_names(session_dir)  # loaded after the index, so it covers every record in it
+        self._chunks = {}
+        self._sidecars = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.frame(i)
+
+    def frame(self, i: int) -> np.ndarray:
+        """Returns frame ``i`` as a read-only view into its chunk file."""
+
+        record = self.index[i]
+        chunk = int(record["chunk"])
+        if chunk not in self._chunks:
+            self._chunks[chunk] = np.memmap(_chunk_path(self.session_dir, chunk), dtype=np.uint8, mode="r")
+        shape = (int(record["height"]), int(record["width"]))
+        return np.ndarray(
+            shape, dtype=np.dtype(record["dtype"].decode()), buffer=self._chunks[chunk], offset=int(record["offset"])
+        )
+
+    def metadata(self, i: int) -> dict:
+        """Returns the index record of frame ``i`` as a dict."""
+
+        record = self.index[i]
+        return {
+            "timestamp": float(record["timestamp"]),
+            "hw_timestamp": int(record["hw_timestamp"]),
+            "rig": self.names[int(record["rig"])],
+            "camera_config": self.names[int(record["camera_config"])],
+            "light_config": self.names[int(record["light_config"])],
+        }
+
+    def sidecar(self, i: int) -> dict:
+        """Returns the sidecar metadata of frame ``i``, or an empty dict if none was stored."""
+
+        if self._sidecars is None:
+            self._sidecars = {}
+            path = os.path.join(self.session_dir, "sidecar.jsonl")
+            if os.path.exists(path):
+                with open(path) as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        self._sidecars[entry.pop("index")] = entry
+        return self._sidecars.get(i, {})
@@ -0,0 +1,142 @@
+'''
+Camera fault recovery on a dedicated supervisor thread.
+
+pylon reports a lost camera through a device-removal callback, and failed grabs or
+node writes report it through ``request``. Either way the supervisor reopens the camera
+from its cached identity (no enumeration), restores the node values that were in
+effect and retries with exponential backoff until the camera is back.
+
+Fault injection against the emulated camera:
+    PYLON_CAMEMU=1 python3 -m pytest tests/test_recovery.py
+'''
+
+import threading, time, logging
+
+from pypylon import pylon
+
+from metrics import CAMERA_RECOVERIES, CAMERA_RECOVERY_SECONDS
+
+
+class _RemovalHandler(pylon.ConfigurationEventHandler):
+    def __init__(self, supervisor) -> None:
+        super().__init__()
+        self.supervisor = supervisor
+
+    def OnCameraDeviceRemoved(self, camera) -> None:
+        # Runs on a pylon thread, only hand over to the supervisor
+        self.supervisor.request("device removed")
+
+
+class RecoverySupervisor:
+    """
+    Reconnects a CameraControl's camera after a fault.
+
+    Only the supervisor thread replaces the camera, and it does so under ``camera_mutex``,
+    so a capture on another thread sees either the old or the new camera, never a half
+    opened one. Requests made while a recovery is running are folded into it.
+
+    Args:
+        camera_control: CameraControl whose ``_reopen`` replaces the camera.
+        initial_backoff (float): Seconds before the second attempt.
+        max_backoff (float): Upper bound of the doubling delay between attempts.
+    """
+
+    def __init__(self, camera_control, initial_backoff: float = 0.25, max_backoff: float = 30.0) -> None:
+        self.camera_control = camera_control
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.logger = logging.getLogger(__name__)
+
+        self._handler = _RemovalHandler(self)
+        self._condition = threading.Condition()
+        self._pending = None  # (reason, time.monotonic() of the fault)
+        self._recovered = threading.Event()
+        self._recovered.set()
+        self._stopping = threading.Event()
+
+        self.recoveries = 0
+        self.failed_attempts = 0
+        self.last_reason = None
+        self.last_recovery_time = None
+        self.max_recovery_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="RecoverySupervisor", daemon=True)
+        self._thread.start()
+
+    @property
+    def recovering(self) -> bool:
+        return not self._recovered.is_set()
+
+    def watch(self, camera) -> None:
+        """Registers the removal callback on a camera; call before ``Open``."""
+        camera.RegisterConfiguration(self._handler, pylon.RegistrationMode_Append, pylon.Cleanup_None)
+
+    def request(self, reason: str) -> None:
+        """Starts a recovery unless one is already pending or running. Never blocks."""
+
+        with self._condition:
+            if self._pending is not None or self._stopping.is_set():
+                return
+            self._pending = (reason, time.monotonic())
+            self._recovered.clear()
+            self._condition.notify()
+        self.logger.warning(f"Camera recovery requested: {reason}")
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until no recovery is pending. Returns False on timeout."""
+        return self._recovered.wait(timeout)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify()
+        self._thread.join()
+        self._recovered.set()  # nothing will recover any more, release waiters
+
+    def stats(self) -> dict:
+        return {
+            "recovering": self.recovering,
+            "recoveries": self.recoveries,
+            "failed_attempts": self.failed_attempts,
+            "last_reason": self.last_reason,
+            "last_recovery_ms": None if self.last_recovery_time is None else round(self.last_recovery_time * 1000, 1),
+            "max_recovery_ms": round(self.max_recovery_time * 1000, 1),
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping.is_set():
+                    self._condition.wait()
+                if self._stopping.is_set():
+                    return
+                reason, since = self._pending
+
+            delay = self.initial_backoff
+            attempt = 0
+            while not self._stopping.is_set():
+                attempt += 1
+                try:
+                    self.camera_control._reopen()
+                    break
+                except Exception as e:
+                    self.failed_attempts += 1
+                    self.logger.error(f"Recovery attempt {attempt} failed ({e}), retrying in {delay:.2f} s")
+                    self._stopping.wait(delay)
+                    delay = min(delay * 2, self.max_backoff)
+            else:
+                return
+
+            elapsed = time.monotonic() - since
+            self.recoveries += 1
+            self.last_reason = reason
+            self.last_recovery_time = elapsed
+            self.max_recovery_time = max(self.max_recovery_time, elapsed)
+            rig = getattr(self.camera_control, "rig", "NA")
+            CAMERA_RECOVERIES.labels(rig).inc()
+            CAMERA_RECOVERY_SECONDS.labels(rig).observe(elapsed)
+            with self._condition:
+                self._pending = None
+                self._recovered.set()
+            self.logger.info(f"Camera recovered from '{reason}' in {elapsed * 1000:.0f} ms ({attempt} attempt(s)).")
+
@@ -0,0 +1,253 @@
+'''
+Deadline-based job scheduler for periodic captures.
+
+Deadlines are absolute points on the monotonic clock, so capture and save time
+never accumulate into drift. With ``align`` the first deadline falls on a multiple
+of the interval in wall-clock time, which puts every rig (on NTP-synced hosts)
+on the same instant.
+
+Jitter check without a camera:
+    python3 -m Camera.scheduler --seconds 10
+'''
+
+import argparse, heapq, itertools, math, threading, time, logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+MISSED_POLICIES = ("skip", "catch_up")
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    missed: int = 0       # slots skipped because the job was still running or the loop was late
+    caught_up: int = 0    # late runs made up for under the catch_up policy
+    failures: int = 0
+    jitter_sum: float = 0.0
+    jitter_sq_sum: float = 0.0
+    jitter_max: float = 0.0
+    duration_max: float = 0.0
+
+    def record(self, jitter: float, duration: float) -> None:
+        self.runs += 1
+        self.jitter_sum += jitter
+        self.jitter_sq_sum += jitter * jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.duration_max = max(self.duration_max, duration)
+
+    def summary(self) -> dict:
+        on_time = self.runs - self.caught_up
+        mean = self.jitter_sum / on_time if on_time else 0.0
+        variance = self.jitter_sq_sum / on_time - mean * mean if on_time else 0.0
+        return {
+            "runs": self.runs,
+            "missed": self.missed,
+            "caught_up": self.caught_up,
+            "failures": self.failures,
+            "jitter_mean_ms": 1000 * mean,
+            "jitter_std_ms": 1000 * math.sqrt(max(variance, 0.0)),
+            "jitter_max_ms": 1000 * self.jitter_max,
+            "duration_max_s": self.duration_max,
+        }
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    interval: float
+    action: Callable[[], None]
+    policy: str = "skip"
+    deadline: float = 0.0  # monotonic
+    stats: JobStats = field(default_factory=JobStats)
+    running: bool = False
+    backlog: int = 0
+
+
+class DeadlineScheduler:
+    """
+    Runs any number of periodic jobs against absolute monotonic deadlines.
+
+    One scheduler thread sleeps until the earliest deadline and hands the due job to
+    a worker pool, so a slow or failing job (e.g. a camera reconnect) never delays the
+    other jobs or shifts its own later slots. A slot that comes up while the job is
+    still running is handled by the job's missed-slot policy:
+
+        skip        drop the slot and continue with the next one on the grid
+        catch_up    run once more as soon as the current run finishes, per missed slot
+
+    Args:
+        workers (int): Worker threads, i.e. how many jobs can run at the same time.
+        report_every (int): Log jitter statistics of a job after this many runs (0 = never).
+    """
+
+    def __init__(self, workers: int = 4, report_every: int = 10) -> None:
+        self.report_every = report_every
+        self.logger = logging.getLogger(__name__)
+
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Job")
+        self._thread = None
+        self._stopping = False
+
+    def add_job(self, name: str, interval: float, action: Callable[[], None], policy: str = "skip",
+                align: bool = True, offset: float = 0.0) -> ScheduledJob:
+        """
+        Registers (or replaces) a periodic job.
+
+        Args:
+            name (str): Unique job name, used in logs and ``stats``.
+            interval (float): Seconds between deadlines.
+            action: Called without arguments on a worker thread.
+            policy (str): Missed-slot policy, "skip" or "catch_up".
+            align (bool): Put deadlines on wall-clock multiples of ``interval`` (plus
+                ``offset``); otherwise the first run is immediate.
+            offset (float): Seconds after each aligned multiple.
+
+        Raises:
+            ValueError: For a non-positive interval or an unknown policy.
+        """
+
+        if interval <= 0:
+            raise ValueError(f"Interval of job '{name}' must be positive")
+        if policy not in MISSED_POLICIES:
+            raise ValueError(f"Invalid missed-slot policy '{policy}', must be one of {', '.join(MISSED_POLICIES)}")
+
+        now = time.monotonic()
+        if align:
+            wall = time.time()
+            target = (math.floor((wall - offset) / interval) + 1) * interval + offset
+            deadline = now + (target - wall)
+        else:
+            deadline = now
+
+        job = ScheduledJob(name, interval, action, policy, deadline)
+        with self._cond:
+            self._jobs[name] = job  # a replaced job's heap entry is dropped when it comes up
+            heapq.heappush(self._heap, (deadline, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def remove_job(self, name: str) -> None:
+        with self._cond:
+            self._jobs.pop(name, None)
+
+    def jobs(self) -> list:
+        with self._cond:
+            return list(self._jobs)
+
+    def start(self) -> None:
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name="Scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {name: job.stats.summary() for name, job in self._jobs.items()}
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._heap:
+                        timeout = self._heap[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+
+                deadline, _, job = heapq.heappop(self._heap)
+                if self._jobs.get(job.name) is not job:
+                    continue  # removed or replaced
+                self._dispatch(job, deadline)
+
+    def _dispatch(self, job: ScheduledJob, deadline: float) -> None:
+        # Called with the condition held
+        now = time.monotonic()
+        late = int((now - deadline) // job.interval)  # whole slots already passed as well
+
+        if job.running:
+            missed = 1 + late
+        else:
+            missed = late
+            job.running = True
+            self._pool.submit(self._run, job, deadline)
+
+        if missed:
+            if job.policy == "catch_up":
+                job.backlog += missed
+            else:
+                job.stats.missed += missed
+                self.logger.warning(f"Job {job.name} missed {missed} slot(s)")
+
+        # Next slot on the fixed grid, never relative to when this one actually ran
+        job.deadline = deadline + (1 + late) * job.interval
+        heapq.heappush(self._heap, (job.deadline, next(self._seq), job))
+
+    def _run(self, job: ScheduledJob, deadline: Optional[float]) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                job.action()
+            except Exception as e:
+                job.stats.failures += 1
+                self.logger.error(f"Job {job.name} failed: {e}")
+            finished = time.monotonic()
+
+            with self._cond:
+                if deadline is None:
+                    job.stats.caught_up += 1
+                    job.stats.record(0.0, finished - started)
+                else:
+                    job.stats.record(started - deadline, finished - started)
+
+                if self.report_every and job.stats.runs % self.report_every == 0:
+                    s = job.stats.summary()
+                    self.logger.info(
+                        f"Job {job.name}: {s['runs']} runs, jitter mean {s['jitter_mean_ms']:.2f} ms, "
+                        f"std {s['jitter_std_ms']:.2f} ms, max {s['jitter_max_ms']:.2f} ms, {s['missed']} missed"
+                    )
+
+                if job.backlog and not self._stopping:
+                    job.backlog -= 1
+                    deadline = None  # catch-up run, not measured against a slot
+                    continue
+                job.running = False
+                return
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("Deadline scheduler jitter check")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    scheduler = DeadlineScheduler(report_every=0)
+    scheduler.add_job("fast", 0.1, lambda: time.sleep(0.03))
+    scheduler.add_job("slow", 0.5, lambda: time.sleep(0.7), policy="skip")
+    scheduler.add_job("backlog", 0.5, lambda: time.sleep(0.7), policy="catch_up")
+    scheduler.start()
+    time.sleep(args.seconds)
+    scheduler.stop()
+
+    for name, stats in scheduler.stats().items():
+        print(
+            f"{name:8} {stats['runs']:4} runs, jitter mean {stats['jitter_mean_ms']:6.2f} ms, "
+            f"max {stats['jitter_max_ms']:6.2f} ms, {stats['missed']} missed, {stats['caught_up']} caught up"
+        )
@@ -0,0 +1,224 @@
+import time, logging
+
+from Camera.node_writer import STREAM_NODES, AUTO_NODES
+from Camera.strobe import StrobeController
+
+
+class CaptureSequencer:
+    """
+    Runs a list of (camera config, light config) captures while touching as little hardware as possible.
+
+    Only the GenICam nodes that differ from the camera's values (as cached by the
+    CameraControl's NodeWriter, which sees every write) and the light channels that
+    change are written, pairs can be reordered so stream-stopping changes (ROI,
+    pixel format) happen least often, and the light settle wait is measured from
+    probe frames instead of a fixed sleep. Light configs marked ``strobe`` arm the SBC
+    to light up only during exposure (gated by the camera's line output), which
+    needs no settle wait at all.
+
+    Args:
+        camera_control: An opened CameraControl.
+        config (CompiledConfig): Compiled config.yaml from ``load_config``.
+        sbc: Optional connected SBC used to set the lights. If its ``update_settings``
+            returns a future (BlockingSBC), the acknowledgement is awaited before settling.
+        settle_tolerance (float): Relative change in mean brightness between two probe
+            frames below which the lights count as settled.
+        settle_timeout (float): Upper bound in seconds for the settle measurement.
+        naive (bool): Push every node and light value for each pair and wait a fixed
+            second, for comparing against the optimised sequence.
+        tuner: Optional ExposureTuner that sets exposure, gain and light levels from
+            probe frames before each capture instead of the camera's auto functions.
+    """
+
+    def __init__(self, camera_control, config, sbc=None, settle_tolerance=0.02, settle_timeout=3.0, naive=False, tuner=None) -> None:
+        self.camera_control = camera_control
+        self.config = config
+        self.sbc = sbc
+        self.settle_tolerance = settle_tolerance
+        self.settle_timeout = settle_timeout
+        self.naive = naive
+        self.tuner = tuner
+        self.logger = logging.getLogger(__name__)
+
+        self.light_state = {}
+
+        rig = getattr(camera_control, "rig", None)
+        self.strobe = None
+        if rig in config.strobe_plans:
+            self.strobe = StrobeController(camera_control, config.strobe_plan(rig), sbc)
+
+    def order(self, pairs: list) -> list:
+        """
+        Reorders pairs to minimise reconfiguration cost, keeping the given order within ties.
+
+        Pairs are grouped by their stream-stopping node values (the group matching the
+        camera's current state first), then by light config so settle waits are shared,
+        then by camera config.
+        """
+
+        def first_seen(keys):
+            seen = {}
+            for key in keys:
+                seen.setdefault(key, len(seen))
+            return seen
+
+        plans = [dict(self.config.camera_plan(cam)) for cam, _ in pairs]
+        signatures = [tuple(plan.get(node) for node in STREAM_NODES) for plan in plans]
+        state = self.camera_control.node_writer.snapshot()
+        current = tuple(state.get(node) for node in STREAM_NODES)
+
+        signature_rank = first_seen(signatures)
+        light_rank = first_seen(light for _, light in pairs)
+        camera_rank = first_seen(cam for cam, _ in pairs)
+
+        indices = sorted(
+            range(len(pairs)),
+            key=lambda i: (
+                -1 if signatures[i] == current else signature_rank[signatures[i]],
+                light_rank[pairs[i][1]],
+                camera_rank[pairs[i][0]],
+            ),
+        )
+        return [pairs[i] for i in indices]
+
+    def run(self, pairs: list, allow_reorder: bool = True) -> dict:
+        """
+        Captures one image per (camera config, light config) pair.
+
+        Returns:
+            dict: Wall time, wall clock time of the first frame, and counts of node
+            writes, skipped writes, stream stops, light writes and total settle time.
+        """
+
+        if self.strobe is None:
+            for _, light_name in pairs:
+                if self.config.is_strobe(light_name):
+                    raise ValueError(f"Light config '{light_name}' is a strobe config, but the rig has no strobe output")
+
+        if allow_reorder and not self.naive:
+            pairs = self.order(pairs)
+
+        report = {
+            "order": pairs,
+            "node_writes": 0,
+            "node_writes_skipped": 0,
+            "stream_stops": 0,
+            "light_writes": 0,
+            "settle_time": 0.0,
+            "strobe_arms": 0,
+            "quality_retries": 0,
+            "quality_rejects": 0,
+            "stream_resends": 0,
+            "stream_failed_buffers": 0,
+            "tune_frames": 0,
+            "tune_time": 0.0,
+            "first_frame_at": None,
+        }
+        start = time.monotonic()
+        retries, rejects = self.camera_control.quality_retries, self.camera_control.quality_rejects
+        stream_stops = self.camera_control.stream_stops
+        resends, failed_buffers = self.camera_control.stream_resends, self.camera_control.stream_failed_buffers
+
+        for cam_name, light_name in pairs:
+            # Send the light change first so the SBC works while the camera is reconfigured
+            lights = self.config.light_config(light_name)
+            strobe = self.config.is_strobe(light_name)
+            ack = None
+            if strobe:
+                changed = {}
+                ack = self.strobe.arm(lights)
+                if ack is not None:
+                    report["strobe_arms"] += 1
+                    self.light_state = {}  # dark between exposures
+            else:
+                if self.strobe is not None and self.strobe.armed is not None:
+                    # A steady "set" disarms the strobe on the SBC; the LEDs start from dark
+                    self.strobe.armed = None
+                    self.light_state = {}
+                changed = dict(lights) if self.naive else {k: v for k, v in lights.items() if self.light_state.get(k) != v}
+                if changed and self.sbc is not None:
+                    ack = self.sbc.update_settings(changed)
+
+            # The full plan, the NodeWriter skips what the camera already holds
+            plan = self.config.camera_plan(cam_name)
+            written = self.camera_control.write_nodes(plan, force=self.naive)
+            report["node_writes"] += written
+            report["node_writes_skipped"] += len(plan) - written
+
+            if strobe and ack is not None:
+                ack.result()  # armed before the exposure starts, nothing to settle
+            elif changed and self.sbc is not None:
+                if ack is not None:
+                    ack.result()  # blocks until the SBC acknowledged the new levels
+                self.light_state.update(changed)
+                report["light_writes"] += len(changed)
+
+                if self.naive:
+                    time.sleep(1.0)
+                    report["settle_time"] += 1.0
+                else:
+                    report["settle_time"] += self.measure_settle()
+
+            if self.tuner is not None:
+                result = self.tuner.tune(cam_name, light_name, tune_lights=not strobe)
+                if result.lights:
+                    self.light_state.update(result.lights)
+                report["tune_frames"] += result.frames
+                report["tune_time"] += result.elapsed_ms / 1000
+
+            self.camera_control.camera_config_name = cam_name
+            self.camera_control.light_config_name = light_name
+            self.camera_control.snap_pic(user=False)
+            if report["first_frame_at"] is None:
+                report["first_frame_at"] = time.time()  # wall clock, comparable across processes
+            self.logger.info(f"Captured [{cam_name}] [{light_name}]")
+
+        if self.strobe is not None:
+            ack = self.strobe.disarm()
+            if ack is not None:
+                ack.result()
+
+        report["stream_stops"] = self.camera_control.stream_stops - stream_stops
+        report["quality_retries"] = self.camera_control.quality_retries - retries
+        report["quality_rejects"] = self.camera_control.quality_rejects - rejects
+        report["stream_resends"] = self.camera_control.stream_resends - resends
+        report["stream_failed_buffers"] = self.camera_control.stream_failed_buffers - failed_buffers
+        report["wall_time"] = time.monotonic() - start
+        return report
+
+    def measure_settle(self) -> float:
+        """
+        Grabs probe frames until the mean brightness stops changing.
+
+        Exposure and gain auto functions are switched off meanwhile, they would
+        compensate for the very light change being measured.
+
+        Returns:
+            float: Seconds until two consecutive probes agreed within ``settle_tolerance``.
+        """
+
+        state = self.camera_control.node_writer.snapshot()
+        autos = [(node, state[node]) for node in AUTO_NODES if state.get(node) not in (None, "Off")]
+        if autos:
+            self.camera_control.write_nodes([(node, "Off") for node, _ in autos])
+
+        start = time.monotonic()
+        previous = None
+
+        try:
+            while True:
+                frame = self.camera_control.grab_frame()
+                elapsed = time.monotonic() - start
+
+                if frame is not None:
+                    mean = float(frame[::16, ::16].mean())  # sparse sample is plenty for a brightness level
+                    if previous is not None and abs(mean - previous) <= self.settle_tolerance * max(previous, 1.0):
+                        return elapsed
+                    previous = mean
+
+                if elapsed > self.settle_timeout:
+                    self.logger.warning(f"Lights did not settle within {self.settle_timeout} s")
+                    return elapsed
+        finally:
+            if autos:
+                self.camera_control.write_nodes(autos)
@@ -0,0 +1,60 @@
+import logging
+
+
+class StrobeController:
+    """
+    Hardware-synchronised strobe: the camera's line output gates the LEDs on the SBC.
+
+    The camera drives a line (by default Line2 with LineSource=ExposureActive) that is
+    wired to the SBC's strobe input. Once armed with a set of levels, the ESP32 keeps
+    the LEDs off and switches them to those levels only while the line is active, so
+    light is only produced during exposure and no settle wait is needed.
+
+    Args:
+        camera_control: The CameraControl whose line output is configured.
+        plan: Line output node writes, see ``CompiledConfig.strobe_plan``.
+        sbc: Connected SBC (BlockingSBC or FleetBoard) that receives the arm/disarm commands.
+    """
+
+    def __init__(self, camera_control, plan, sbc=None) -> None:
+        self.camera_control = camera_control
+        self.plan = tuple(plan)
+        self.sbc = sbc
+        self.logger = logging.getLogger(__name__)
+
+        self._configured_camera = None
+        self.armed = None  # levels the SBC is armed with, None when disarmed
+
+    def configure_output(self) -> None:
+        """Routes the exposure signal to the strobe line, again after a reconnect."""
+
+        camera = self.camera_control.camera
+        if self._configured_camera is camera:
+            return
+        # Forced: LineMode/LineSource belong to whichever line is selected, the cache can't tell
+        self.camera_control.write_nodes(self.plan, force=True)
+        self._configured_camera = camera
+        self.logger.info(f"Strobe output configured: {dict(self.plan)}")
+
+    def arm(self, levels: dict):
+        """
+        Arms the SBC with ``levels`` for the next exposures.
+
+        Returns:
+            The SBC's pending acknowledgement, or None if nothing had to be sent.
+        """
+
+        self.configure_output()
+        levels = dict(levels)
+        if levels == self.armed or self.sbc is None:
+            return None
+        self.armed = levels
+        return self.sbc.request({"type": "strobe", "arm": True, "set": levels})
+
+    def disarm(self):
+        """Turns the strobe off on the SBC, the LEDs stay dark afterwards."""
+
+        if self.armed is None or self.sbc is None:
+            return None
+        self.armed = None
+        return self.sbc.request({"type": "strobe", "arm": False})
@@ -0,0 +1,248 @@
+import asyncio
+import threading
+import itertools
+import logging
+from typing import Optional, Callable
+
+from SBC.framing import codec_functions, HEADER, DEFAULT_MAX_FRAME_SIZE, hello_message, accept_hello
+from metrics import SBC_REQUEST_SECONDS
+
+MAX_FRAME_SIZE = DEFAULT_MAX_FRAME_SIZE
+
+
+def encode_frame(payload: dict, codec: str = "json") -> tuple:
+    """Returns (header, body); pass both to ``writer.writelines`` so they are not concatenated."""
+
+    body = codec_functions(codec)[0](payload)
+    return HEADER.pack(len(body)), body
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: int = MAX_FRAME_SIZE, codec: str = "json") -> Optional[dict]:
+    """
+    Reads one 4-byte length-prefixed frame.
+
+    Returns:
+        dict: The decoded message, or None for a frame that had to be dropped.
+
+    Raises:
+        asyncio.IncompleteReadError: If the connection closed.
+    """
+
+    header = await reader.readexactly(HEADER.size)
+    length = HEADER.unpack(header)[0]
+    if length <= 0 or length > max_size:
+        # The stream is out of sync, nothing after this can be trusted
+        raise ConnectionError(f"Invalid message length: {length}")
+
+    body = await reader.readexactly(length)
+    try:
+        return codec_functions(codec)[1](memoryview(body))
+    except Exception:
+        return None
+
+
+class AsyncSBC:
+    """
+    asyncio client for the ESP32 light controller with pipelined, acknowledged requests.
+
+    Every request carries an ``id`` that the ESP32 echoes in its reply, so several
+    commands can be in flight at once and each caller awaits exactly its own
+    acknowledgement. Timeouts and retries are per request.
+
+    Args:
+        ip (str): Address of the SBC.
+        port (int): TCP port of the SBC.
+        timeout (float): Default seconds to wait for a reply.
+        retries (int): Default number of resends after a timeout.
+        name (str): Name used in log messages.
+        max_frame_size (int): Largest accepted reply in bytes.
+        codec (str): Preferred payload codec, negotiated with the ESP32 on connect (JSON if unsupported).
+    """
+
+    def __init__(self, ip, port, timeout=2.0, retries=2, name="NA", max_frame_size=MAX_FRAME_SIZE, codec="json") -> None:
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.name = name
+        self.max_frame_size = max_frame_size
+        self.preferred_codec = codec
+        self.codec = "json"
+        self.logger = logging.getLogger(__name__)
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._message_callback: Optional[Callable[[dict], None]] = None
+        self.last_seen = 0.0  # loop time of the last frame received from the board
+        self._request_seconds = SBC_REQUEST_SECONDS.labels(name)
+
+    def is_connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def set_message_callback(self, callback: Callable[[dict], None]) -> None:
+        """Receives messages that are not replies to a request (e.g. telemetry)."""
+        self._message_callback = callback
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.ip, self.port), self.timeout
+        )
+        self.codec = "json"
+        if self.preferred_codec != "json":
+            await self._negotiate()
+        self._reader_task = asyncio.create_task(self._receive_loop())
+        self.logger.info(f"Connected to {self.name}: {self.ip}:{self.port} ({self.codec})")
+
+    async def _negotiate(self) -> None:
+        # Runs before the receive loop, so the reply can be read directly
+        self._writer.writelines(encode_frame(hello_message([self.preferred_codec, "json"])))
+        await self._writer.drain()
+        try:
+            reply = await asyncio.wait_for(read_frame(self._reader, self.max_frame_size), self.timeout)
+        except asyncio.TimeoutError:
+            reply = None
+        self.codec = accept_hello(reply)
+        if self.codec != self.preferred_codec:
+            self.logger.warning(f"{self.name} does not support {self.preferred_codec}, using {self.codec}")
+
+    async def wait_disconnected(self) -> None:
+        """Returns once the connection has been lost or closed."""
+        if self._reader_task is not None:
+            await asyncio.wait([self._reader_task])
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+        self._fail_pending(ConnectionError(f"Connection to {self.name} closed"))
+
+    async def request(self, payload: dict, timeout: float = None, retries: int = None) -> dict:
+        """
+        Sends ``payload`` and waits for the reply carrying the same id.
+
+        Raises:
+            ConnectionError: If not connected or the link drops while waiting.
+            TimeoutError: If no reply arrived after all retries.
+        """
+
+        if not self.is_connected():
+            raise ConnectionError(f"Not connected to {self.name}")
+
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+
+        request_id = next(self._ids)
+        message = dict(payload, id=request_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[request_id] = future
+        start = loop.time()
+
+        try:
+            for attempt in range(retries + 1):
+                self._writer.writelines(encode_frame(message, self.codec))
+                await self._writer.drain()
+                try:
+                    # shield: a timed out attempt must not cancel the shared future
+                    reply = await asyncio.wait_for(asyncio.shield(future), timeout)
+                    self._request_seconds.observe(loop.time() - start)
+                    return reply
+                except asyncio.TimeoutError:
+                    self.logger.warning(
+                        f"No reply from {self.name} to request {request_id} (attempt {attempt + 1}/{retries + 1})"
+                    )
+            raise TimeoutError(f"{self.name} did not acknowledge request {request_id}")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def update_settings(self, settings: dict, timeout: float = None, retries: int = None) -> dict:
+        """Sets light levels and returns the ESP32's acknowledgement."""
+        return await self.request({"type": "set", "set": settings}, timeout, retries)
+
+    async def ping(self, timeout: float = None) -> float:
+        """Returns the round-trip time of a heartbeat in seconds."""
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await self.request({"type": "ping"}, timeout, retries=0)
+        return loop.time() - start
+
+    async def _receive_loop(self) -> None:
+        try:
+            while True:
+                message = await read_frame(self._reader, self.max_frame_size, self.codec)
+                self.last_seen = asyncio.get_running_loop().time()
+                if message is None:
+                    self.logger.warning(f"Malformed frame from {self.name} dropped")
+                    continue
+
+                if "id" in message:
+                    future = self._pending.get(message["id"])
+                    if future is not None and not future.done():
+                        future.set_result(message)
+                    # else: late duplicate of a retried request
+                elif self._message_callback is not None:
+                    self._message_callback(message)
+
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self.logger.warning(f"Connection to {self.name} lost: {e}")
+            if self._writer is not None:
+                self._writer.close()
+            self._fail_pending(ConnectionError(f"Connection to {self.name} lost"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+class BlockingSBC:
+    """
+    Thread-safe facade over AsyncSBC for synchronous code such as capture.py.
+
+    Runs the client on a private event loop thread. ``update_settings`` returns a
+    ``concurrent.futures.Future`` immediately, so callers can overlap other work and
+    call ``.result()`` when they need the acknowledgement.
+    """
+
+    def __init__(self, ip, port, timeout=2.0, retries=2, name="NA", max_frame_size=MAX_FRAME_SIZE, codec="json") -> None:
+        self.client = AsyncSBC(ip, port, timeout=timeout, retries=retries, name=name, max_frame_size=max_frame_size, codec=codec)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f"SBC-{name}", daemon=True)
+        self._thread.start()
+
+    def connect(self) -> None:
+        self._submit(self.client.connect()).result()
+
+    def disconnect(self) -> None:
+        self._submit(self.client.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def is_connected(self) -> bool:
+        return self.client.is_connected()
+
+    def request(self, payload: dict, timeout: float = None, retries: int = None):
+        return self._submit(self.client.request(payload, timeout, retries))
+
+    def update_settings(self, settings: dict, timeout: float = None, retries: int = None):
+        return self._submit(self.client.update_settings(settings, timeout, retries))
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
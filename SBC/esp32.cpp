@@ -15,6 +15,17 @@ const int pwm01 = 5;
 const int pwm02 = 10;
 const int pwm03 = 11;
 
+// Strobe input, wired to the camera's line output (ExposureActive)
+const int strobe_in = 4;
+volatile bool strobeArmed = false;
+volatile bool strobeEdge = false; // set by the ISR, the LEDs are switched in loop()
+volatile uint8_t strobeDuty[4] = {0, 0, 0, 0}; // index = light channel
+
+// Framing
+const uint32_t max_frame_size = 1024;
+uint8_t frameBuffer[max_frame_size];
+bool useMsgPack = false; // negotiated per connection with a "hello" message
+
 // Define log_level
 constant int log_level = 0; // 0: None, 1: Error, 2: Warning, 3: Info, 4: Debug/Verbose
 
@@ -33,20 +44,31 @@ void setup() {
   ledcWrite(pwm01, 0);
   ledcWrite(pwm02, 0);
   ledcWrite(pwm03, 0);
+
+  pinMode(strobe_in, INPUT);
 }
 
 void loop() {
+  applyStrobe();
+
   if (!client || !client.connected()) {
     client = server.available();
+    useMsgPack = false; // every connection starts in JSON
     return;
   }
 
   if (client.available() >= 4) {
     uint32_t length = readLength();
-    String jsonString = readPayload(length);
+    if (length == 0 || length > max_frame_size) {
+      // Out of sync, drop the connection and let the host reconnect
+      client.stop();
+      return;
+    }
+    readPayload(frameBuffer, length);
 
     StaticJsonDocument<512> doc;
-    DeserializationError error = deserializeJson(doc, jsonString);
+    DeserializationError error = useMsgPack ? deserializeMsgPack(doc, frameBuffer, length)
+                                            : deserializeJson(doc, frameBuffer, length);
 
     if (!error) {
       handleMessage(doc);
@@ -63,61 +85,160 @@ uint32_t readLength() {
          (header[3]);
 }
 
-String readPayload(uint32_t length) {
-  String payload = "";
-  while (payload.length() < length) {
-    if (client.available()) {
-      payload += (char)client.read();
+void readPayload(uint8_t* buffer, uint32_t length) {
+  uint32_t received = 0;
+  while (received < length) {
+    applyStrobe(); // a frame can trickle in over several packets, don't hold up the LEDs
+    int count = client.read(buffer + received, length - received);
+    if (count > 0) {
+      received += count;
     }
   }
-  return payload;
 }
 
 void sendJson(JsonDocument& doc) {
-  String output;
-  serializeJson(doc, output);
-
-  uint32_t length = output.length();
-  uint8_t header[4] = {
-    (length >> 24) & 0xFF,
-    (length >> 16) & 0xFF,
-    (length >> 8) & 0xFF,
-    length & 0xFF
-  };
-
-  client.write(header, 4);
-  client.print(output);
+  // Serialize after the 4 byte header in the shared buffer and send both in one write
+  size_t length = useMsgPack ? serializeMsgPack(doc, frameBuffer + 4, max_frame_size - 4)
+                             : serializeJson(doc, (char*)frameBuffer + 4, max_frame_size - 4);
+
+  frameBuffer[0] = (length >> 24) & 0xFF;
+  frameBuffer[1] = (length >> 16) & 0xFF;
+  frameBuffer[2] = (length >> 8) & 0xFF;
+  frameBuffer[3] = length & 0xFF;
+
+  client.write(frameBuffer, length + 4);
 }
 
 void handleMessage(JsonDocument& doc) {
   const char* type = doc["type"];
+  if (type == nullptr) {
+    return;
+  }
+
+  StaticJsonDocument<256> reply;
+  // Echo the request id so the host can match replies to pipelined requests
+  if (doc.containsKey("id")) {
+    reply["id"] = doc["id"];
+  }
+
+  if (strcmp(type, "hello") == 0) {
+    // Codec negotiation, the reply still goes out in JSON
+    bool offered = false;
+    for (JsonVariant codec : doc["codecs"].as<JsonArray>()) {
+      if (strcmp(codec.as<const char*>(), "msgpack") == 0) {offered = true;}
+    }
+    reply["type"] = "hello";
+    reply["codec"] = offered ? "msgpack" : "json";
+    useMsgPack = false;
+    sendJson(reply);
+    useMsgPack = offered;
+    return;
+  }
 
   if (strcmp(type, "ping") == 0) {
-    StaticJsonDocument<128> reply;
     reply["type"] = "pong";
     sendJson(reply);
     return;
   }
 
-  if (type == "set") {
-    const char* cmd = doc["set"];
+  if (strcmp(type, "strobe") == 0) {
+    if (doc["arm"].as<bool>()) {
+      // Lights stay dark and follow the exposure signal with the given levels
+      for (int channel = 1; channel <= 3; channel++) {strobeDuty[channel] = 0;}
+      JsonObject settings = doc["set"];
+      for (JsonPair kv : settings) {
+        int channel = lightChannel(kv.key().c_str());
+        if (channel > 0) {
+          strobeDuty[channel] = (uint8_t)(kv.value().as<float>() * 255);
+        }
+      }
+      armStrobe();
+    } else {
+      disarmStrobe();
+    }
+
+    reply["type"] = "ack";
+    reply["status"] = "ok";
+    reply["armed"] = strobeArmed;
+    sendJson(reply);
+    return;
+  }
+
+  if (strcmp(type, "set") == 0) {
+    // Steady light, ends strobe mode
+    disarmStrobe();
+    JsonObject settings = doc["set"];
+    for (JsonPair kv : settings) {
+      int channel = lightChannel(kv.key().c_str());
+      if (channel > 0) {
+        setPWM(channel, (uint8_t)(kv.value().as<float>() * 255));
+      }
+    }
 
-    StaticJsonDocument<128> reply;
-    reply["status"] = "set: " + String(cmd) + " -> " + String(cmd["value"]);
+    reply["type"] = "ack";
+    reply["status"] = "ok";
     sendJson(reply);
+    return;
   }
-    if (type == "get") {
-    const char* cmd = doc["get"];
+
+  if (strcmp(type, "get") == 0) {
+    reply["type"] = "state";
+    sendJson(reply);
+    return;
   }
 
+  reply["type"] = "error";
+  reply["status"] = "unknown type";
+  sendJson(reply);
 }
 
-void setPWM(uint8_t, uint8_t dutyCycle) {
+int lightChannel(const char* name) {
+  if (strcmp(name, "light_1") == 0) {return 1;}
+  if (strcmp(name, "light_2") == 0) {return 2;}
+  return 0;
+}
+
+void setPWM(uint8_t pin, uint8_t dutyCycle) {
   if (pin == 1) {ledcWrite(pwm01, dutyCycle);}
   else if (pin == 2) {ledcWrite(pwm02, dutyCycle);}
   else if (pin == 3) {ledcWrite(pwm03, dutyCycle);}
 }
 
+void IRAM_ATTR onStrobeEdge() {
+  // ledcWrite is neither IRAM resident nor ISR safe, so only flag the edge for loop()
+  strobeEdge = true;
+}
+
+void applyStrobe() {
+  if (!strobeEdge) {
+    return;
+  }
+  strobeEdge = false;
+  // Exposure active -> armed levels, otherwise dark. The pin is read here, not in the
+  // ISR, so edges that came in while loop() was busy still end in the current state
+  bool active = strobeArmed && digitalRead(strobe_in) == HIGH;
+  for (int channel = 1; channel <= 3; channel++) {
+    setPWM(channel, active ? strobeDuty[channel] : 0);
+  }
+}
+
+void armStrobe() {
+  pwmOff();
+  strobeArmed = true;
+  attachInterrupt(digitalPinToInterrupt(strobe_in), onStrobeEdge, CHANGE);
+  strobeEdge = true; // pick up an exposure that is already running
+}
+
+void disarmStrobe() {
+  if (!strobeArmed) {
+    return;
+  }
+  detachInterrupt(digitalPinToInterrupt(strobe_in));
+  strobeArmed = false;
+  strobeEdge = false;
+  pwmOff();
+}
+
 void pwmOff() {
   ledcWrite(pwm01, 0);
   ledcWrite(pwm02, 0);
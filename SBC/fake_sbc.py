@@ -0,0 +1,141 @@
+'''
+Local stand-in for the ESP32 light controller.
+
+Speaks the same 4-byte length-prefixed framing (JSON, or MessagePack/CBOR after a
+"hello" negotiation) as SBC/esp32.cpp, so the host
+side can be exercised without hardware:
+    python3 -m SBC.fake_sbc --port 5000
+'''
+
+import argparse
+import asyncio
+import logging
+
+from SBC.async_sbc import encode_frame, read_frame
+from SBC.framing import choose_codec
+
+
+class FakeSBC:
+    """
+    asyncio TCP server that behaves like the ESP32 firmware.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): TCP port, 0 picks a free one (see ``port`` after ``start``).
+        reply_delay (float): Seconds to wait before answering each request.
+        drop_every (int): Silently ignore every n-th request (0 = never), to exercise retries.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, reply_delay=0.0, drop_every=0) -> None:
+        self.host = host
+        self.port = port
+        self.reply_delay = reply_delay
+        self.drop_every = drop_every
+        self.lights = {}
+        self.strobe = None  # armed strobe levels, None when disarmed
+        self.flashes = 0
+        self.requests = 0
+        self.logger = logging.getLogger(__name__)
+        self._server = None
+        self._writers = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Fake SBC listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Like a rebooting board, open connections go away too
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_client(self, reader, writer) -> None:
+        codec = "json"
+        self._writers.add(writer)
+        try:
+            while True:
+                message = await read_frame(reader, codec=codec)
+                if message is None:
+                    continue
+                if message.get("type") == "hello":
+                    # Answer in JSON, everything after uses the chosen codec
+                    codec = choose_codec(message.get("codecs", []))
+                    writer.writelines(encode_frame({"type": "hello", "codec": codec}))
+                    await writer.drain()
+                    continue
+                # Requests are answered concurrently, like the ESP32 with pipelined commands
+                asyncio.create_task(self._reply(message, writer, codec))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _reply(self, message: dict, writer, codec: str = "json") -> None:
+        self.requests += 1
+        if self.drop_every and self.requests % self.drop_every == 0:
+            return
+        if self.reply_delay:
+            await asyncio.sleep(self.reply_delay)
+
+        reply = self.handle(message)
+        if reply is not None and not writer.is_closing():
+            writer.writelines(encode_frame(reply, codec))
+            await writer.drain()
+
+    def handle(self, message: dict):
+        """Builds the reply to one request, mirroring handleMessage() in esp32.cpp."""
+
+        kind = message.get("type")
+        reply = {"id": message["id"]} if "id" in message else {}
+
+        if kind == "ping":
+            reply["type"] = "pong"
+        elif kind == "set":
+            self.strobe = None  # a steady level ends strobe mode
+            self.lights.update(message.get("set", {}))
+            reply.update(type="ack", status="ok", set=message.get("set", {}))
+        elif kind == "strobe":
+            if message.get("arm"):
+                self.strobe = dict(message.get("set", {}))
+            else:
+                self.strobe = None
+            self.lights = {channel: 0.0 for channel in self.lights}  # dark until exposure
+            reply.update(type="ack", status="ok", armed=self.strobe is not None)
+        elif kind == "get":
+            reply.update(type="state", lights=dict(self.lights))
+        else:
+            reply.update(type="error", status=f"unknown type {kind!r}")
+        return reply
+
+    def exposure(self, active: bool) -> None:
+        """Simulates an edge on the strobe input (the camera's ExposureActive line)."""
+
+        if self.strobe is None:
+            return
+        if active:
+            self.flashes += 1
+            self.lights = dict(self.strobe)
+        else:
+            self.lights = {channel: 0.0 for channel in self.strobe}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("Fake ESP32 light controller")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--delay", type=float, default=0.0, help="Reply delay in seconds")
+    args = parser.parse_args()
+
+    async def main():
+        server = FakeSBC(args.host, args.port, reply_delay=args.delay)
+        await server.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
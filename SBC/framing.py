@@ -0,0 +1,332 @@
+'''
+Length-prefixed message framing shared by the SBC clients and the fake SBC.
+
+Each frame is a 4-byte big-endian length followed by the encoded payload. The
+payload codec is JSON by default; MessagePack or CBOR can be negotiated with the
+ESP32 (ArduinoJson reads and writes MessagePack natively) when the optional
+``msgpack`` / ``cbor2`` packages are installed.
+
+Microbenchmark against a loopback stand-in:
+    python3 -m SBC.framing
+'''
+
+import argparse
+import importlib
+import importlib.util
+import json
+import socket
+import struct
+import threading
+import time
+
+HEADER = struct.Struct(">I")
+DEFAULT_MAX_FRAME_SIZE = 1 << 20
+
+# Module level instances, json.dumps/loads with arguments build a new one per call
+_JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _json_loads(buffer):
+    # str() decodes straight from the memoryview without an intermediate bytes copy
+    return _JSON_DECODER.decode(str(buffer, "utf-8"))
+
+
+def _json_dumps(payload) -> bytes:
+    return _JSON_ENCODER.encode(payload).encode("utf-8")
+
+
+# Optional binary codecs: (module, encode, decode), imported on first use so only
+# links that actually negotiate them pay for the import
+_OPTIONAL_CODECS = {"msgpack": ("msgpack", "packb", "unpackb"), "cbor": ("cbor2", "dumps", "loads")}
+
+CODECS = {"json": (_json_dumps, _json_loads)}
+for _name, (_module, _, _) in _OPTIONAL_CODECS.items():
+    if importlib.util.find_spec(_module) is not None:
+        CODECS[_name] = None  # installed, loaded by codec_functions
+
+
+def codec_functions(name: str) -> tuple:
+    """
+    Returns (encode, decode) for a codec name.
+
+    Raises:
+        ValueError: If the codec is unknown or its package is not installed.
+    """
+
+    if name not in CODECS:
+        raise ValueError(f"Codec '{name}' is not available (have {list(CODECS)})")
+    if CODECS[name] is None:
+        module, dumps, loads = _OPTIONAL_CODECS[name]
+        module = importlib.import_module(module)
+        CODECS[name] = (getattr(module, dumps), getattr(module, loads))
+    return CODECS[name]
+
+
+# Preferred order when negotiating with the SBC
+PREFERENCE = ("msgpack", "cbor", "json")
+
+
+def available_codecs() -> list:
+    return [name for name in PREFERENCE if name in CODECS]
+
+
+def choose_codec(offered) -> str:
+    """Picks the most compact codec that both sides support."""
+
+    for name in PREFERENCE:
+        if name in offered and name in CODECS:
+            return name
+    return "json"
+
+
+def hello_message(codecs=None) -> dict:
+    """Codec offer sent (as JSON) right after connecting."""
+    return {"type": "hello", "codecs": list(codecs or available_codecs())}
+
+
+def accept_hello(reply) -> str:
+    """
+    Reads the codec out of the SBC's answer to ``hello_message``.
+
+    Firmware without codec negotiation answers with an error, which means JSON.
+    """
+
+    if isinstance(reply, dict) and reply.get("type") == "hello" and reply.get("codec") in CODECS:
+        return reply["codec"]
+    return "json"
+
+
+class FrameCodec:
+    """Encodes and decodes payloads with a named codec."""
+
+    def __init__(self, codec: str = "json") -> None:
+        self.set_codec(codec)
+
+    def set_codec(self, codec: str) -> None:
+        self.dumps, self.loads = codec_functions(codec)
+        self.name = codec
+
+    def encode(self, payload) -> tuple:
+        """Returns (header, body) ready for scatter-gather sending."""
+
+        body = self.dumps(payload)
+        return HEADER.pack(len(body)), body
+
+
+class FramedSocket:
+    """
+    Blocking framed transport over a connected socket without per-message allocations.
+
+    Frames are received with ``recv_into`` into one reusable ``bytearray`` (grown only
+    when a larger frame arrives) and decoded from a ``memoryview``. Small frames are
+    assembled in a reused send buffer; large ones go out with a scatter-gather
+    ``sendmsg`` of header and body instead of being concatenated.
+
+    Args:
+        sock (socket.socket): Connected stream socket.
+        max_frame_size (int): Largest accepted frame body in bytes.
+        codec (str): Payload codec name, see ``CODECS``.
+    """
+
+    SMALL_FRAME = 4096
+
+    def __init__(self, sock: socket.socket, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE, codec: str = "json") -> None:
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self.codec = FrameCodec(codec)
+
+        self._header = bytearray(HEADER.size)
+        self._header_view = memoryview(self._header)
+        self._buffer = bytearray(4096)
+        self._view = memoryview(self._buffer)
+        self._send_buffer = bytearray(HEADER.size + self.SMALL_FRAME)
+        self._send_view = memoryview(self._send_buffer)
+        self._send_lock = threading.Lock()
+        self._can_sendmsg = hasattr(sock, "sendmsg")
+
+    def send(self, payload) -> None:
+        body = self.codec.dumps(payload)
+        length = len(body)
+        with self._send_lock:
+            if length <= self.SMALL_FRAME:
+                # Small frames: one write from the reused send buffer, no concatenation
+                HEADER.pack_into(self._send_buffer, 0, length)
+                self._send_buffer[HEADER.size:HEADER.size + length] = body
+                self.sock.sendall(self._send_view[:HEADER.size + length])
+            elif self._can_sendmsg:
+                self._sendmsg([memoryview(HEADER.pack(length)), memoryview(body)])
+            else:
+                self.sock.sendall(HEADER.pack(length))
+                self.sock.sendall(body)
+
+    def _sendmsg(self, buffers: list) -> None:
+        # Scatter-gather send of header and body, looping on partial sends
+        while buffers:
+            sent = self.sock.sendmsg(buffers)
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            if buffers and sent:
+                buffers[0] = buffers[0][sent:]
+
+    def recv(self):
+        """
+        Receives one frame.
+
+        Returns:
+            The decoded payload, or None for a body the codec could not decode.
+
+        Raises:
+            ConnectionError: If the socket closed or the length prefix is invalid.
+        """
+
+        self._recv_into(self._header_view)
+        length = HEADER.unpack(self._header)[0]
+
+        # sanity check against malicious or corrupt lengths
+        if length <= 0 or length > self.max_frame_size:
+            raise ConnectionError(f"Invalid message length: {length}")
+
+        if length > len(self._buffer):
+            self._view.release()
+            self._buffer = bytearray(max(length, 2 * len(self._buffer)))
+            self._view = memoryview(self._buffer)
+
+        body = self._view[:length]
+        self._recv_into(body)
+        try:
+            return self.codec.loads(body)
+        except Exception:
+            return None
+
+    def negotiate(self, codec: str, timeout: float = 2.0) -> str:
+        """
+        Offers ``codec`` (plus JSON) to the peer and switches to what it accepts.
+
+        Must run before any other traffic, e.g. straight after connecting.
+
+        Returns:
+            str: The codec in use afterwards.
+        """
+
+        if codec == "json":
+            return self.codec.name
+
+        previous = self.sock.gettimeout()
+        self.sock.settimeout(timeout)
+        try:
+            self.codec.set_codec("json")
+            self.send(hello_message([codec, "json"]))
+            chosen = accept_hello(self.recv())
+        except socket.timeout:
+            chosen = "json"
+        finally:
+            self.sock.settimeout(previous)
+
+        self.codec.set_codec(chosen)
+        return chosen
+
+    def _recv_into(self, view: memoryview) -> None:
+        received = 0
+        size = len(view)
+        while received < size:
+            count = self.sock.recv_into(view[received:], size - received)
+            if count == 0:
+                raise ConnectionError("Socket closed")
+            received += count
+
+
+# Microbenchmark
+def _legacy_send(sock, payload) -> None:
+    # Previous SBC._send_framed: encode, then concatenate header and body
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(data)) + data)
+
+
+def _legacy_recv(sock):
+    # Previous SBC._recv_exact: grow an immutable bytes object chunk by chunk
+    def recv_exact(size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Socket closed")
+            data += chunk
+        return data
+
+    length = struct.unpack(">I", recv_exact(4))[0]
+    return json.loads(recv_exact(length).decode("utf-8"))
+
+
+def _echo_server(listener: socket.socket, codec: str, legacy: bool) -> None:
+    conn, _ = listener.accept()
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    framed = FramedSocket(conn, codec=codec)
+    try:
+        while True:
+            if legacy:
+                _legacy_send(conn, _legacy_recv(conn))
+            else:
+                framed.send(framed.recv())
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def benchmark(payload, count: int, codec: str = "json", legacy: bool = False, window: int = 32) -> float:
+    """
+    Sends ``count`` copies of ``payload`` through a loopback echo stand-in.
+
+    Returns:
+        float: Round-trip messages per second.
+    """
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    server = threading.Thread(target=_echo_server, args=(listener, codec, legacy), daemon=True)
+    server.start()
+
+    sock = socket.create_connection(listener.getsockname())
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    framed = FramedSocket(sock, codec=codec)
+    send = (lambda p: _legacy_send(sock, p)) if legacy else framed.send
+    recv = (lambda: _legacy_recv(sock)) if legacy else framed.recv
+
+    start = time.perf_counter()
+    in_flight = 0
+    for _ in range(count):
+        send(payload)
+        in_flight += 1
+        if in_flight == window:  # keep a bounded number of messages pipelined
+            for _ in range(window):
+                recv()
+            in_flight = 0
+    for _ in range(in_flight):
+        recv()
+    elapsed = time.perf_counter() - start
+
+    sock.close()
+    listener.close()
+    server.join()
+    return count / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("SBC framing microbenchmark")
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    payloads = {
+        "command": {"type": "set", "id": 1, "set": {"light_1": 0.5, "light_2": 0.5}},
+        "telemetry": {"type": "telemetry", "samples": [[i, i * 0.5, 21.5] for i in range(3000)]},
+    }
+
+    for name, payload in payloads.items():
+        count = args.count if name == "command" else max(1, args.count // 100)
+        print(f"{name} ({len(_json_dumps(payload))} bytes as JSON), {count} messages:")
+        print(f"  legacy json : {benchmark(payload, count, legacy=True):10.0f} msg/s")
+        for codec in available_codecs()[::-1]:
+            print(f"  {codec:12}: {benchmark(payload, count, codec=codec):10.0f} msg/s")
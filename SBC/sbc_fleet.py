@@ -0,0 +1,377 @@
+'''
+One event loop for every SBC in the setup.
+
+All boards share a single asyncio loop thread: connections are supervised by
+tasks that reconnect with exponential backoff, heartbeats for all boards are
+driven by one timer wheel, and fleet-wide light changes fan out in parallel.
+The number of threads does not depend on the number of boards.
+
+Demo against local stand-ins (prints the thread count as boards are added):
+    python3 -m SBC.sbc_fleet --boards 8
+'''
+
+import argparse
+import asyncio
+import math
+import random
+import threading
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from SBC.async_sbc import AsyncSBC, MAX_FRAME_SIZE
+from metrics import SBC_RTT_SECONDS, SBC_RECONNECTS, SBC_MISSED_HEARTBEATS
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: ``slots`` buckets of ``tick`` seconds each.
+
+    Scheduling and expiry are O(1) per timer no matter how many are pending, and
+    every timer that falls into the same tick fires together.
+    """
+
+    def __init__(self, tick: float = 0.25, slots: int = 512) -> None:
+        self.tick = tick
+        self.position = 0
+        self._slots = [{} for _ in range(slots)]
+        self._where = {}  # key -> slot index
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def schedule(self, key, delay: float) -> None:
+        """(Re)schedules ``key`` to expire after ``delay`` seconds."""
+
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        rounds, offset = divmod(ticks, len(self._slots))
+        if offset == 0:
+            rounds, offset = rounds - 1, len(self._slots)
+        slot = (self.position + offset) % len(self._slots)
+        self._slots[slot][key] = rounds
+        self._where[key] = slot
+
+    def cancel(self, key) -> None:
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self) -> list:
+        """Moves one tick forward and returns the keys that expired."""
+
+        self.position = (self.position + 1) % len(self._slots)
+        bucket = self._slots[self.position]
+        due = []
+        for key, rounds in list(bucket.items()):
+            if rounds == 0:
+                due.append(key)
+                del bucket[key]
+                del self._where[key]
+            else:
+                bucket[key] = rounds - 1
+        return due
+
+
+@dataclass
+class BoardState:
+    name: str
+    client: AsyncSBC
+    connected: asyncio.Event = field(default_factory=asyncio.Event)
+    backoff: float = 0.0
+    reconnects: int = 0
+    missed_heartbeats: int = 0
+    rtt: Optional[float] = None
+
+
+class SBCFleet:
+    """
+    Manages the connections to a fleet of ESP32 light controllers on one event loop.
+
+    Args:
+        boards (dict): Board name -> (ip, port).
+        heartbeat_interval (float): Seconds between heartbeats. A board that replied to
+            anything within the interval is not pinged.
+        timeout (float): Seconds to wait for a reply.
+        retries (int): Resends of a request after a timeout.
+        backoff_initial (float): First reconnect delay in seconds, doubled after each failure.
+            A connection that drops within ``heartbeat_interval`` counts as a failure; the
+            delay is only reset once a link has stayed up that long.
+        backoff_max (float): Upper bound for the reconnect delay.
+        missed_heartbeats (int): Unanswered heartbeats after which a connection is dropped and re-established.
+        codec (str): Preferred payload codec, see SBC/framing.py.
+    """
+
+    def __init__(self, boards: dict, heartbeat_interval=10.0, timeout=2.0, retries=2, backoff_initial=0.5,
+                 backoff_max=30.0, missed_heartbeats=2, codec="json", max_frame_size=MAX_FRAME_SIZE) -> None:
+        self.heartbeat_interval = heartbeat_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.missed_heartbeats = missed_heartbeats
+        self.logger = logging.getLogger(__name__)
+
+        self._client_args = dict(timeout=timeout, retries=retries, codec=codec, max_frame_size=max_frame_size)
+        self._addresses = dict(boards)
+        self._boards = {}
+        self._wheel = TimerWheel(tick=min(0.25, heartbeat_interval / 4))
+        self._tasks = []
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="SBC-fleet", daemon=True)
+        self._started = False
+
+    @classmethod
+    def from_setups(cls, setups, rigs=None, **kwargs):
+        """Builds a fleet from the ``setups`` section of config.yaml, optionally limited to ``rigs``."""
+
+        boards = {
+            rig: (setup["sbc"]["ip"], setup["sbc"]["port"])
+            for rig, setup in setups.items()
+            if rigs is None or rig in rigs
+        }
+        return cls(boards, **kwargs)
+
+    @property
+    def names(self) -> list:
+        return list(self._addresses)
+
+    # Lifecycle
+    def start(self) -> None:
+        """Starts the loop thread and begins connecting to every board in the background."""
+
+        if self._started:
+            return
+        self._thread.start()
+        self._submit(self._start()).result()
+        self._started = True
+
+    def connect(self, timeout: float = None, names=None) -> None:
+        """
+        Starts the fleet and waits until the given (default: all) boards are connected.
+
+        Raises:
+            TimeoutError: If a board did not connect within ``timeout`` seconds.
+        """
+
+        self.start()
+        try:
+            self._submit(self._wait_connected(names or self.names, timeout)).result()
+        except asyncio.TimeoutError:
+            missing = [n for n in (names or self.names) if not self.is_connected(n)]
+            raise TimeoutError(f"Could not connect to {', '.join(missing)}")
+
+    def stop(self) -> None:
+        if not self._started:
+            return
+        self._submit(self._stop()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._started = False
+
+    disconnect = stop
+
+    # Status
+    def is_connected(self, name: str) -> bool:
+        board = self._boards.get(name)
+        return board is not None and board.client.is_connected()
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "connected": board.client.is_connected(),
+                "codec": board.client.codec,
+                "reconnects": board.reconnects,
+                "missed_heartbeats": board.missed_heartbeats,
+                "rtt": board.rtt,
+            }
+            for name, board in self._boards.items()
+        }
+
+    # Requests
+    def request(self, name: str, payload: dict, timeout: float = None, retries: int = None):
+        """Sends ``payload`` to one board, returns a concurrent Future with the reply."""
+        return self._submit(self._boards[name].client.request(payload, timeout, retries))
+
+    def update_settings(self, settings: dict, names=None, timeout: float = None, retries: int = None):
+        """
+        Sends the same light settings to several boards (default: all) in parallel.
+
+        Returns:
+            concurrent.futures.Future: Resolves to {name: reply or exception}, so one
+            unreachable board does not hide the others' acknowledgements.
+        """
+        return self._submit(self._fan_out({name: settings for name in (names or self.names)}, timeout, retries))
+
+    def update_settings_each(self, settings_by_name: dict, timeout: float = None, retries: int = None):
+        """Like ``update_settings`` with individual settings per board."""
+        return self._submit(self._fan_out(settings_by_name, timeout, retries))
+
+    def board(self, name: str) -> "FleetBoard":
+        """Returns a single board view with the BlockingSBC interface, e.g. for CaptureSequencer."""
+        return FleetBoard(self, name)
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    # Loop side
+    async def _start(self) -> None:
+        for name, (ip, port) in self._addresses.items():
+            client = AsyncSBC(ip, port, name=name, **self._client_args)
+            self._boards[name] = BoardState(name, client)
+            self._tasks.append(asyncio.create_task(self._supervise(self._boards[name])))
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+
+    async def _stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.gather(*(board.client.close() for board in self._boards.values()), return_exceptions=True)
+
+    async def _wait_connected(self, names, timeout) -> None:
+        await asyncio.wait_for(asyncio.gather(*(self._boards[n].connected.wait() for n in names)), timeout)
+
+    async def _supervise(self, board: BoardState) -> None:
+        """Keeps one board connected; iterative, so a flaky link never grows the stack."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await board.client.connect()
+            except Exception as e:
+                # EOFError: the link dropped during the codec handshake (IncompleteReadError)
+                expected = isinstance(e, (OSError, EOFError, asyncio.TimeoutError, ValueError))
+                await board.client.close()  # a half-open handshake leaves the writer behind
+                delay = self._backoff(board)
+                if expected:
+                    self.logger.warning(f"Connection to {board.name} failed ({e}), retrying in {delay:.1f} s")
+                else:
+                    self.logger.exception(f"Unexpected error connecting to {board.name}, retrying in {delay:.1f} s")
+                await asyncio.sleep(delay)
+                continue
+
+            board.missed_heartbeats = 0
+            board.connected.set()
+            self._wheel.schedule(board.name, self.heartbeat_interval)
+            connected_at = loop.time()
+
+            await board.client.wait_disconnected()
+
+            board.connected.clear()
+            self._wheel.cancel(board.name)
+            await board.client.close()
+            board.reconnects += 1
+            SBC_RECONNECTS.labels(board.name).inc()
+
+            if loop.time() - connected_at >= self.heartbeat_interval:
+                # The link was up for a heartbeat interval, so this is a fresh fault
+                board.backoff = 0.0
+                self.logger.warning(f"Lost connection to {board.name}, reconnecting")
+            else:
+                # Accepted and dropped straight away (firmware stop(), handshake failure), back off
+                delay = self._backoff(board)
+                self.logger.warning(f"Lost connection to {board.name} right after connecting, reconnecting in {delay:.1f} s")
+                await asyncio.sleep(delay)
+
+    def _backoff(self, board: BoardState) -> float:
+        """Doubles the board's reconnect delay and returns it with jitter."""
+
+        board.backoff = min(self.backoff_max, board.backoff * 2 if board.backoff else self.backoff_initial)
+        return board.backoff * random.uniform(0.8, 1.2)  # jitter so boards don't reconnect in lockstep
+
+    async def _heartbeat_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self._wheel.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            due = self._wheel.advance()
+            if due:
+                # Every board due in this tick is pinged concurrently
+                await asyncio.gather(*(self._heartbeat(self._boards[name]) for name in due))
+
+    async def _heartbeat(self, board: BoardState) -> None:
+        client = board.client
+        if not client.is_connected():
+            return
+
+        idle = asyncio.get_running_loop().time() - client.last_seen
+        if idle < self.heartbeat_interval:
+            # Recent traffic already proves the board is alive
+            self._wheel.schedule(board.name, self.heartbeat_interval - idle)
+            return
+
+        try:
+            board.rtt = await client.ping(timeout=client.timeout)
+            board.missed_heartbeats = 0
+            SBC_RTT_SECONDS.labels(board.name).observe(board.rtt)
+        except (TimeoutError, ConnectionError):
+            board.missed_heartbeats += 1
+            SBC_MISSED_HEARTBEATS.labels(board.name).inc()
+            if board.missed_heartbeats >= self.missed_heartbeats:
+                self.logger.warning(f"{board.name} missed {board.missed_heartbeats} heartbeats, dropping connection")
+                await client.close()  # the supervisor reconnects
+                return
+
+        if client.is_connected():
+            self._wheel.schedule(board.name, self.heartbeat_interval)
+
+    async def _fan_out(self, settings_by_name: dict, timeout, retries) -> dict:
+        names = list(settings_by_name)
+        replies = await asyncio.gather(
+            *(self._boards[name].client.update_settings(settings_by_name[name], timeout, retries) for name in names),
+            return_exceptions=True,
+        )
+        return dict(zip(names, replies))
+
+
+class FleetBoard:
+    """One board of an SBCFleet, with the same interface as BlockingSBC."""
+
+    def __init__(self, fleet: SBCFleet, name: str) -> None:
+        self.fleet = fleet
+        self.name = name
+
+    def is_connected(self) -> bool:
+        return self.fleet.is_connected(self.name)
+
+    def request(self, payload: dict, timeout: float = None, retries: int = None):
+        return self.fleet.request(self.name, payload, timeout, retries)
+
+    def update_settings(self, settings: dict, timeout: float = None, retries: int = None):
+        return self.fleet._submit(self.fleet._boards[self.name].client.update_settings(settings, timeout, retries))
+
+
+if __name__ == "__main__":
+    from SBC.fake_sbc import FakeSBC
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("SBC fleet demo against local stand-ins")
+    parser.add_argument("--boards", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    # The stand-ins get their own loop so they don't count against the fleet
+    server_loop = asyncio.new_event_loop()
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+    fakes = [FakeSBC(reply_delay=0.02) for _ in range(args.boards)]
+    for fake in fakes:
+        asyncio.run_coroutine_threadsafe(fake.start(), server_loop).result()
+
+    baseline = threading.active_count()
+    fleet = SBCFleet({f"board{i}": ("127.0.0.1", fake.port) for i, fake in enumerate(fakes)}, heartbeat_interval=0.5)
+    fleet.connect(timeout=5)
+    print(f"{args.boards} boards connected, fleet added {threading.active_count() - baseline} thread(s)")
+
+    start = time.perf_counter()
+    for i in range(args.rounds):
+        replies = fleet.update_settings({"light_1": i / args.rounds}).result()
+    elapsed = time.perf_counter() - start
+    print(f"{args.rounds} fleet-wide updates in {elapsed:.2f} s ({1000 * elapsed / args.rounds:.1f} ms each, 20 ms reply delay per board)")
+
+    time.sleep(1.5)
+    for name, status in fleet.status().items():
+        print(f"  {name}: {status}")
+    fleet.stop()
@@ -1,15 +1,21 @@
 import socket
-import json
-import struct
 import threading
 import time
 from typing import Optional, Callable
 
+from SBC.framing import FramedSocket, DEFAULT_MAX_FRAME_SIZE
+from metrics import SBC_RTT_SECONDS, SBC_RECONNECTS
+
 def on_message(msg):
     print("Received:", msg)
 
 class SBC:
-    def __init__(self, ip, port, timeout=5, buffer_size=1024, reconnect_interval=5, heartbeat_interval=10, log_level=1, name="NA", verbose=False) -> None:
+    """
+    Threaded client for a single ESP32 (one receiver and one heartbeat thread per board).
+    For several boards use SBC/sbc_fleet.py, which runs all of them on one event loop.
+    """
+
+    def __init__(self, ip, port, timeout=5, buffer_size=1024, reconnect_interval=5, heartbeat_interval=10, log_level=1, name="NA", verbose=False, max_frame_size=DEFAULT_MAX_FRAME_SIZE, codec="json") -> None:
         self.name = name
         self.ip = ip
         self.port = port
@@ -19,14 +25,18 @@ class SBC:
         self.heartbeat_interval = heartbeat_interval
         self.log_level = log_level
         self.verbose = verbose
+        self.max_frame_size = max_frame_size
+        self.codec = codec  # "json", "msgpack" or "cbor", negotiated with the ESP32 on connect
 
         self._socket: Optional[socket.socket] = None
+        self._framed: Optional[FramedSocket] = None
         self._connected = False
         self._lock = threading.Lock()
         self._receiver_thread = None
         self._heartbeat_thread = None
         self._stop_event = threading.Event()
         self._logger_callback: Optional[Callable[[dict], None]] = None
+        self._ping_sent = None  # time.monotonic() of the unanswered heartbeat
 
     #### PUBLIC FUNCTIONS
     # Connection Management
@@ -39,11 +49,19 @@ class SBC:
                 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 sock.settimeout(self.timeout)
                 sock.connect((self.ip, self.port))
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 sock.settimeout(None)
 
+                framed = FramedSocket(sock, self.max_frame_size)
+                codec = framed.negotiate(self.codec, self.timeout)
+
                 self._socket = sock
+                self._framed = framed
                 self._connected = True
 
+                if self.verbose and codec != self.codec:
+                    print(f"INFO: {self.name} does not support {self.codec}, using {codec}")
+
                 if self.verbose:
                     print(f"INFO: Connection to {self.name} successful")
                 if self._logger_callback:
@@ -64,6 +82,7 @@ class SBC:
         if self._socket:
             self._socket.close()
         self._socket = None
+        self._framed = None
 
     def is_connected(self) -> bool:
         return self._connected
@@ -75,46 +94,20 @@ class SBC:
     #### PRIVATE FUNCTIONS
     # Message functions
     def _send_framed(self, payload: dict) -> None:
-        data = json.dumps(payload).encode("utf-8")
-        length_prefix = struct.pack(">I", len(data))
-        with self._lock:
-            self._socket.sendall(length_prefix + data)
+        self._framed.send(payload)
 
     def _receive_framed(self) -> Optional[dict]:
         try:
-            header = self._recv_exact(4)
-            if not header:
-                return None  # connection likely closed
-
-            length = struct.unpack(">I", header)[0]
-
-            # sanity check against malicious or corrupt lengths
-            if length <= 0 or length > 10_000:
-                print(f"Invalid message length: {length}")
-                return None
-
-            body = self._recv_exact(length)
-
-            try:
-                return json.loads(body.decode("utf-8"))
-            except json.JSONDecodeError:
-                print("Malformed JSON received — dropping frame")
-                return None
-        except socket.error:
-            # Real transport failure
+            message = self._framed.recv()
+            if message is None:
+                print("Malformed frame received — dropping frame")
+            return message
+        except (ConnectionError, socket.error):
+            # Real transport failure, or a corrupt length prefix after which the stream is out of sync
             raise
         except Exception as e:
             print(f"Unexpected receive error: {e}")
             return None
-            
-    def _recv_exact(self, size: int) -> bytes:
-        data = b""
-        while len(data) < size:
-            chunk = self._socket.recv(size - len(data))
-            if not chunk:
-                raise ConnectionError("Socket closed")
-            data += chunk
-        return data
 
     def send(self, payload: dict) -> None:
         if not self._connected:
@@ -151,7 +144,11 @@ class SBC:
                     continue  # just drop bad frame
 
                 if message.get("type") == "pong":
-                    continue  # heartbeat reply
+                    # heartbeat reply
+                    if self._ping_sent is not None:
+                        SBC_RTT_SECONDS.labels(self.name).observe(time.monotonic() - self._ping_sent)
+                        self._ping_sent = None
+                    continue
 
                 if self._logger_callback:
                     self._logger_callback(message)
@@ -164,6 +161,7 @@ class SBC:
     def _heartbeat_loop(self) -> None:
         while self._connected and not self._stop_event.is_set():
             try:
+                self._ping_sent = time.monotonic()
                 self._send_framed({"type": "ping"})
             except Exception:
                 self._handle_disconnect()
@@ -174,6 +172,7 @@ class SBC:
     def _handle_disconnect(self) -> None:
         if self._connected:
             print("Disconnected. Reconnecting...")
+            SBC_RECONNECTS.labels(self.name).inc()
         self._connected = False
         if self._socket:
             self._socket.close()
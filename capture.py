@@ -3,53 +3,158 @@ Docstring for capture.py
 This script executes a series of image captures with a set of given camera parameters and a set of given lighting parameters.
 The lighting and camera parameters are called by the names specified in the capture_config.yaml.
 To acquire from several rigs, this script should be executed for every camera setup
+
+If capture_daemon.py is running, the request is handed to it over its UNIX socket and the
+already opened camera and SBC link are used. Otherwise (or with --oneshot) the camera is
+opened in this process.
 '''
 
-import argparse
-import yaml
-#Local imports
-#import Camera.camera_control as cc
+import time
+__STARTED__ = time.time()  # before any heavy import, for the time-to-first-frame report
+
+from startup_profile import profile_startup
+profile_startup()  # --profile_startup: rerun under -X importtime and report
 
-__CONFIG__ = "./config.yaml"
-with open(__CONFIG__, 'r') as f:
-    __CONFIG__ = yaml.safe_load(f)
+import argparse, json
+#Local imports (camera modules are imported on the paths that need them)
+from daemon_protocol import DEFAULT_SOCKET, DaemonUnavailable, daemon_available, send_request
 
 parser = argparse.ArgumentParser("LOTUS-PTO Camera Rig capture")
-parser.add_argument(dest='rig', help="Choice of camera to capture from", choices=__CONFIG__["setups"].keys())
+parser.add_argument(dest='rig', nargs='?', help="Choice of camera to capture from (a rig in config.yaml)")
 parser.add_argument('-c', nargs=2, action='append', help="Provide the name of a camera config followed by the name of a lighting config [See available configs with --list_configs]")
 parser.add_argument('--list_configs', action='store_true', help="List all camera and lighting configs by name")
+parser.add_argument('--keep_order', action='store_true', help="Capture the -c pairs in the given order instead of reordering to minimise reconfiguration")
+parser.add_argument('--naive', action='store_true', help="Push every setting and wait 1 second for the lights on each pair (for timing comparison)")
+parser.add_argument('--tune', action='store_true', help="Set exposure, gain and light levels from ROI probe frames before each capture (cached per rig and time of day)")
+parser.add_argument('--no_lights', action='store_true', help="Do not connect to the SBC, lights are left as they are")
+parser.add_argument('--sbc_timeout', type=float, default=5.0, help="Oneshot only: seconds to wait for the SBC before capturing without light control (default: 5)")
+parser.add_argument('--oneshot', action='store_true', help="Open the camera in this process even if the capture daemon is running")
+parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f"UNIX socket of the capture daemon (default: {DEFAULT_SOCKET})")
+parser.add_argument('--emulated', action='store_true', help="Oneshot only: use the first (emulated) camera instead of the rig's serial/ip")
+parser.add_argument('--report_json', action='store_true', help="Print the sequence report as a JSON line")
+parser.add_argument('--metrics_json', metavar="PATH", help="Write this run's metrics summary (grab, mutex wait and save times, SBC RTT, ...) to a JSON file")
 parser.add_argument('--verbose', action='store_true', help="Enable verbose execution")
+parser.add_argument('--profile_startup', '--profile-startup', action='store_true', help="Print an import time breakdown of this run")
 args = parser.parse_args()
 
+
+def run_oneshot(args) -> dict:
+    """Opens the rig's camera (and SBC) in this process and runs the sequence."""
+
+    from Camera.config_compiler import load_config
+    from Camera.camera_control import CameraControl
+    from Camera.sequencer import CaptureSequencer
+    from Camera.exposure_tuner import ExposureTuner, ExposureCache
+    from SBC.sbc_fleet import SBCFleet
+    from metrics import REGISTRY
+
+    config = load_config("./config.yaml")
+    if args.rig not in config.setups:
+        parser.error(f"unknown rig '{args.rig}' (choose from {', '.join(config.setups)})")
+    setup = config.setups[args.rig]
+
+    # The SBC link connects in the background while the camera opens
+    fleet = None
+    sbc = None
+    if not args.no_lights:
+        fleet = SBCFleet.from_setups(config.setups, rigs=[args.rig])
+        fleet.start()
+
+    # Open Camera
+    try:
+        if args.emulated:
+            camera = CameraControl(rig=args.rig)
+        else:
+            camera = CameraControl(rig=args.rig, serial=setup["camera"]["serial"], ip=setup["camera"]["ip"])
+    except Exception:
+        if fleet is not None:
+            fleet.stop()
+        raise
+    try:
+        if fleet is not None:
+            try:
+                fleet.connect(timeout=args.sbc_timeout)
+                sbc = fleet.board(args.rig)
+            except TimeoutError as e:
+                # Same as --no_lights: capture anyway and leave the lights as they are
+                print(f"WARNING: {e}, capturing without light control") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM
+                fleet.stop()
+                fleet = None
+
+        tuner = ExposureTuner(camera, config, sbc=sbc, cache=ExposureCache()) if args.tune else None
+        sequencer = CaptureSequencer(camera, config, sbc=sbc, naive=args.naive, tuner=tuner)
+        report = sequencer.run([tuple(c) for c in args.c], allow_reorder=not args.keep_order)
+
+    finally:
+        # Close the camera
+        camera.close()
+        if fleet is not None:
+            fleet.stop()
+
+    # After close, so the image writes that were still queued are included
+    report["metrics"] = REGISTRY.summary()
+    return report
+
+
 if args.list_configs:
+    from Camera.config_compiler import load_config
+    __CONFIG__ = load_config("./config.yaml")
     print("#### CAMERA CONFIGS ####")
-    for cam_config in list(__CONFIG__["camera_configs"].keys()):
+    for cam_config in list(__CONFIG__.camera_configs.keys()):
         print(cam_config)
     print("### LIGHTING CONFIGS ###")
-    for lit_config in list(__CONFIG__["light_configs"].keys()):
+    for lit_config in list(__CONFIG__.light_configs.keys()):
         print(lit_config)
+    raise SystemExit(0)
+
+if args.rig is None:
+    parser.error("the following arguments are required: rig")
 
-#Check and report of 
+#Check and report of
 if args.c is None:
-    print("WARNING: No configs provided. a single image will be captured with default settings") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM 
-
-# Open Camera
-#camera = cc.CameraControl()    #TODO: Implement a camera instantiation that takes an IP and returns connection state (TRUE/FALSE)
-#sbc = sbc.connect()            #TODO: Implement a SBC instantiation that takes an IP and returns connection state (TRUE/FALSE)
- 
-if args.c is not None:
-    for c in args.c:
-        if args.verbose:
-            print(f"INFO: Captured an image with [{c[0]}] [{c[1]}]") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM 
-        #Update configurations
-        #sbc.update_settings(c[1]) #TODO: Implement a function that passes a dict to the SBC and updates the lighting configuration
-        #camera.update_settings(c[0])
-        #wait for 1 second? (to let the lights adjust)
-        #camera.capture()
-else:
-    if args.verbose:
-        print(f"INFO: Captured an image with [DEFAULT] [DEFAULT]") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM
-
-# Close the camera
-# camera.close() #TODO: Implement a camera shutoff function (maybe we can push a setting that sleeps the sensor?)
-# sbc.close()    #TODO: Implement a function for the SBC that closses the 
\ No newline at end of file
+    print("WARNING: No configs provided. a single image will be captured with default settings") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM
+    args.c = [["DEFAULT", "DEFAULT"]]
+
+report = None
+if not args.oneshot and daemon_available(args.socket):
+    try:
+        report = send_request(
+            {
+                "cmd": "capture",
+                "rig": args.rig,
+                "pairs": args.c,
+                "keep_order": args.keep_order,
+                "naive": args.naive,
+                "lights": not args.no_lights,
+                "tune": args.tune,
+            },
+            args.socket,
+        )["report"]
+        path = "daemon"
+    except DaemonUnavailable as e:
+        # Stale socket after a crash, or the daemon is waiting for its restart
+        print(f"WARNING: {e}, capturing in this process") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM
+
+if report is None:
+    report = run_oneshot(args)
+    path = "oneshot"
+
+if args.verbose:
+    for c in report["order"]:
+        print(f"INFO: Captured an image with [{c[0]}] [{c[1]}]") #TODO: INTEGRATE THIS WITH EXISTING LOGGING PARADIGM
+
+print(
+    f"INFO: Sequence of {len(report['order'])} captures took {report['wall_time']:.2f} s "
+    f"({report['node_writes']} node writes, {report['node_writes_skipped']} skipped, "
+    f"{report['stream_stops']} stream stops, {report['light_writes']} light writes, "
+    f"{report['settle_time']:.2f} s light settle, {report['tune_frames']} tuning frames, "
+    f"{report['stream_resends']} stream resends, {report['stream_failed_buffers']} failed buffers) via {path}, "
+    f"first frame {report['first_frame_at'] - __STARTED__:.2f} s after start"
+)
+
+if args.metrics_json:
+    with open(args.metrics_json, "w") as f:
+        json.dump(dict(report.get("metrics", {}), path=path, rig=args.rig), f, indent=2)
+
+if args.report_json:
+    print(json.dumps(dict(report, path=path)))
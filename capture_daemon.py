@@ -0,0 +1,358 @@
+'''
+Resident capture daemon.
+
+Keeps the rig cameras open (with an armed grab session) and the SBC links
+connected, runs the capture sequences listed under ``schedule`` in config.yaml,
+and takes on-demand requests from capture.py over a local UNIX socket.
+
+    python3 capture_daemon.py                       # all rigs, schedule from config.yaml
+    PYLON_CAMEMU=1 python3 capture_daemon.py --rigs rig1 --emulated --no_lights
+
+Prometheus metrics (grab latency, camera_mutex waits, save times, queue depth, SBC
+heartbeat RTT, reconnects) are served on http://127.0.0.1:9108/metrics unless
+--metrics_port 0 is given.
+
+Time-to-first-frame of a oneshot capture.py run versus a request to the daemon:
+    PYLON_CAMEMU=1 python3 capture_daemon.py --rigs rig1 --emulated --no_lights --measure_ttff 5
+'''
+
+import argparse, json, os, signal, socket, socketserver, subprocess, sys, threading, time, logging
+from concurrent.futures import ThreadPoolExecutor
+
+from pypylon import pylon
+
+from Camera.config_compiler import load_config
+from Camera.camera_control import CameraControl
+from Camera.sequencer import CaptureSequencer
+from Camera.scheduler import DeadlineScheduler
+from Camera.exposure_tuner import ExposureTuner, ExposureCache
+from SBC.framing import FramedSocket
+from SBC.sbc_fleet import SBCFleet
+from daemon_protocol import DEFAULT_SOCKET, daemon_listening
+from metrics import REGISTRY, MetricsServer
+
+
+class CaptureDaemon:
+    """
+    Long-running owner of the rig cameras and SBC links.
+
+    Every rig gets one CameraControl and one CaptureSequencer that live for the whole
+    daemon, so the sequencer's view of the camera and light state stays valid between
+    runs and only changed nodes are ever written. Scheduled jobs and socket requests
+    for the same rig are serialised by a per-rig lock.
+
+    Args:
+        config (str): Path to config.yaml, re-read (if changed) before every run and
+            every 30 s for schedule changes.
+        rigs (list): Rigs to manage, defaults to all in ``setups``.
+        socket_path (str): UNIX socket for on-demand requests.
+        lights (bool): Connect to the rigs' SBCs.
+        emulated (bool): Map rigs onto pylon emulator devices in order.
+        grab_mode (str): Grab session mode kept armed between captures.
+        metrics_port (int): Local port of the Prometheus endpoint, None disables it.
+    """
+
+    def __init__(self, config="config.yaml", rigs=None, socket_path=DEFAULT_SOCKET, lights=True, emulated=False, grab_mode="trigger", metrics_port=None) -> None:
+        self.config_path = config
+        self.socket_path = socket_path
+        self.metrics_port = metrics_port
+        self.logger = logging.getLogger(__name__)
+
+        config = load_config(config)
+        self.rigs = list(config.setups.keys()) if rigs is None else list(rigs)
+        for rig in self.rigs:
+            if rig not in config.setups:
+                raise ValueError(f"Unknown rig '{rig}' in {self.config_path}")
+
+        started = time.perf_counter()
+        self.fleet = None
+        if lights:
+            self.fleet = SBCFleet.from_setups(config.setups, rigs=self.rigs)
+            self.fleet.start()  # connects in the background while the cameras open
+
+        serials = self._emulated_serials() if emulated else None
+        self.cameras = {}
+        self.sequencers = {}
+        self.tuners = {}
+        self._locks = {}
+        exposure_cache = ExposureCache()
+        for i, rig in enumerate(self.rigs):
+            camera_setup = config.setups[rig]["camera"]
+            self.cameras[rig] = CameraControl(
+                rig=rig,
+                grab_mode=grab_mode,
+                serial=serials[i] if emulated else camera_setup["serial"],
+                ip=None if emulated else camera_setup["ip"],
+            )
+            sbc = self.fleet.board(rig) if self.fleet is not None else None
+            self.sequencers[rig] = CaptureSequencer(self.cameras[rig], config, sbc=sbc)
+            self.tuners[rig] = ExposureTuner(self.cameras[rig], config, sbc=sbc, cache=exposure_cache)
+            self._locks[rig] = threading.Lock()
+
+        self.logger.info(f"Opened {len(self.rigs)} rig(s) in {time.perf_counter() - started:.2f} s")
+
+        self._stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=len(self.rigs), thread_name_prefix="Capture")
+        self._server = None
+        self._metrics_server = None
+        self._threads = []
+        self.scheduler = None
+        self._schedule = None
+
+    # Lifecycle
+    def start(self, schedule: bool = True) -> None:
+        """
+        Starts the socket server, the schedule and the metrics endpoint.
+
+        Raises:
+            RuntimeError: If another daemon is listening on ``socket_path``.
+        """
+
+        if os.path.exists(self.socket_path):
+            if daemon_listening(self.socket_path):
+                raise RuntimeError(f"Another capture daemon is listening on {self.socket_path}")
+            os.unlink(self.socket_path)  # left over from a crashed run
+        else:
+            os.makedirs(os.path.dirname(self.socket_path) or ".", mode=0o750, exist_ok=True)
+
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                daemon._handle_client(self.request)
+
+        # Whoever can connect can drive the cameras: owner and group only, from the first moment
+        umask = os.umask(0o117)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        self._threads = [threading.Thread(target=self._server.serve_forever, name="Daemon-socket", daemon=True)]
+        if schedule:
+            self.scheduler = DeadlineScheduler(workers=4)
+            self._sync_schedule()
+            # config.yaml edits take effect without a restart
+            self.scheduler.add_job("config-watch", 30, self._sync_schedule, align=False)
+            self.scheduler.start()
+        for thread in self._threads:
+            thread.start()
+        if self.metrics_port is not None:
+            self._metrics_server = MetricsServer(port=self.metrics_port)
+            self._metrics_server.start()
+        self.logger.info(f"Capture daemon listening on {self.socket_path}")
+
+    def wait(self) -> None:
+        """Blocks until ``stop`` is called (e.g. from a signal handler)."""
+        self._stop_event.wait()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        for thread in self._threads:
+            thread.join()
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self._pool.shutdown(wait=True)
+
+        for camera in self.cameras.values():
+            camera.close()
+        if self.fleet is not None:
+            self.fleet.stop()
+        self.logger.info("Capture daemon stopped.")
+
+    # Captures
+    def capture(self, rig: str, pairs, keep_order: bool = False, naive: bool = False, lights: bool = True, tune: bool = False) -> dict:
+        """
+        Runs one capture sequence on ``rig``, waiting for any run already in progress there.
+
+        The report's ``metrics`` summarise what the daemon recorded during the run, which
+        includes runs on other rigs at the same time (see the rig labels).
+        """
+
+        if rig not in self.sequencers:
+            raise ValueError(f"Rig '{rig}' is not managed by this daemon ({', '.join(self.rigs)})")
+
+        with self._locks[rig]:
+            sequencer = self.sequencers[rig]
+            sequencer.config = load_config(self.config_path)  # picks up edits, cached otherwise
+            sequencer.naive = naive
+            tuner = self.tuners[rig]
+            tuner.config = sequencer.config
+            sequencer.tuner = tuner if tune else None
+
+            sbc = sequencer.sbc
+            if not lights:
+                sequencer.sbc = None
+                if sequencer.strobe is not None:
+                    sequencer.strobe.sbc = None
+                tuner.sbc = None
+            before = REGISTRY.state()
+            try:
+                report = sequencer.run([tuple(p) for p in pairs], allow_reorder=not keep_order)
+                report["metrics"] = REGISTRY.summary(since=before)
+                return report
+            finally:
+                sequencer.sbc = sbc
+                if sequencer.strobe is not None:
+                    sequencer.strobe.sbc = sbc
+                tuner.sbc = sbc
+
+    def status(self) -> dict:
+        return {
+            "rigs": self.rigs,
+            "busy": [rig for rig, lock in self._locks.items() if lock.locked()],
+            "sbc": self.fleet.status() if self.fleet is not None else {},
+            "schedule": self.scheduler.stats() if self.scheduler is not None else {},
+            "stream": {
+                rig: {"resends": camera.stream_resends, "failed_buffers": camera.stream_failed_buffers}
+                for rig, camera in self.cameras.items()
+            },
+            "recovery": {rig: camera.recovery.stats() for rig, camera in self.cameras.items()},
+        }
+
+    def _handle_client(self, sock: socket.socket) -> None:
+        framed = FramedSocket(sock)
+        try:
+            request = framed.recv()
+        except ConnectionError:
+            return
+
+        try:
+            command = request.get("cmd") if request else None
+            if command == "capture":
+                report = self.capture(
+                    request["rig"],
+                    request.get("pairs") or [["DEFAULT", "DEFAULT"]],
+                    keep_order=request.get("keep_order", False),
+                    naive=request.get("naive", False),
+                    lights=request.get("lights", True),
+                    tune=request.get("tune", False),
+                )
+                reply = {"status": "ok", "report": report}
+            elif command == "status":
+                reply = {"status": "ok", **self.status()}
+            elif command == "metrics":
+                reply = {"status": "ok", "metrics": REGISTRY.summary()}
+            else:
+                reply = {"status": "error", "error": f"Unknown command {command!r}"}
+        except Exception as e:
+            self.logger.error(f"Request {request} failed: {e}")
+            reply = {"status": "error", "error": str(e)}
+
+        try:
+            framed.send(reply)
+        except OSError:
+            pass  # client went away
+
+    def _sync_schedule(self) -> None:
+        """(Re)registers the ``schedule`` jobs of config.yaml when they changed."""
+
+        schedule = load_config(self.config_path).schedule
+        if schedule == self._schedule:
+            return
+        for name in self.scheduler.jobs():
+            if name.startswith("schedule["):
+                self.scheduler.remove_job(name)
+        # Deadlines sit on wall-clock multiples of "every" (like OnCalendar=*:0/10), so
+        # daemons on different hosts capture at the same instant
+        for i, job in enumerate(schedule):
+            self.scheduler.add_job(
+                f"schedule[{i}]", job["every"], lambda job=job: self._run_job(job),
+                policy=job["missed"], offset=job["offset"],
+            )
+        if self._schedule is not None:
+            self.logger.info(f"Schedule reloaded, {len(schedule)} job(s)")
+        self._schedule = schedule
+
+    def _run_job(self, job) -> None:
+        started = time.time()
+        futures = {rig: self._pool.submit(self.capture, rig, job["captures"], tune=job["tune"]) for rig in job["rigs"] if rig in self.sequencers}
+        for rig, future in futures.items():
+            try:
+                report = future.result()
+                self.logger.info(f"Scheduled capture on {rig}: {len(report['order'])} images in {report['wall_time']:.2f} s")
+            except Exception as e:
+                self.logger.error(f"Scheduled capture on {rig} failed: {e}")
+        self.logger.info(f"Scheduled job finished in {time.time() - started:.2f} s")
+
+    @staticmethod
+    def _emulated_serials() -> list:
+        devices = pylon.TlFactory.GetInstance().EnumerateDevices()
+        return [d.GetSerialNumber() for d in devices if d.GetDeviceClass() == "BaslerCamEmu"]
+
+
+def measure_ttff(rig: str, runs: int, socket_path: str, emulated: bool) -> dict:
+    """
+    Spawns capture.py ``runs`` times as a oneshot and ``runs`` times against the daemon.
+
+    Returns:
+        dict: path -> list of seconds from process spawn to the first frame.
+    """
+
+    base = [sys.executable, "capture.py", rig, "--no_lights", "--report_json", "--socket", socket_path]
+    if emulated:
+        base.append("--emulated")
+
+    results = {"oneshot": [], "daemon": []}
+    for path, extra in (("oneshot", ["--oneshot"]), ("daemon", [])):
+        for _ in range(runs):
+            spawned = time.time()
+            output = subprocess.run(base + extra, capture_output=True, text=True, check=True).stdout
+            report = _json_line(output)
+            results[path].append(report["first_frame_at"] - spawned)
+    return results
+
+
+def _json_line(output: str) -> dict:
+    for line in reversed(output.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"No report in output:\n{output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser("LOTUS-PTO capture daemon")
+    parser.add_argument("--rigs", nargs="*", default=None, help="Rigs from config.yaml (default: all)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"UNIX socket for capture.py (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--no_lights", action="store_true", help="Do not connect to the SBCs")
+    parser.add_argument("--no_schedule", action="store_true", help="Only serve on-demand requests")
+    parser.add_argument("--emulated", action="store_true", help="Use pylon emulated cameras (set PYLON_CAMEMU)")
+    parser.add_argument("--metrics_port", type=int, default=9108, help="Local port of the Prometheus /metrics endpoint, 0 disables it (default: 9108)")
+    parser.add_argument("--measure_ttff", type=int, default=0, metavar="N", help="Compare time-to-first-frame of N oneshot and N daemon runs, then exit")
+    args = parser.parse_args()
+
+    # Before opening the cameras, which the running daemon holds
+    if daemon_listening(args.socket):
+        parser.exit(1, f"Another capture daemon is listening on {args.socket}\n")
+
+    daemon = CaptureDaemon(
+        rigs=args.rigs, socket_path=args.socket, lights=not args.no_lights, emulated=args.emulated,
+        metrics_port=args.metrics_port or None,
+    )
+
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    try:
+        daemon.start(schedule=not (args.no_schedule or args.measure_ttff))
+        if args.measure_ttff:
+            results = measure_ttff(daemon.rigs[0], args.measure_ttff, args.socket, args.emulated)
+            for path, samples in results.items():
+                samples = sorted(samples)
+                print(f"{path:8}: median {samples[len(samples) // 2]:.3f} s, min {samples[0]:.3f} s, max {samples[-1]:.3f} s")
+        else:
+            daemon.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
@@ -0,0 +1,89 @@
+'''
+Query the capture catalog (Camera/catalog.py) without scanning image folders.
+
+    python3 catalog.py --rig rig2 -c low_light dim --since 7d
+    python3 catalog.py --light_config dim --since 2025-06-01 --until 2025-06-08 --paths
+    python3 catalog.py --rig rig1 --failed --json
+'''
+
+import argparse, json, re, sqlite3, sys, time
+
+from Camera.catalog import DEFAULT_PATH, connect, query
+
+UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_time(value: str) -> float:
+    """
+    Parses a relative age ("30m", "12h", "7d", "2w") or a local date/time
+    ("2025-06-01" or "2025-06-01 14:30") into ``time.time()`` seconds.
+    """
+
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([mhdw])", value)
+    if match:
+        return time.time() - float(match.group(1)) * UNITS[match.group(2)]
+    for pattern in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, pattern))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"'{value}' is neither an age like 7d nor a date like 2025-06-01")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("LOTUS-PTO capture catalog")
+    parser.add_argument("--db", default=DEFAULT_PATH, help=f"Catalog database (default: {DEFAULT_PATH})")
+    parser.add_argument("--rig", help="Only frames from this rig")
+    parser.add_argument("-c", nargs=2, metavar=("CAMERA_CONFIG", "LIGHT_CONFIG"), help="Camera and light config, '*' matches any")
+    parser.add_argument("--camera_config", help="Only frames with this camera config")
+    parser.add_argument("--light_config", help="Only frames with this light config")
+    parser.add_argument("--since", type=parse_time, help="Age (7d, 12h, 30m, 2w) or date to start from")
+    parser.add_argument("--until", type=parse_time, help="Age or date to stop at")
+    parser.add_argument("--failed", action="store_true", help="Only frames that failed the quality checks")
+    parser.add_argument("--passed", action="store_true", help="Only frames that passed the quality checks")
+    parser.add_argument("--limit", type=int, default=None)
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--paths", action="store_true", help="Print file locations only")
+    output.add_argument("--json", action="store_true", help="Print one JSON object per frame")
+    output.add_argument("--count", action="store_true", help="Print the number of matching frames only")
+    args = parser.parse_args()
+
+    camera_config, light_config = args.camera_config, args.light_config
+    if args.c is not None:
+        camera_config = None if args.c[0] == "*" else args.c[0]
+        light_config = None if args.c[1] == "*" else args.c[1]
+
+    try:
+        rows = query(
+            connect(args.db),
+            rig=args.rig,
+            camera_config=camera_config,
+            light_config=light_config,
+            since=args.since,
+            until=args.until,
+            failed=True if args.failed else False if args.passed else None,
+            limit=args.limit,
+        )
+    except sqlite3.Error as e:
+        sys.exit(f"ERROR: {args.db}: {e}")
+
+    if args.count:
+        print(len(rows))
+    elif args.paths:
+        for row in rows:
+            print(row["path"] if row["archive_index"] is None else f"{row['path']}#{row['archive_index']}")
+    elif args.json:
+        for row in rows:
+            print(json.dumps(dict(row)))
+    else:
+        print(f"{'captured':19}  {'rig':6} {'camera config':14} {'light config':12} {'exposure':>9} {'gain':>5} {'bright':>6}  path")
+        for row in rows:
+            captured = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["captured_at"]))
+            exposure = f"{row['exposure']:.0f}" if row["exposure"] is not None else "-"
+            gain = f"{row['gain']:.1f}" if row["gain"] is not None else "-"
+            brightness = f"{row['brightness']:.2f}" if row["brightness"] is not None else "-"
+            print(
+                f"{captured:19}  {row['rig'] or '-':6} {row['camera_config'] or '-':14} {row['light_config'] or '-':12} "
+                f"{exposure:>9} {gain:>5} {brightness:>6}  {row['path']}"
+            )
+        print(f"{len(rows)} frame(s)")
@@ -0,0 +1,67 @@
+'''
+Client side of the capture daemon's UNIX socket.
+
+Kept free of camera imports so capture.py can talk to a running daemon without
+paying for pypylon/cv2/numpy at start-up. Messages use the same length-prefixed
+framing as the SBC link (SBC/framing.py).
+'''
+
+import os
+import socket
+
+from SBC.framing import FramedSocket
+
+# /run/lotus-capture is the unit's RuntimeDirectory, only root (the daemon's user) can enter it
+DEFAULT_SOCKET = os.environ.get("LOTUS_CAPTURE_SOCKET", "/run/lotus-capture/capture.sock")
+
+
+class DaemonUnavailable(ConnectionError):
+    """Nothing accepted the connection, e.g. a socket file left behind by a crashed daemon."""
+
+
+def daemon_available(socket_path: str = DEFAULT_SOCKET) -> bool:
+    # Only a hint: the file outlives a killed daemon, send_request then raises DaemonUnavailable
+    return os.path.exists(socket_path)
+
+
+def daemon_listening(socket_path: str = DEFAULT_SOCKET) -> bool:
+    """Connects to ``socket_path`` without sending anything; False for a missing or stale socket."""
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1.0)
+    try:
+        sock.connect(socket_path)
+        return True
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    finally:
+        sock.close()
+
+
+def send_request(payload: dict, socket_path: str = DEFAULT_SOCKET, timeout: float = None) -> dict:
+    """
+    Sends one request to the capture daemon and waits for its reply.
+
+    Raises:
+        DaemonUnavailable: If no daemon accepted the connection (nothing was sent).
+        ConnectionError: If the daemon hung up while handling the request.
+        RuntimeError: If the daemon answered with an error.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonUnavailable(f"Capture daemon not reachable at {socket_path}: {e}")
+
+        framed = FramedSocket(sock)
+        framed.send(payload)
+        reply = framed.recv()
+    finally:
+        sock.close()
+
+    if reply is None or reply.get("status") != "ok":
+        raise RuntimeError(f"Capture daemon error: {None if reply is None else reply.get('error')}")
+    return reply
@@ -1,18 +1,32 @@
+from startup_profile import profile_startup
+profile_startup()  # --profile_startup: rerun under -X importtime and report
+
 import threading, argparse, logging
 from logging.handlers import RotatingFileHandler
 
-from Camera.camera_control import CameraControl
+# Camera modules (pypylon, numpy, cv2) are imported in Main, so -h stays fast
 
 # from dashboard import DashboardApp
 
 
 class Main:
-    def __init__(self, auto_interval=None) -> None:
-        self.camera_control = CameraControl(auto_interval=auto_interval)
+    def __init__(self, auto_interval=None, drop_policy="block", sink="png", grab_mode=None, preview_port=None, missed_slots="skip") -> None:
+        from Camera.camera_control import CameraControl
+
+        self.camera_control = CameraControl(
+            auto_interval=auto_interval, missed_slots=missed_slots, drop_policy=drop_policy, sink=sink, grab_mode=grab_mode
+        )
 
         self.logger = self.logging_setup()
         self.logger.info("Camera system initialized.")
 
+        self.preview_server = None
+        if preview_port is not None:
+            from Camera.preview_server import PreviewServer
+
+            self.preview_server = PreviewServer(self.camera_control, port=preview_port)
+            self.preview_server.start()
+
         self.check_for_input()
 
         # self.tui = DashboardApp(self)
@@ -52,8 +66,10 @@ class Main:
 
         finally:
             print("Lukker kameraet")
-            if hasattr(self, "camera_control") and self.camera_control.camera.IsOpen():
-                self.camera_control.camera.Close()
+            if self.preview_server is not None:
+                self.preview_server.stop()
+            if hasattr(self, "camera_control"):
+                self.camera_control.close()
 
     @staticmethod
     def run_in_thread(func, *args) -> threading.Thread:
@@ -76,7 +92,56 @@ if __name__ == "__main__":
         help="Run in auto mode. Optional: specify interval in seconds (default: 60)",
     )
 
+    parser.add_argument(
+        "--missed_slots",
+        choices=["skip", "catch_up"],
+        default="skip",
+        help="Auto mode: skip capture slots that pass while a capture is still running, or catch up on them afterwards (default: skip)",
+    )
+
+    parser.add_argument(
+        "--drop_policy",
+        choices=["block", "drop_newest", "drop_oldest"],
+        default="block",
+        help="What to do with new frames when the image write queue is full (default: block)",
+    )
+
+    parser.add_argument(
+        "--sink",
+        choices=["png", "raw"],
+        default="png",
+        help="Storage for auto captured frames: PNG files or the raw Bayer archive (default: png)",
+    )
+
+    parser.add_argument(
+        "--grab_mode",
+        choices=["trigger", "latest"],
+        default=None,
+        help="Keep the camera stream armed between snapshots: software trigger per shot, or newest buffered frame",
+    )
+
+    parser.add_argument(
+        "--preview_port",
+        type=int,
+        default=None,
+        help="Serve a headless MJPEG live view on http://127.0.0.1:<port>/ (and /snapshot)",
+    )
+
+    parser.add_argument(
+        "--profile_startup",
+        "--profile-startup",
+        action="store_true",
+        help="Print an import time breakdown of this run",
+    )
+
     args = parser.parse_args()
 
     # args.auto will be None (False), or an Integer (True)
-    Main(auto_interval=args.auto)
+    Main(
+        auto_interval=args.auto,
+        missed_slots=args.missed_slots,
+        drop_policy=args.drop_policy,
+        sink=args.sink,
+        grab_mode=args.grab_mode,
+        preview_port=args.preview_port,
+    )
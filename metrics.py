@@ -0,0 +1,487 @@
+'''
+Counters, gauges, histograms and timing spans for the capture pipeline.
+
+Kept free of camera and numpy imports so the SBC clients and capture.py can use it
+too. Metrics live in one process-wide registry and are get-or-create by name, so
+every CameraControl and SBC client adds its own label values to the same family.
+The registry is exported in the Prometheus text format by ``MetricsServer`` and
+summarised as JSON by ``summary``.
+
+    with GRAB_SECONDS.labels(rig).time():
+        ...
+
+Span overhead on this machine:
+    python3 metrics.py --benchmark
+'''
+
+import argparse, bisect, json, math, threading, time, logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from a 100 µs node write to a 10 s reconnect
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Span:
+    """Times a ``with`` block into a histogram; ``elapsed`` holds the seconds afterwards."""
+
+    __slots__ = ("histogram", "start", "elapsed")
+
+    def __init__(self, histogram) -> None:
+        self.histogram = histogram
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed)
+        return False
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        # acquire/release costs about half of a "with" block, and this runs on every capture
+        self._lock.acquire()
+        try:
+            self.value += amount
+        finally:
+            self._lock.release()
+
+
+class _GaugeValue:
+    __slots__ = ("_value", "_function")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._function = None
+
+    @property
+    def value(self) -> float:
+        if self._function is None:
+            return self._value
+        try:
+            return float(self._function())
+        except Exception:
+            return math.nan
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, function) -> None:
+        """Reads the value from ``function()`` at export time, e.g. a queue length, so the hot path pays nothing."""
+        self._function = function
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "max", "_lock")
+
+    def __init__(self, bounds: tuple) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        self._lock.acquire()
+        try:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+        finally:
+            self._lock.release()
+
+    def time(self) -> Span:
+        return Span(self)
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound below which ``q`` of the observations fall (the max for the +Inf bucket)."""
+        return _quantile(self.bounds, self.counts, q, self.max)
+
+    def state(self) -> tuple:
+        self._lock.acquire()
+        try:
+            return tuple(self.counts), self.sum, self.count
+        finally:
+            self._lock.release()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames=()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        # Unlabelled metrics are their own single child
+        self._default = self.labels() if not self.labelnames else None
+
+    def labels(self, *values):
+        """Child for one combination of label values, created on first use. Keep the child on hot paths."""
+
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values) -> None:
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+    def children(self) -> list:
+        with self._lock:
+            return list(self._children.items())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> Span:
+        return Span(self._default)
+
+
+class Registry:
+    """Named metric families of one process."""
+
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self) -> list:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, child in metric.children():
+                labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(metric.labelnames, key))
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{{{labels}}} {_number(child.value)}" if labels else f"{metric.name} {_number(child.value)}")
+                    continue
+                with child._lock:
+                    counts, total, count = list(child.counts), child.sum, child.count
+                prefix = labels + "," if labels else ""
+                cumulative = 0
+                for bound, n in zip(child.bounds + (math.inf,), counts):
+                    cumulative += n
+                    lines.append(f'{metric.name}_bucket{{{prefix}le="{_number(bound)}"}} {cumulative}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{metric.name}_sum{suffix} {_number(total)}")
+                lines.append(f"{metric.name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+    def state(self) -> dict:
+        """Raw counter values and histogram buckets, to pass to ``summary`` as ``since`` later."""
+
+        state = {}
+        for metric in self.metrics():
+            for key, child in metric.children():
+                if metric.kind == "counter":
+                    state[metric.name, key] = child.value
+                elif metric.kind == "histogram":
+                    state[metric.name, key] = child.state()
+        return state
+
+    def summary(self, since: dict = None) -> dict:
+        """
+        Compact JSON-friendly view: counter and gauge values, and count, mean, p50,
+        p95 and max in milliseconds for histograms. Label values are joined with "/".
+
+        Args:
+            since (dict): A ``state()`` taken earlier; counters and histograms then only
+                cover what happened after it (without max, which cannot be split).
+        """
+
+        result = {}
+        for metric in self.metrics():
+            values = {}
+            for key, child in metric.children():
+                before = since.get((metric.name, key)) if since is not None else None
+                if metric.kind == "histogram":
+                    counts, total, count = child.state()
+                    if before is not None:
+                        counts = [a - b for a, b in zip(counts, before[0])]
+                        total, count = total - before[1], count - before[2]
+                    if not count:
+                        continue
+                    values["/".join(key)] = {
+                        "count": count,
+                        "mean_ms": round(total / count * 1000, 3),
+                        "p50_ms": round(_quantile(child.bounds, counts, 0.5, child.max) * 1000, 3),
+                        "p95_ms": round(_quantile(child.bounds, counts, 0.95, child.max) * 1000, 3),
+                    }
+                    if since is None:
+                        values["/".join(key)]["max_ms"] = round(child.max * 1000, 3)
+                elif metric.kind == "counter":
+                    value = child.value - (before or 0.0)
+                    if value or since is None:
+                        values["/".join(key)] = value
+                else:
+                    value = child.value
+                    values["/".join(key)] = None if math.isnan(value) else value
+            if values:
+                result[metric.name] = values.get("", values) if not metric.labelnames else values
+        return result
+
+
+def _quantile(bounds: tuple, counts, q: float, upper: float) -> float:
+    count = sum(counts)
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    for bound, n in zip(bounds, counts):
+        seen += n
+        if seen >= rank:
+            return min(bound, upper)
+    return upper
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# Pipeline metrics, shared by every rig and board of the process
+GRAB_SECONDS = histogram("lotus_grab_seconds", "Time from requesting a frame to the grab result", ("rig",))
+MUTEX_WAIT_SECONDS = histogram("lotus_camera_mutex_wait_seconds", "Time spent waiting for camera_mutex", ("rig",))
+STORE_SECONDS = histogram("lotus_store_seconds", "Time on the capture thread to hand a frame to its sink", ("rig",))
+WRITE_SECONDS = histogram("lotus_image_write_seconds", "Encode and write time of one image on a writer thread", ("format",))
+WRITE_QUEUE_DEPTH = gauge("lotus_image_write_queue_depth", "Images waiting for a writer thread", ("rig",))
+CAPTURES = counter("lotus_captures_total", "Captures by outcome", ("rig", "result"))
+CAMERA_RECOVERIES = counter("lotus_camera_recoveries_total", "Cameras reopened after a fault", ("rig",))
+CAMERA_RECOVERY_SECONDS = histogram(
+    "lotus_camera_recovery_seconds", "Time from a camera fault to the reopened camera", ("rig",), buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+SBC_RTT_SECONDS = histogram("lotus_sbc_heartbeat_rtt_seconds", "Heartbeat round-trip time to an SBC", ("board",))
+SBC_REQUEST_SECONDS = histogram("lotus_sbc_request_seconds", "Time until an SBC acknowledged a request, retries included", ("board",))
+SBC_RECONNECTS = counter("lotus_sbc_reconnects_total", "Connections to an SBC re-established after a loss", ("board",))
+SBC_MISSED_HEARTBEATS = counter("lotus_sbc_missed_heartbeats_total", "Heartbeats an SBC did not answer in time", ("board",))
+
+
+class TimedLock:
+    """
+    Wraps a lock and records how long each ``with`` waited to acquire it.
+
+    Args:
+        lock: The lock to wrap, e.g. ``threading.Lock()``.
+        histogram: Histogram child the wait times go to.
+    """
+
+    __slots__ = ("lock", "histogram")
+
+    def __init__(self, lock, histogram) -> None:
+        self.lock = lock
+        self.histogram = histogram
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.histogram.observe(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.lock.release()
+        return False
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        return self.lock.acquire(blocking, timeout)
+
+    def release(self) -> None:
+        self.lock.release()
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+
+class MetricsServer:
+    """
+    Serves ``registry.render()`` on ``http://host:port/metrics`` for Prometheus to scrape.
+
+    Args:
+        host (str): Interface to listen on, local only by default.
+        port (int): TCP port, 0 picks a free one.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9108, registry: Registry = REGISTRY) -> None:
+        self.registry = registry
+        self.logger = logging.getLogger(__name__)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = server.registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # a scrape every few seconds would flood the log
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def address(self) -> tuple:
+        return self.httpd.server_address
+
+    def start(self) -> None:
+        threading.Thread(target=self.httpd.serve_forever, name="Metrics-http", daemon=True).start()
+        self.logger.info(f"Metrics on http://{self.address[0]}:{self.address[1]}/metrics")
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def benchmark(iterations: int = 200000) -> dict:
+    """Nanoseconds per operation of the hot-path calls, against an empty loop."""
+
+    registry = Registry()
+    child = registry.histogram("bench_seconds", "benchmark", ("rig",)).labels("bench")
+    count = registry.counter("bench_total", "benchmark", ("rig",)).labels("bench")
+    lock = TimedLock(threading.Lock(), child)
+
+    def run(body) -> float:
+        start = time.perf_counter()
+        body()
+        return (time.perf_counter() - start) * 1e9 / iterations
+
+    def empty():
+        for _ in range(iterations):
+            pass
+
+    def span():
+        for _ in range(iterations):
+            with child.time():
+                pass
+
+    def inc():
+        for _ in range(iterations):
+            count.inc()
+
+    def timed_lock():
+        for _ in range(iterations):
+            with lock:
+                pass
+
+    baseline = run(empty)
+    return {name: run(body) - baseline for name, body in (("span", span), ("counter", inc), ("timed_lock", timed_lock))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("LOTUS-PTO metrics")
+    parser.add_argument("--benchmark", action="store_true", help="Measure the overhead of spans, counters and the timed lock")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Serve example metrics on this port until interrupted")
+    args = parser.parse_args()
+
+    if args.benchmark or args.serve is None:
+        for name, ns in benchmark(args.iterations).items():
+            print(f"{name:10}: {ns / 1000:.2f} µs per call")
+
+    if args.serve is not None:
+        logging.basicConfig(level=logging.INFO)
+        for _ in range(100):
+            with GRAB_SECONDS.labels("example").time():
+                time.sleep(0.001)
+        CAPTURES.labels("example", "ok").inc(100)
+        server = MetricsServer(port=args.serve)
+        server.start()
+        print(json.dumps(REGISTRY.summary(), indent=2))
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.stop()
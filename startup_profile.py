@@ -0,0 +1,144 @@
+'''
+Start-up timing for the command line entry points.
+
+    python3 capture.py --list_configs --profile_startup
+    python3 main.py -h --profile_startup
+
+rerun the command under ``python -X importtime`` and print where the start-up time
+went. Run this file directly to check that listing configs stays within a cold
+start budget (exits non-zero if it does not):
+    python3 startup_profile.py --budget 0.3
+'''
+
+import sys
+
+# subprocess/time are imported inside the functions: this module is imported first
+# thing by every entry point, even when no profiling is requested
+
+PROFILE_FLAGS = ("--profile_startup", "--profile-startup")
+
+# Must not be imported just to list configs or print help
+HEAVY_MODULES = ("cv2", "pypylon", "numpy")
+
+
+def profile_startup(argv=None) -> None:
+    """
+    Reruns the current script under ``-X importtime`` if a profile flag is given,
+    prints the breakdown to stderr and exits with the script's return code.
+
+    Call it before any other local import so the rerun is the only expensive part.
+    """
+
+    argv = sys.argv if argv is None else argv
+    if not any(flag in argv for flag in PROFILE_FLAGS) or "importtime" in sys._xoptions:
+        return
+
+    import subprocess, time
+
+    command = [sys.executable, "-X", "importtime"] + [arg for arg in argv if arg not in PROFILE_FLAGS]
+    started = time.perf_counter()
+    result = subprocess.run(command, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+
+    imports, other = parse_importtime(result.stderr)
+    sys.stderr.write("".join(other))
+    print(format_report(imports, wall), file=sys.stderr)
+    raise SystemExit(result.returncode)
+
+
+def parse_importtime(stderr: str) -> tuple:
+    """
+    Splits ``-X importtime`` output from the rest of stderr.
+
+    Returns:
+        tuple: (list of (module, self µs, cumulative µs, depth), list of other stderr lines)
+    """
+
+    imports, other = [], []
+    for line in stderr.splitlines(keepends=True):
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return imports, other
+
+
+def format_report(imports: list, wall: float, top: int = 12) -> str:
+    total = sum(self_us for _, self_us, _, _ in imports)
+
+    # Self time summed per top-level package
+    packages = {}
+    for name, self_us, _, _ in imports:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    lines = [
+        "#### STARTUP PROFILE ####",
+        f"wall time          {wall * 1000:8.1f} ms",
+        f"imports            {total / 1000:8.1f} ms ({len(imports)} modules)",
+        "",
+        "slowest top-level imports (cumulative):",
+    ]
+    roots = sorted((i for i in imports if i[3] == 0), key=lambda i: i[2], reverse=True)
+    for name, _, cumulative, _ in roots[:top]:
+        lines.append(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    lines.append("heaviest packages (self time):")
+    for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    loaded = [m for m in HEAVY_MODULES if m in packages]
+    lines.append(f"heavy modules loaded: {', '.join(loaded) if loaded else 'none'}")
+    return "\n".join(lines)
+
+
+def measure_cold_start(command: list, runs: int = 5) -> tuple:
+    """
+    Runs ``command`` in fresh interpreters.
+
+    Returns:
+        tuple: (median wall time in seconds, heavy modules imported by the last run)
+    """
+
+    import subprocess, time
+
+    samples = []
+    loaded = set()
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime"] + command, capture_output=True, text=True)
+        samples.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{result.stderr}")
+        imports, _ = parse_importtime(result.stderr)
+        loaded = {name.split(".")[0] for name, _, _, _ in imports} & set(HEAVY_MODULES)
+
+    samples.sort()
+    return samples[len(samples) // 2], sorted(loaded)
+
+
+if __name__ == "__main__":
+    import argparse, os
+
+    parser = argparse.ArgumentParser("Cold start budget check")
+    parser.add_argument("--budget", type=float, default=0.3, help="Maximum median seconds per command (default: 0.3)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # config.yaml is relative
+
+    failed = False
+    for command in (["capture.py", "--list_configs"], ["capture.py", "-h"], ["main.py", "-h"]):
+        median, loaded = measure_cold_start(command, args.runs)
+        over = median > args.budget
+        failed |= over or bool(loaded)
+        status = "FAIL" if over or loaded else "ok"
+        note = f", imported {', '.join(loaded)}" if loaded else ""
+        print(f"{status:4}  {' '.join(command):26} {median * 1000:7.1f} ms (budget {args.budget * 1000:.0f} ms{note})")
+
+    raise SystemExit(1 if failed else 0)
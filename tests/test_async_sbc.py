@@ -0,0 +1,134 @@
+import asyncio, time
+
+import pytest
+
+from SBC.async_sbc import AsyncSBC
+from SBC.fake_sbc import FakeSBC
+from SBC.sbc_fleet import SBCFleet
+
+
+class OutOfOrderSBC(FakeSBC):
+    """Answers each request after its own ``wait`` seconds, so replies overtake each other."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.answered = []
+
+    async def _reply(self, message: dict, writer, codec: str = "json") -> None:
+        await asyncio.sleep(message.get("wait", 0.0))
+        self.answered.append(message["id"])
+        await super()._reply(message, writer, codec)
+
+
+async def _connected(server: FakeSBC, **kwargs) -> AsyncSBC:
+    await server.start()
+    client = AsyncSBC("127.0.0.1", server.port, name="test", **kwargs)
+    await client.connect()
+    return client
+
+
+def test_out_of_order_replies_reach_their_requests():
+    async def run():
+        server = OutOfOrderSBC()
+        client = await _connected(server)
+        try:
+            waits = [0.3, 0.0, 0.15]
+            replies = await asyncio.gather(*(client.request({"type": "ping", "wait": w}) for w in waits))
+        finally:
+            await client.close()
+            await server.stop()
+        return server, replies
+
+    server, replies = asyncio.run(run())
+
+    # Sent as ids 1, 2, 3 but answered 2, 3, 1
+    assert server.answered == [2, 3, 1]
+    assert [r["id"] for r in replies] == [1, 2, 3]
+    assert all(r["type"] == "pong" for r in replies)
+
+
+def test_unanswered_request_is_resent_with_the_same_id():
+    async def run():
+        server = FakeSBC(drop_every=2)
+        client = await _connected(server, timeout=0.2, retries=2)
+        try:
+            first = await client.update_settings({"white": 0.5})
+            second = await client.update_settings({"white": 0.8})  # dropped once, answered on the resend
+        finally:
+            await client.close()
+            await server.stop()
+        return server, first, second
+
+    server, first, second = asyncio.run(run())
+
+    assert first["id"] == 1 and first["status"] == "ok"
+    assert second["id"] == 2 and second["set"] == {"white": 0.8}
+    assert server.requests == 3
+    assert server.lights == {"white": 0.8}
+
+
+def test_request_times_out_after_all_retries():
+    async def run():
+        server = FakeSBC(drop_every=1)
+        client = await _connected(server, timeout=0.1, retries=2)
+        try:
+            started = time.perf_counter()
+            with pytest.raises(TimeoutError):
+                await client.request({"type": "ping"})
+            elapsed = time.perf_counter() - started
+        finally:
+            await client.close()
+            await server.stop()
+        return server, elapsed
+
+    server, elapsed = asyncio.run(run())
+
+    assert server.requests == 3
+    assert elapsed == pytest.approx(0.3, abs=0.15)
+
+
+def test_pending_request_fails_when_the_link_drops():
+    async def run():
+        server = FakeSBC(reply_delay=1.0)
+        client = await _connected(server, timeout=5.0, retries=0)
+        request = asyncio.create_task(client.request({"type": "ping"}))
+        await asyncio.sleep(0.1)
+        await server.stop()
+        try:
+            with pytest.raises(ConnectionError):
+                await request
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+def test_fleet_reconnects_after_the_board_restarts():
+    async def run():
+        server = FakeSBC()
+        await server.start()
+        fleet = SBCFleet({"rig": ("127.0.0.1", server.port)}, heartbeat_interval=1.0, timeout=0.5, retries=0, backoff_initial=0.05)
+        try:
+            await asyncio.to_thread(fleet.connect, 5.0)
+            assert (await asyncio.wrap_future(fleet.request("rig", {"type": "ping"})))["type"] == "pong"
+
+            # Reboot: connections go away, the board comes back on the same port a little later
+            await server.stop()
+            await asyncio.sleep(0.2)
+            server = FakeSBC(port=server.port)
+            await server.start()
+
+            deadline = time.monotonic() + 5.0
+            while not (fleet.status()["rig"]["reconnects"] and fleet.is_connected("rig")):
+                assert time.monotonic() < deadline, "fleet did not reconnect"
+                await asyncio.sleep(0.05)
+            reply = await asyncio.wrap_future(fleet.update_settings({"white": 0.3}))
+        finally:
+            await asyncio.to_thread(fleet.stop)
+            await server.stop()
+        return server, reply
+
+    server, reply = asyncio.run(run())
+
+    assert reply["rig"]["status"] == "ok"
+    assert server.lights == {"white": 0.3}
@@ -0,0 +1,76 @@
+import pytest
+
+from Camera.bandwidth import ETHERNET_OVERHEAD, LINE_RATE, StreamDemand, frame_wire_bytes, plan_streams
+
+
+def _demand(rig: str, fps: float, weight: float = 1.0) -> StreamDemand:
+    return StreamDemand(rig=rig, width=640, height=480, pixel_format="BayerRG8", fps=fps, weight=weight)
+
+
+FRAME = frame_wire_bytes(640, 480, "BayerRG8", 1500)
+
+
+def test_water_filling_serves_small_demands_and_splits_the_rest_by_weight():
+    usable = 100 * FRAME
+    demands = [_demand("small", 10), _demand("light", 80, weight=1.0), _demand("heavy", 80, weight=2.0)]
+
+    plans = plan_streams(demands, link_bandwidth=usable, headroom=0.0)
+
+    assert plans["small"].throughput_limit == pytest.approx(10 * FRAME, abs=1)
+    assert plans["small"].fits
+    # 90 frames worth left, shared 1:2
+    assert plans["light"].throughput_limit == pytest.approx(30 * FRAME, abs=1)
+    assert plans["heavy"].throughput_limit == pytest.approx(60 * FRAME, abs=1)
+    assert not plans["light"].fits and not plans["heavy"].fits
+
+
+def test_spare_bandwidth_is_handed_out_by_weight():
+    usable = 100 * FRAME
+    demands = [_demand("a", 10, weight=1.0), _demand("b", 20, weight=3.0)]
+
+    plans = plan_streams(demands, link_bandwidth=usable, headroom=0.0)
+
+    # 70 frames spare on top of the demands, 1:3
+    assert plans["a"].throughput_limit == pytest.approx((10 + 17.5) * FRAME, abs=1)
+    assert plans["b"].throughput_limit == pytest.approx((20 + 52.5) * FRAME, abs=1)
+    assert sum(p.throughput_limit for p in plans.values()) <= usable
+
+
+def test_headroom_is_kept_free():
+    plans = plan_streams([_demand("a", 100), _demand("b", 100)], link_bandwidth=1e8, headroom=0.2)
+
+    assert sum(p.throughput_limit for p in plans.values()) == pytest.approx(8e7, abs=2)
+
+
+def test_limit_is_capped_at_the_camera_line_rate():
+    plan = plan_streams([_demand("a", 1)], link_bandwidth=10 * LINE_RATE, headroom=0.0)["a"]
+
+    assert plan.throughput_limit == LINE_RATE
+    assert plan.packet_delay == 0
+
+
+def test_packet_delay_stretches_packets_to_the_assigned_rate():
+    plans = plan_streams([_demand("a", 100), _demand("b", 100)], link_bandwidth=LINE_RATE, headroom=0.0, tick_frequency=1e9)
+
+    # Half the line rate: one extra packet time of gap after every packet
+    wire_packet = 1500 + ETHERNET_OVERHEAD
+    assert plans["a"].throughput_limit == LINE_RATE // 2
+    assert plans["a"].packet_delay == pytest.approx(wire_packet / LINE_RATE * 1e9, abs=1)
+
+
+def test_fits_and_max_fps():
+    plans = plan_streams([_demand("slow", 5), _demand("fast", 1000)], link_bandwidth=LINE_RATE, headroom=0.1)
+
+    for plan in plans.values():
+        assert plan.max_fps == pytest.approx(plan.throughput_limit / plan.frame_bytes)
+        assert plan.fits == (plan.throughput_limit >= plan.demand)
+    assert plans["slow"].fits
+    assert not plans["fast"].fits
+    assert plans["fast"].max_fps < 1000
+
+
+def test_rejects_invalid_links_and_weights():
+    with pytest.raises(ValueError):
+        plan_streams([_demand("a", 1)], link_bandwidth=1e8, headroom=1.0)
+    with pytest.raises(ValueError):
+        plan_streams([_demand("a", 1, weight=0)])
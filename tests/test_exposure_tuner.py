@@ -0,0 +1,95 @@
+import json, math, time
+
+import pytest
+
+from Camera.exposure_tuner import ExposureCache, ExposureLimits, ExposureState, next_state, simulate
+
+LIMITS = ExposureLimits(exposure=(20.0, 100000.0), gain=(0.0, 24.0), light_scale=(0.1, 2.0))
+START = ExposureState(15000.0, 1.0, 1.0)
+
+
+def _at(hour: int) -> float:
+    """A local timestamp in the given hour of the day."""
+    return time.mktime((2026, 3, 15, hour, 30, 0, 0, 0, -1))
+
+
+@pytest.mark.parametrize("scene", [1e-6, 1e-5, 1e-4, 1e-3])
+def test_cold_start_converges_within_four_frames(scene):
+    frames, converged = simulate(scene, START, LIMITS)
+
+    assert converged
+    assert frames <= 4
+
+
+@pytest.mark.parametrize("scene", [1e-6, 1e-5, 1e-4, 1e-3])
+def test_warm_start_converges_in_at_most_two_frames(scene):
+    cached = LIMITS.allocate(0.5 / scene)
+
+    frames, converged = simulate(scene * 1.2, cached, LIMITS)  # 20 % brighter than when it was cached
+
+    assert converged
+    assert frames <= 2
+
+
+def test_unreachable_scene_stops_at_the_limit():
+    frames, converged = simulate(1e-7, START, LIMITS)
+
+    assert not converged
+    assert frames < 8
+
+
+def test_allocate_raises_light_then_exposure_then_gain():
+    assert LIMITS.allocate(30.0) == ExposureState(20.0, 0.0, 1.5)
+    assert LIMITS.allocate(100.0) == ExposureState(50.0, 0.0, 2.0)
+
+    state = LIMITS.allocate(2.0 * 100000.0 * 4)
+    assert (state.light_scale, state.exposure) == (2.0, 100000.0)
+    assert state.gain == pytest.approx(20 * math.log10(4))
+    assert state.value() == pytest.approx(2.0 * 100000.0 * 4)
+
+
+def test_allocate_clamps_to_the_limits():
+    assert LIMITS.allocate(0.1) == ExposureState(20.0, 0.0, 0.1)
+    assert LIMITS.allocate(1e12) == ExposureState(100000.0, 24.0, 2.0)
+    assert LIMITS.allocate(0.0) == ExposureState(20.0, 0.0, 0.1)
+
+
+def test_next_state_scales_by_target_over_brightness():
+    state = LIMITS.allocate(1000.0)
+
+    assert next_state(state, 0.25, 0.0, 0.5, LIMITS).value() == pytest.approx(2000.0)
+    assert next_state(state, 0.5, 0.0, 0.5, LIMITS) == state
+
+
+def test_next_state_steps_are_bounded():
+    state = LIMITS.allocate(1000.0)
+
+    # A black frame says nothing about how far off it is, at most 16x
+    assert next_state(state, 0.0, 0.0, 0.5, LIMITS).value() == pytest.approx(16000.0)
+    # A clipped frame under-reports its brightness, the step shrinks by the clipped fraction
+    assert next_state(state, 1.0, 0.5, 0.5, LIMITS).value() == pytest.approx(250.0)
+    assert next_state(state, 1.0, 1.0, 0.5, LIMITS).value() == pytest.approx(1000.0 / 16)
+
+
+def test_cache_picks_the_circularly_nearest_bucket(tmp_path):
+    cache = ExposureCache(str(tmp_path / "exposure_cache.json"))
+    late, morning = ExposureState(5000.0, 0.0, 1.0), ExposureState(200.0, 0.0, 1.0)
+    cache.put("rig1", "DEFAULT", "low_light", late, when=_at(23))
+    cache.put("rig1", "DEFAULT", "low_light", morning, when=_at(5))
+
+    assert cache.get("rig1", "DEFAULT", "low_light", when=_at(0)) == late  # 23 is one bucket from 0
+    assert cache.get("rig1", "DEFAULT", "low_light", when=_at(4)) == morning
+    assert cache.get("rig1", "DEFAULT", "high_light", when=_at(0)) is None
+    assert cache.get("rig2", "DEFAULT", "low_light", when=_at(0)) is None
+
+
+def test_cache_survives_a_restart_and_ignores_a_corrupt_file(tmp_path):
+    path = tmp_path / "exposure_cache.json"
+    state = ExposureState(1234.0, 3.0, 0.5)
+    ExposureCache(str(path)).put("rig1", "DEFAULT", "DEFAULT", state, when=_at(12))
+
+    assert ExposureCache(str(path)).get("rig1", "DEFAULT", "DEFAULT", when=_at(12)) == state
+    assert json.loads(path.read_text())["rig1|DEFAULT|DEFAULT|12"]["exposure"] == 1234.0
+
+    path.write_text("{not json")
+    assert ExposureCache(str(path)).get("rig1", "DEFAULT", "DEFAULT") is None
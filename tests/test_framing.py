@@ -0,0 +1,122 @@
+import socket, threading
+
+import pytest
+
+from SBC.framing import HEADER, FramedSocket, accept_hello, choose_codec, hello_message
+
+
+@pytest.fixture
+def sockets():
+    a, b = socket.socketpair()
+    a.settimeout(2.0)
+    b.settimeout(2.0)
+    yield a, b
+    a.close()
+    b.close()
+
+
+def _frame(body: bytes) -> bytes:
+    return HEADER.pack(len(body)) + body
+
+
+def test_frame_split_across_reads_is_reassembled(sockets):
+    a, b = sockets
+    receiver = FramedSocket(b)
+    data = _frame(b'{"type":"ack","id":7}') + _frame(b'{"type":"pong","id":8}')
+
+    def dribble():
+        # One byte at a time, so every header and body arrives in pieces
+        for i in range(len(data)):
+            a.sendall(data[i:i + 1])
+
+    sender = threading.Thread(target=dribble)
+    sender.start()
+    try:
+        assert receiver.recv() == {"type": "ack", "id": 7}
+        assert receiver.recv() == {"type": "pong", "id": 8}
+    finally:
+        sender.join()
+
+
+def test_large_frames_round_trip_and_grow_the_buffer(sockets):
+    a, b = sockets
+    sender, receiver = FramedSocket(a), FramedSocket(b)
+    payload = {"lights": {f"channel_{i}": i / 1000 for i in range(2000)}}  # well above SMALL_FRAME
+
+    thread = threading.Thread(target=sender.send, args=(payload,))
+    thread.start()
+    try:
+        assert receiver.recv() == payload
+    finally:
+        thread.join()
+    sender.send({"type": "ping"})
+    assert receiver.recv() == {"type": "ping"}
+
+
+def test_oversized_frame_is_rejected_before_reading_the_body(sockets):
+    a, b = sockets
+    receiver = FramedSocket(b, max_frame_size=64)
+    a.sendall(HEADER.pack(65))
+
+    with pytest.raises(ConnectionError, match="Invalid message length: 65"):
+        receiver.recv()
+
+
+def test_zero_length_frame_is_rejected(sockets):
+    a, b = sockets
+    a.sendall(HEADER.pack(0))
+
+    with pytest.raises(ConnectionError):
+        FramedSocket(b).recv()
+
+
+def test_closed_socket_mid_frame_raises(sockets):
+    a, b = sockets
+    a.sendall(_frame(b'{"type":"ack"}')[:-3])
+    a.close()
+
+    with pytest.raises(ConnectionError, match="Socket closed"):
+        FramedSocket(b).recv()
+
+
+def test_undecodable_body_is_dropped_and_the_stream_stays_in_sync(sockets):
+    a, b = sockets
+    receiver = FramedSocket(b)
+    a.sendall(_frame(b"{not json") + _frame(b'{"id":1}'))
+
+    assert receiver.recv() is None
+    assert receiver.recv() == {"id": 1}
+
+
+def test_codec_negotiation_falls_back_to_json():
+    assert choose_codec(["zstd-json", "json"]) == "json"
+    assert choose_codec([]) == "json"
+    # Firmware without negotiation answers the hello with an error
+    assert accept_hello({"type": "error", "status": "unknown type 'hello'"}) == "json"
+    assert accept_hello({"type": "hello", "codec": "not-installed"}) == "json"
+    assert accept_hello(None) == "json"
+    assert hello_message(["msgpack", "json"]) == {"type": "hello", "codecs": ["msgpack", "json"]}
+
+
+@pytest.mark.parametrize("answer", ["error", "silent"])
+def test_negotiate_keeps_json_with_old_or_silent_firmware(sockets, answer):
+    a, b = sockets
+    client, board = FramedSocket(a), FramedSocket(b)
+
+    def firmware():
+        hello = board.recv()
+        assert hello["type"] == "hello"
+        if answer == "error":
+            board.send({"type": "error", "status": "unknown type 'hello'"})
+
+    thread = threading.Thread(target=firmware)
+    thread.start()
+    try:
+        assert client.negotiate("msgpack", timeout=0.3) == "json"
+    finally:
+        thread.join()
+    assert client.codec.name == "json"
+    assert a.gettimeout() == 2.0  # restored after the handshake
+
+    client.send({"type": "ping", "id": 1})
+    assert board.recv() == {"type": "ping", "id": 1}
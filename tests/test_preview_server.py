@@ -0,0 +1,117 @@
+'''
+Preview server endpoints against the emulated camera, run from the repository root:
+    PYLON_CAMEMU=1 python3 -m pytest tests/test_preview_server.py
+'''
+
+import http.client, os, shutil, time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get("PYLON_CAMEMU"), reason="needs pylon's emulated camera (PYLON_CAMEMU=1)")
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def camera_control(tmp_path, monkeypatch):
+    from Camera.camera_control import CameraControl
+
+    # config.yaml is read from the working directory, images land next to it
+    shutil.copy(os.path.join(REPO, "config.yaml"), tmp_path)
+    os.makedirs(tmp_path / "Captured_images")
+    monkeypatch.chdir(tmp_path)
+
+    camera_control = CameraControl(rig="preview-test", catalog=None)
+    camera_control.write_nodes([("Width", 640), ("Height", 480)])
+    yield camera_control
+    camera_control.close()
+
+
+@pytest.fixture
+def server(camera_control):
+    from Camera.preview_server import PreviewServer
+
+    server = PreviewServer(camera_control, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def _get(server, path: str, timeout: float = 5.0):
+    connection = http.client.HTTPConnection(*server.address, timeout=timeout)
+    connection.request("GET", path)
+    return connection, connection.getresponse()
+
+
+def _decode(jpeg: bytes):
+    import cv2
+    import numpy as np
+
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_snapshot_is_a_full_resolution_jpeg(server):
+    deadline = time.monotonic() + 5.0
+    while True:
+        connection, response = _get(server, "/snapshot")
+        body = response.read()
+        connection.close()
+        if response.status != 503 or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)  # no frame in the ring yet
+
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "image/jpeg"
+    assert int(response.getheader("Content-Length")) == len(body)
+    assert _decode(body).shape == (480, 640, 3)
+
+
+def test_stream_sends_multipart_jpeg_frames(server):
+    from Camera.preview_server import BOUNDARY
+
+    connection, response = _get(server, "/stream")
+    try:
+        assert response.status == 200
+        assert response.getheader("Content-Type") == f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+
+        for _ in range(3):
+            assert response.fp.readline() == f"--{BOUNDARY}\r\n".encode()
+            headers = {}
+            while (line := response.fp.readline().rstrip(b"\r\n")):
+                name, value = line.decode().split(": ", 1)
+                headers[name] = value
+            assert headers["Content-Type"] == "image/jpeg"
+            jpeg = response.fp.read(int(headers["Content-Length"]))
+            assert response.fp.read(2) == b"\r\n"
+
+            frame = _decode(jpeg)
+            assert frame is not None and frame.shape[2] == 3
+            assert frame.shape[1] <= 640 * server.preview_scale
+        assert server.client_count() == 1
+    finally:
+        response.close()  # the response holds its own reference to the socket
+        connection.close()
+
+    deadline = time.monotonic() + 5.0
+    while server.client_count() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert server.client_count() == 0
+
+
+def test_unknown_path_is_404(server):
+    connection, response = _get(server, "/nothing")
+    response.read()
+    connection.close()
+    assert response.status == 404
+
+
+def test_stopping_hands_the_camera_back(camera_control):
+    from Camera.preview_server import PreviewServer
+
+    server = PreviewServer(camera_control, port=0)
+    server.start()
+    assert camera_control.live_view is not None and camera_control.live_view.running
+    server.stop()
+
+    assert camera_control.live_view is None
+    assert camera_control.grab_frame() is not None
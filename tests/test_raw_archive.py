@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+from Camera.raw_archive import RawArchive, RawArchiveReader
+
+
+def _frame(value: int, shape=(48, 64)) -> np.ndarray:
+    return np.full(shape, value, dtype=np.uint16)
+
+
+def test_frames_and_metadata_round_trip_across_chunks(tmp_path):
+    archive = RawArchive(str(tmp_path), session="s", chunk_bytes=2 * _frame(0).nbytes)
+    for i in range(5):
+        assert archive.append(_frame(i), rig="rig1", hw_timestamp=100 + i, sidecar={"i": i}) == i
+    archive.close()
+
+    reader = RawArchiveReader(str(tmp_path / "s"))
+    assert len(reader) == 5
+    assert sorted(int(c) for c in reader.index["chunk"]) == [0, 0, 1, 1, 2]
+    for i in range(5):
+        assert (reader[i] == i).all()
+        assert reader.metadata(i)["hw_timestamp"] == 100 + i
+        assert reader.sidecar(i) == {"i": i}
+
+
+def test_long_names_are_kept_whole(tmp_path):
+    rig = "greenhouse-north-bench-07-left"
+    camera_config = "low_light_stacked_with_sigma_clipping_v2"
+    light_config = "far_red_and_blue_interleaved_strobe_setting"
+    archive = RawArchive(str(tmp_path), session="s")
+    archive.append(_frame(1), rig=rig, camera_config=camera_config, light_config=light_config)
+    archive.append(_frame(2), rig=rig, camera_config="DEFAULT", light_config=light_config)
+    archive.close()
+
+    reader = RawArchiveReader(str(tmp_path / "s"))
+    assert reader.metadata(0)["rig"] == rig
+    assert reader.metadata(0)["camera_config"] == camera_config
+    assert reader.metadata(0)["light_config"] == light_config
+    assert reader.metadata(1)["camera_config"] == "DEFAULT"
+    # Every name is stored once
+    assert sorted(json.loads((tmp_path / "s" / "names.json").read_text())) == sorted({rig, camera_config, light_config, "DEFAULT"})
+
+
+def test_reopened_session_appends_and_reuses_names(tmp_path):
+    archive = RawArchive(str(tmp_path), session="s")
+    archive.append(_frame(1), rig="rig1")
+    archive.close()
+
+    archive = RawArchive(str(tmp_path), session="s")
+    assert len(archive) == 1
+    assert archive.append(_frame(2), rig="rig1", light_config="high_light") == 1
+    archive.close()
+
+    reader = RawArchiveReader(str(tmp_path / "s"))
+    assert [(reader[i] == i + 1).all() for i in range(2)] == [True, True]
+    assert [reader.metadata(i)["rig"] for i in range(2)] == ["rig1", "rig1"]
+    assert reader.metadata(1)["light_config"] == "high_light"
+    assert reader.names == ["rig1", "DEFAULT", "high_light"]
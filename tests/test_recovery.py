@@ -0,0 +1,78 @@
+'''
+Fault injection against the emulated camera, run from the repository root:
+    PYLON_CAMEMU=1 python3 -m pytest tests/test_recovery.py
+'''
+
+import os, shutil, threading
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get("PYLON_CAMEMU"), reason="needs pylon's emulated camera (PYLON_CAMEMU=1)")
+
+RESTORED_NODES = ("Width", "Height", "PixelFormat")
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def camera_control(tmp_path, monkeypatch):
+    from Camera.camera_control import CameraControl
+
+    # config.yaml is read from the working directory, images land next to it
+    shutil.copy(os.path.join(REPO, "config.yaml"), tmp_path)
+    os.makedirs(tmp_path / "Captured_images")
+    monkeypatch.chdir(tmp_path)
+
+    camera_control = CameraControl(rig="recovery-test", catalog=None)
+    camera_control.write_nodes([("Width", 640), ("Height", 480)])
+    yield camera_control
+    camera_control.close()
+
+
+def _node_values(camera_control) -> dict:
+    node_map = camera_control.camera.GetNodeMap()
+    return {n: node_map.GetNode(n).GetValue() for n in RESTORED_NODES}
+
+
+def test_device_removed(camera_control):
+    before = _node_values(camera_control)
+
+    camera_control.camera.DestroyDevice()
+    camera_control.recovery._handler.OnCameraDeviceRemoved(camera_control.camera)
+
+    assert camera_control.recovery.wait(10), "recovery timed out"
+    assert camera_control.recovery.recoveries == 1
+    assert _node_values(camera_control) == before
+
+
+def test_failed_grab_waits_for_recovery(camera_control):
+    before = _node_values(camera_control)
+
+    camera_control.camera.DestroyDevice()
+    camera_control.snap_pic(user=False, reconnect=True)
+
+    assert camera_control.recovery.wait(10), "recovery timed out"
+    assert camera_control.recovery.recoveries == 1
+    assert _node_values(camera_control) == before
+
+
+def test_unreachable_camera_backs_off(camera_control):
+    from Camera.devices import device_identity
+
+    before = _node_values(camera_control)
+
+    identity = camera_control._identity
+    missing = device_identity(camera_control.camera.GetDeviceInfo())
+    missing.SetSerialNumber("missing")
+    camera_control._identity = missing
+    timer = threading.Timer(1.5, lambda: setattr(camera_control, "_identity", identity))
+    timer.start()
+    try:
+        camera_control.camera.DestroyDevice()
+        camera_control.recovery.request("injected: camera unreachable")
+
+        assert camera_control.recovery.wait(30), "recovery timed out"
+    finally:
+        timer.cancel()
+    assert camera_control.recovery.failed_attempts > 0
+    assert camera_control.recovery.recoveries == 1
+    assert _node_values(camera_control) == before
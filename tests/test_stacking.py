@@ -0,0 +1,54 @@
+import numpy as np
+
+from Camera.stacking import FrameStacker
+
+
+def _stack(frames, sigma_clip: float) -> FrameStacker:
+    stacker = FrameStacker(frames[0].shape, sigma_clip=sigma_clip)
+    for frame in frames:
+        stacker.add(frame)
+    return stacker
+
+
+def test_flat_dark_field_stays_unbiased():
+    # Dark, quantised pixels: most of them read 0 for the first frames
+    rng = np.random.default_rng(0)
+    frames = [rng.poisson(0.5, size=(256, 256)).astype(np.uint8) for _ in range(16)]
+    expected = np.mean(frames)
+
+    stacker = _stack(frames, sigma_clip=4.0)
+    mean, _ = stacker.result()
+
+    assert abs(mean.mean() - expected) < 0.005
+    assert stacker.stats()["rejected_fraction"] < 0.001
+
+
+def test_clipping_matches_plain_mean_without_transients():
+    rng = np.random.default_rng(1)
+    frames = [np.clip(100 + rng.normal(0, 5, size=(128, 128)), 0, 255).astype(np.uint8) for _ in range(16)]
+
+    clipped, _ = _stack(frames, sigma_clip=4.0).result()
+    plain, _ = _stack(frames, sigma_clip=0.0).result()
+
+    assert abs(float(clipped.mean()) - float(plain.mean())) < 0.01
+
+
+def test_transient_is_rejected():
+    rng = np.random.default_rng(2)
+    frames = [np.clip(50 + rng.normal(0, 3, size=(64, 64)), 0, 255).astype(np.uint8) for _ in range(16)]
+    frames[8][10:20, 10:20] = 255
+
+    mean, _ = _stack(frames, sigma_clip=4.0).result()
+
+    assert abs(float(mean[10:20, 10:20].mean()) - 50) < 1.0
+
+
+def test_mean_and_variance_match_numpy():
+    rng = np.random.default_rng(3)
+    frames = [rng.integers(0, 4096, size=(32, 32)).astype(np.uint16) for _ in range(10)]
+
+    mean, variance = _stack(frames, sigma_clip=0.0).result()
+
+    stack = np.stack(frames).astype(np.float64)
+    np.testing.assert_allclose(mean, stack.mean(axis=0), rtol=1e-5)
+    np.testing.assert_allclose(variance, stack.var(axis=0, ddof=1), rtol=1e-3)
@@ -0,0 +1,106 @@
+import asyncio, threading
+
+import pytest
+
+from Camera.strobe import StrobeController
+from SBC.async_sbc import BlockingSBC
+from SBC.fake_sbc import FakeSBC
+
+PLAN = (("LineSelector", "Line2"), ("LineMode", "Output"), ("LineSource", "ExposureActive"))
+
+
+class RecordingCameraControl:
+    """Just enough of CameraControl for the strobe: a camera object and write_nodes."""
+
+    def __init__(self) -> None:
+        self.camera = object()
+        self.writes = []
+
+    def write_nodes(self, plan, force=False) -> None:
+        self.writes.append((tuple(plan), force))
+
+
+@pytest.fixture
+def board():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = FakeSBC()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+
+    sbc = BlockingSBC("127.0.0.1", server.port, timeout=1.0, name="strobe-test")
+    sbc.connect()
+    yield server, sbc
+    sbc.disconnect()
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+def test_armed_board_lights_only_during_exposure(board):
+    server, sbc = board
+    camera_control = RecordingCameraControl()
+    strobe = StrobeController(camera_control, PLAN, sbc)
+
+    ack = strobe.arm({"white": 0.8, "uv": 0.2}).result(2)
+
+    assert ack["armed"] is True
+    assert server.strobe == {"white": 0.8, "uv": 0.2}
+    assert camera_control.writes == [(PLAN, True)]
+
+    server.exposure(True)
+    assert server.lights == {"white": 0.8, "uv": 0.2}
+    server.exposure(False)
+    assert server.lights == {"white": 0.0, "uv": 0.0}
+    assert server.flashes == 1
+
+
+def test_rearming_with_the_same_levels_sends_nothing(board):
+    server, sbc = board
+    strobe = StrobeController(RecordingCameraControl(), PLAN, sbc)
+
+    strobe.arm({"white": 0.5}).result(2)
+    assert strobe.arm({"white": 0.5}) is None
+    strobe.arm({"white": 0.6}).result(2)
+
+    assert server.requests == 2
+    assert server.strobe == {"white": 0.6}
+
+
+def test_disarm_leaves_the_leds_dark(board):
+    server, sbc = board
+    strobe = StrobeController(RecordingCameraControl(), PLAN, sbc)
+    strobe.arm({"white": 0.5}).result(2)
+
+    ack = strobe.disarm().result(2)
+
+    assert ack["armed"] is False
+    assert strobe.armed is None and server.strobe is None
+    server.exposure(True)
+    assert not any(server.lights.values())
+    assert server.flashes == 0
+    assert strobe.disarm() is None  # already disarmed, nothing sent
+    assert server.requests == 2
+
+
+def test_output_is_configured_again_after_a_reconnect(board):
+    _, sbc = board
+    camera_control = RecordingCameraControl()
+    strobe = StrobeController(camera_control, PLAN, sbc)
+
+    strobe.arm({"white": 0.5}).result(2)
+    strobe.arm({"white": 0.6}).result(2)
+    assert len(camera_control.writes) == 1
+
+    camera_control.camera = object()  # a re-opened camera has lost the line configuration
+    strobe.arm({"white": 0.6})
+    assert camera_control.writes == [(PLAN, True), (PLAN, True)]
+
+
+def test_without_a_board_nothing_is_sent():
+    camera_control = RecordingCameraControl()
+    strobe = StrobeController(camera_control, PLAN)
+
+    assert strobe.arm({"white": 0.5}) is None
+    assert strobe.disarm() is None
+    assert camera_control.writes == [(PLAN, True)]